@@ -1,7 +1,14 @@
 import google.generativeai as genai
-import requests
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from bs4 import BeautifulSoup
 from googlesearch import search
+from fetcher import Fetcher, FetchError
+from search_cache import SearchCache
+from response_parser import QUESTION_ANSWER_SCHEMA, Field, ParseError, ResponseParser, Schema
+from history_store import HistoryStore
  
 # Configure the API key
 genai.configure(api_key="api")
@@ -9,25 +16,60 @@ genai.configure(api_key="api")
 # Initialize the generative model
 model = genai.GenerativeModel('gemini-1.5-flash')
 
-# Initialize conversation history
-conversation_history = []
+# Shared pooled fetcher for all page downloads
+fetcher = Fetcher()
 
-def add_to_history(question, answer, link):
+# Extracted text of recently fetched pages, so repeated questions on a URL skip the download
+page_cache = OrderedDict()
+page_cache_lock = threading.Lock()
+PAGE_CACHE_SIZE = 256
+
+# Google results per normalized question, kept for a day
+search_cache = SearchCache(max_entries=256, ttl=86400)
+
+# Runs the fallback web search (and fetches its top results) while the provided URL is still being checked
+SPECULATIVE_SEARCH = True
+background = ThreadPoolExecutor(max_workers=4)
+
+# One structured LLM call per link returns the answer, its relevance and the summary together,
+# False goes back to separate answer, relevance check and summary calls
+SINGLE_CALL = True
+
+# Tolerant JSON extraction for the structured replies, is_relevant stays None when the model left it out
+parser = ResponseParser()
+STRUCTURED_SCHEMA = Schema("answer", [
+    Field("answer"),
+    Field("is_relevant", required=False, choices=("yes", "no")),
+    Field("summary", required=False),
+])
+
+# Conversation history survives restarts, a question answered before on the same URL is not searched again
+history = HistoryStore(db_path="history.sqlite3")
+session_id = uuid.uuid4().hex
+
+def add_to_history(url, question, answer, link, user_choice):
     """
     Adds the question and answer to the conversation history.
     """
-    conversation_history.append({"question": question, "answer": answer, "link": link})
+    history.add(session_id, url, question, answer, link, user_choice)
 
-def display_history():
+def display_history(page_size=20):
     """
-    Displays the conversation history.
+    Displays this session's conversation history, newest first, one page at a time.
     """
     print("\n================= Conversation History =================")
-    for i, entry in enumerate(conversation_history, 1):
-        print(f"{i}.")
-        print(f"  Q: {entry['question']}")
-        print(f"  A: {entry['answer']}")
-        print(f"  Link: {entry['link']}\n")
+    before = None
+    number = 0
+    while True:
+        entries, before = history.page(session_id, before, page_size)
+        for entry in entries:
+            number += 1
+            print(f"{number}.")
+            print(f"  Q: {entry.question}")
+            print(f"  A: {entry.answer}")
+            print(f"  Link: {entry.link}\n")
+        if before is None or get_user_input("Show older entries? (yes/no): ", ["yes", "no"]) != "yes":
+            break
     print("========================================================\n")
 
 def summarize_content(content):
@@ -50,15 +92,22 @@ def summarize_content(content):
 def extract_content_from_url(url):
     """
     This function fetches the content from the provided URL.
-    It uses requests and BeautifulSoup to extract the text.
+    It uses the shared fetcher and BeautifulSoup to extract the text.
     """
+    with page_cache_lock:
+        if url in page_cache:
+            page_cache.move_to_end(url)
+            return page_cache[url]
     try:
-        response = requests.get(url)
-        response.raise_for_status()  # Check for HTTP errors
-        soup = BeautifulSoup(response.text, 'html.parser')
+        page = fetcher.fetch(url)  # Raises FetchError on HTTP errors, timeouts and oversized pages
+        soup = BeautifulSoup(page.text, 'html.parser')
         content = soup.get_text(separator=' ', strip=True)
+        with page_cache_lock:
+            page_cache[url] = content
+            if len(page_cache) > PAGE_CACHE_SIZE:
+                page_cache.popitem(last=False)
         return content
-    except requests.RequestException as e:
+    except FetchError as e:
         print(f"Error fetching URL {url}: {e}")
         return None
 
@@ -97,6 +146,67 @@ def ask_llm_about_content(content, question, user_choice):
         print(f"Error in LLM response: {e}")
         return None
 
+def ask_llm_structured(content, question, user_choice):
+    """
+    This function asks the LLM for the answer, whether it is relevant and, for "summary", a summary in one call.
+    It returns (answer, is_relevant), is_relevant is None when the reply could not be parsed.
+    """
+    try:
+        summary_field = ', "summary": "<the answer summarized in one or two sentences>"' if user_choice == "summary" else ""
+        prompt = (
+            f"Here is the content: {content}\n\n"
+            f"Question: {question}\n\n"
+            "Answer the question from the content, don't use your information, stick to the content. "
+            "Set is_relevant to 'yes' only if the answer specifically answers the question's topic, "
+            "'no' if it is about something else or the content has no relevant information. "
+            f'Respond only with JSON: {{"answer": "<answer>", "is_relevant": "yes" or "no"{summary_field}}}'
+        )
+        response = model.generate_content(prompt)
+        if not (response.candidates and len(response.candidates) > 0):
+            return None, False
+        candidate = response.candidates[0]
+        if candidate.finish_reason == "SAFETY":
+            return "Content generation blocked due to safety concerns.", False
+        text = candidate.content.parts[0].text.strip()
+        try:
+            parsed = parser.parse(text, STRUCTURED_SCHEMA)
+        except ParseError:
+            # Not the JSON we asked for, keep the text as the answer and let the caller check it
+            return text, None
+        answer = (parsed["summary"] or parsed["answer"]) if user_choice == "summary" else parsed["answer"]
+        if parsed["is_relevant"] is None:
+            return answer, None
+        return answer, parsed["is_relevant"] == "yes"
+    except Exception as e:
+        print(f"Error in LLM response: {e}")
+        return None, False
+
+def ask_llm_about_questions(content, questions):
+    """
+    This function sends several questions about the same content to the LLM in one prompt.
+    It returns one {"answer", "is_relevant"} dict per question, None where the LLM gave no usable answer.
+    """
+    results = [None] * len(questions)
+    try:
+        numbered = "\n".join(f"{number}. {question}" for number, question in enumerate(questions, 1))
+        prompt = (
+            f"Here is the content: {content}\n\n"
+            f"Answer each of these questions, don't use your information, stick to the content:\n{numbered}\n\n"
+            "For every question also say if the answer directly addresses the question ('yes') or not ('no'). "
+            "Respond only with a JSON array, one object per question: "
+            '[{"id": <question number>, "answer": "<answer>", "is_relevant": "yes" or "no"}]'
+        )
+        response = model.generate_content(prompt)
+        if not (response.candidates and len(response.candidates) > 0):
+            return results
+        for item in parser.parse_list(response.candidates[0].content.parts[0].text, QUESTION_ANSWER_SCHEMA):
+            number = item["id"]
+            if 1 <= number <= len(questions):
+                results[number - 1] = {"answer": item["answer"], "is_relevant": item["is_relevant"]}
+    except Exception as e:
+        print(f"Error in LLM response for multiple questions: {e}")
+    return results
+
 def find_answer_in_url(url, question, user_choice):
     """
     This function extracts content from the URL and asks the LLM
@@ -110,21 +220,49 @@ def find_answer_in_url(url, question, user_choice):
         return answer
     return None
 
+def evaluate_url(url, question, user_choice):
+    """
+    This function returns the answer found in the URL and whether it is relevant to the question.
+    """
+    if not SINGLE_CALL:
+        answer = find_answer_in_url(url, question, user_choice)
+        return answer, bool(answer) and analyze_answer_relevance(answer, question)
+    content = extract_content_from_url(url)
+    if not content:
+        return None, False
+    answer, relevant = ask_llm_structured(content, question, user_choice)
+    if answer and relevant is None:
+        relevant = analyze_answer_relevance(answer, question)
+    return answer, bool(answer) and relevant
+
 def search_additional_links(question, num_results=5):
     """
     This function searches Google for additional links based on the question.
-    It returns a list of URLs from the search results.
+    It returns a list of URLs from the search results, repeated questions are answered from search_cache.
     """
+    cached = search_cache.get(question, num_results)
+    if cached is not None:
+        return cached
     print(f"Searching the web for more information about: {question}")
     try:
         search_results = []
         for url in search(question, num_results=num_results):
             search_results.append(url)
+        search_cache.put(question, num_results, search_results)
         return search_results
     except Exception as e:
         print(f"Error during web search: {e}")
         return []
 
+def search_and_prefetch(question, prefetch):
+    """
+    This function runs the web search for a question and downloads the first `prefetch` results into page_cache.
+    """
+    links = search_additional_links(question)
+    for link in links[:prefetch]:
+        extract_content_from_url(link)
+    return links
+
 def analyze_answer_relevance(answer, question):
     """
     This function sends the answer and the question to the LLM to check if the answer is relevant.
@@ -157,33 +295,38 @@ def analyze_answer_relevance(answer, question):
         return False
 
 
-def search_for_answer(url, question, user_choice, max_attempts=2):
+def search_for_answer(url, question, user_choice, max_attempts=2, check_url=True):
     """
     This function searches for the answer by first looking at the provided URL.
     If no relevant answer is found, it searches additional links obtained via a web search.
+    With check_url=False the provided URL is known not to answer the question and only the web search runs.
     """
-    print(f"\nSearching the provided URL: {url}\n")
-    
-    # Try the user's provided URL first
-    answer = find_answer_in_url(url, question, user_choice)
-    
-    # Check if the LLM finds the answer relevant to the question
-    if answer and analyze_answer_relevance(answer, question):
-        print(f"Relevant answer found in the provided URL: {answer}\n")
-        return answer, url
-    else:
-        print("No relevant answer found in the provided URL, searching additional links.")
+    speculative = None
+    if check_url and SPECULATIVE_SEARCH:
+        speculative = background.submit(search_and_prefetch, question, max_attempts)
+
+    if check_url:
+        print(f"\nSearching the provided URL: {url}\n")
+        
+        # Try the user's provided URL first, the LLM also says whether its answer is relevant to the question
+        answer, relevant = evaluate_url(url, question, user_choice)
+        
+        if relevant:
+            print(f"Relevant answer found in the provided URL: {answer}\n")
+            return answer, url
+        else:
+            print("No relevant answer found in the provided URL, searching additional links.")
     
     # If no relevant answer is found, search for additional links
-    additional_links = search_additional_links(question)
+    additional_links = speculative.result() if speculative else search_additional_links(question)
     
     attempts = 0
     for link in additional_links:
         print(f"Searching in URL: {link}\n")
-        answer = find_answer_in_url(link, question, user_choice)
+        answer, relevant = evaluate_url(link, question, user_choice)
         
         # Check if the LLM finds the answer relevant
-        if answer and analyze_answer_relevance(answer, question):
+        if relevant:
             print(f"Relevant answer found in additional link: {answer}\n")
             return answer, link
         
@@ -221,12 +364,17 @@ def main():
         # Ask the user for their preferred type of answer: summary or detailed
         user_choice = get_user_input("Would you like a summary or a detailed answer? (summary/detailed): ", ["summary", "detailed"])
         
-        # Try to find the answer by searching through the user's URL and related links
-        answer, link = search_for_answer(user_url, question, user_choice)
+        # Reuse an earlier answer to the same question on this URL, otherwise search through the URL and related links
+        previous = history.lookup(user_url, question, user_choice)
+        if previous is not None:
+            print("This question was answered before, reusing that answer.")
+            answer, link = previous.answer, previous.link
+        else:
+            answer, link = search_for_answer(user_url, question, user_choice)
     
         if answer:
             print(f"\nAnswer: {answer}\nRelated Information Found in the link: {link}\n")
-            add_to_history(question, answer, link)
+            add_to_history(user_url, question, answer, link, user_choice)
         else:
             print("Sorry, the information couldn't be found.")
         
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import time
+from typing import Dict, Optional
+
+from fastapi import WebSocket
+
+HEARTBEAT = json.dumps({"type": "heartbeat"})
+
+
+class Connection:
+    """
+    One WebSocket with its bounded outbound queue. A writer task sends the queued messages in order,
+    so nobody awaits the network directly and one slow socket cannot hold up the others.
+    """
+    __slots__ = ("id", "websocket", "queue", "writer", "connected_at", "last_received", "last_sent", "dropped", "closed")
+
+    def __init__(self, connection_id: str, websocket: WebSocket, max_queue: int) -> None:
+        self.id = connection_id
+        self.websocket = websocket
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(max_queue)
+        self.writer: Optional[asyncio.Task] = None
+        self.connected_at = time.monotonic()
+        self.last_received = self.connected_at
+        self.last_sent = self.connected_at
+        self.dropped = 0
+        self.closed = False
+
+
+class ConnectionManager:
+    """
+    Registry of open WebSockets keyed by connection id, adding and removing one is O(1).
+    Every connection has an outbound queue of at most `max_queue` messages drained by its own writer task.
+    Personal messages wait up to `send_timeout` for room in the queue; broadcasts never wait and are
+    dropped for a full queue, or with `slow_policy="disconnect"` the slow client is disconnected instead.
+    A send that takes longer than `send_timeout` closes the connection. Every `heartbeat_interval` seconds
+    quiet connections get a {"type": "heartbeat"} message, and connections that sent nothing for
+    `idle_timeout` seconds (0 never) are closed, so dead sockets do not hold memory.
+    """
+    def __init__(self, max_queue: int = 256, send_timeout: float = 10.0, slow_policy: str = "drop",
+                 heartbeat_interval: float = 30.0, idle_timeout: float = 600.0) -> None:
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.slow_policy = slow_policy
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.connections: Dict[str, Connection] = {}
+        self._reaper: Optional[asyncio.Task] = None
+        self.stats: Dict[str, int] = {"connected": 0, "disconnected": 0, "sent": 0, "dropped": 0, "slow_disconnects": 0,
+                                      "send_timeouts": 0, "reaped": 0, "heartbeats": 0}
+
+    @staticmethod
+    def connection_id(websocket: WebSocket) -> str:
+        return str(id(websocket))
+
+    def queued(self) -> int:
+        """
+        Messages waiting in all outbound queues.
+        """
+        return sum(connection.queue.qsize() for connection in self.connections.values())
+
+    async def connect(self, websocket: WebSocket) -> str:
+        await websocket.accept()
+        connection = Connection(self.connection_id(websocket), websocket, self.max_queue)
+        connection.writer = asyncio.create_task(self._write(connection))
+        self.connections[connection.id] = connection
+        self.stats["connected"] += 1
+        if self._reaper is None and self.heartbeat_interval > 0:
+            self._reaper = asyncio.create_task(self._reap())
+        return connection.id
+
+    def disconnect(self, websocket: WebSocket) -> None:
+        connection = self.connections.pop(self.connection_id(websocket), None)
+        if connection is not None:
+            self._release(connection)
+
+    def touch(self, websocket: WebSocket) -> None:
+        """
+        Marks a message received from the client, which keeps the connection from being reaped as idle.
+        """
+        connection = self.connections.get(self.connection_id(websocket))
+        if connection is not None:
+            connection.last_received = time.monotonic()
+
+    async def send_personal_message(self, message: str, websocket: WebSocket) -> None:
+        connection = self.connections.get(self.connection_id(websocket))
+        if connection is None or connection.closed:
+            self.stats["dropped"] += 1
+            return
+        try:
+            await asyncio.wait_for(connection.queue.put(message), self.send_timeout)
+        except asyncio.TimeoutError:
+            # The client has not read anything for send_timeout, it is not coming back
+            self.stats["slow_disconnects"] += 1
+            self._close(connection, 1008)
+
+    async def broadcast(self, message: str) -> None:
+        """
+        Queues the message for every connection without waiting, the writers send it concurrently.
+        """
+        for connection in list(self.connections.values()):
+            self._offer(connection, message)
+
+    def _offer(self, connection: Connection, message: str) -> None:
+        if connection.closed:
+            return
+        try:
+            connection.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            if self.slow_policy == "disconnect":
+                self.stats["slow_disconnects"] += 1
+                self._close(connection, 1008)
+            else:
+                connection.dropped += 1
+                self.stats["dropped"] += 1
+
+    async def _write(self, connection: Connection) -> None:
+        while not connection.closed:
+            message = await connection.queue.get()
+            try:
+                await asyncio.wait_for(connection.websocket.send_text(message), self.send_timeout)
+            except asyncio.TimeoutError:
+                self.stats["send_timeouts"] += 1
+                self._close(connection, 1008)
+                return
+            except Exception:
+                # The socket is gone
+                self._close(connection, 1011)
+                return
+            connection.last_sent = time.monotonic()
+            self.stats["sent"] += 1
+
+    def _release(self, connection: Connection) -> None:
+        connection.closed = True
+        self.stats["disconnected"] += 1
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+
+    def _close(self, connection: Connection, code: int) -> None:
+        # Unregistered at once, so the queue is freed even if the client never completes the close handshake
+        if self.connections.get(connection.id) is not connection:
+            return
+        del self.connections[connection.id]
+        self._release(connection)
+        # The endpoint's receive_text then raises WebSocketDisconnect and cancels the client's pipelines
+        asyncio.create_task(self._close_socket(connection.websocket, code))
+
+    @staticmethod
+    async def _close_socket(websocket: WebSocket, code: int) -> None:
+        try:
+            await websocket.close(code)
+        except Exception:
+            pass
+
+    async def _reap(self) -> None:
+        while self.connections:
+            await asyncio.sleep(self.heartbeat_interval)
+            now = time.monotonic()
+            for connection in list(self.connections.values()):
+                if self.idle_timeout > 0 and now - connection.last_received > self.idle_timeout:
+                    self.stats["reaped"] += 1
+                    self._close(connection, 1001)
+                elif now - connection.last_sent >= self.heartbeat_interval and connection.queue.empty():
+                    self.stats["heartbeats"] += 1
+                    self._offer(connection, HEARTBEAT)
+        self._reaper = None
+
+    def close(self) -> None:
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        for connection in list(self.connections.values()):
+            self._close(connection, 1001)
@@ -0,0 +1,161 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from shared_state import connect_sqlite
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """
+    Builds the cache key for a URL: lowercase scheme and host, no default port,
+    no fragment and query parameters in sorted order.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+class CachedPage:
+    """
+    Extracted text of a page plus the validators needed to revalidate it.
+    `links` holds the page's (URL, anchor text) pairs, None for entries stored before links were kept.
+    """
+    __slots__ = ("url", "text", "etag", "last_modified", "fetched_at", "links")
+
+    def __init__(self, url: str, text: str, etag: Optional[str], last_modified: Optional[str], fetched_at: float,
+                 links: Optional[List[Tuple[str, str]]] = None) -> None:
+        self.url = url
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+        self.links = links
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.time() - self.fetched_at < ttl
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ContentCache:
+    """
+    Two tier cache of extracted page text keyed by normalized URL.
+    Entries live in an in-memory LRU and, when `db_path` is set, in a SQLite file that survives restarts
+    and is shared by every worker process, a miss in this process's memory finds pages other workers stored.
+    Entries older than `ttl` are still returned so callers can revalidate them with a conditional request.
+    """
+    def __init__(self, max_entries: int = 256, ttl: float = 3600.0, db_path: Optional[str] = None, max_disk_entries: int = 10000) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, CachedPage]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._writes = 0
+        self.stats: Dict[str, int] = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "revalidated": 0, "stores": 0}
+        if db_path:
+            self._db = connect_sqlite(db_path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "url TEXT PRIMARY KEY, text TEXT NOT NULL, etag TEXT, last_modified TEXT,"
+                "fetched_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at)")
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(pages)")}
+            if "links" not in columns:
+                self._db.execute("ALTER TABLE pages ADD COLUMN links TEXT")
+            self._db.commit()
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        key = normalize_url(url)
+        with self._lock:
+            page = self._memory.get(key)
+            if page is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return page
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT text, etag, last_modified, fetched_at, links FROM pages WHERE url = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (time.time(), key))
+                    self._db.commit()
+                    links = [tuple(link) for link in json.loads(row[4])] if row[4] is not None else None
+                    page = CachedPage(key, row[0], row[1], row[2], row[3], links)
+                    self._remember(key, page)
+                    self.stats["disk_hits"] += 1
+                    return page
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, url: str, text: str, etag: Optional[str] = None, last_modified: Optional[str] = None,
+            links: Optional[List[Tuple[str, str]]] = None) -> CachedPage:
+        key = normalize_url(url)
+        page = CachedPage(key, text, etag, last_modified, time.time(), links)
+        with self._lock:
+            self._remember(key, page)
+            self.stats["stores"] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO pages (url, text, etag, last_modified, fetched_at, accessed_at, links) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, text, etag, last_modified, page.fetched_at, page.fetched_at, json.dumps(links) if links is not None else None),
+                )
+                self._writes += 1
+                if self._writes % 100 == 0:
+                    self._prune_disk()
+                self._db.commit()
+        return page
+
+    def mark_revalidated(self, page: CachedPage) -> None:
+        """
+        Restarts the TTL of an entry after the server answered 304 Not Modified.
+        """
+        page.fetched_at = time.time()
+        with self._lock:
+            self.stats["revalidated"] += 1
+            if self._db is not None:
+                self._db.execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (page.fetched_at, page.url))
+                self._db.commit()
+
+    def hit_rate(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def _remember(self, key: str, page: CachedPage) -> None:
+        self._memory[key] = page
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _prune_disk(self) -> None:
+        count = self._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        if count > self.max_disk_entries:
+            self._db.execute(
+                "DELETE FROM pages WHERE url IN (SELECT url FROM pages ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_disk_entries,),
+            )
+
+    def close(self) -> None:
+        # Under the lock, a call still running in a worker thread finishes before the connection goes away
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
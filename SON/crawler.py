@@ -0,0 +1,196 @@
+import asyncio
+import heapq
+import re
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+from content_cache import normalize_url
+from context_builder import BM25Index
+from extractor import Link
+from search_cache import SingleFlight
+
+# Name matched against the User-agent lines of robots.txt
+ROBOTS_AGENT = "LLMOmer"
+URL_WORD_RE = re.compile(r"[\W_]+")
+
+# (text, links, downloaded bytes) of a page, None when it could not be loaded
+LoadPage = Callable[[str], Awaitable[Optional[Tuple[str, List[Link], int]]]]
+# (content, url) -> the answer when the page answers the question
+Evaluate = Callable[[str, str], Awaitable[Optional[str]]]
+
+
+def link_document(url: str, text: str) -> str:
+    """
+    Text a link is scored on: the anchor text, counted twice, and the words of the URL path and query.
+    """
+    parts = urlsplit(url)
+    return f"{text} {text} {URL_WORD_RE.sub(' ', parts.path + ' ' + parts.query)}"
+
+
+def score_links(links: List[Link], question: str) -> List[float]:
+    """
+    BM25 of every link against the question, the page's other links are the corpus, so words that
+    appear in every link (site name, "home") count for little.
+    """
+    if not links:
+        return []
+    return BM25Index([link_document(url, text) for url, text in links]).scores(question).tolist()
+
+
+class RobotsPolicy:
+    """
+    robots.txt per host, fetched once and kept for `ttl` seconds. A robots.txt that is missing or
+    cannot be read allows everything. `fetch` returns the body of a URL or None.
+    """
+    def __init__(self, fetch: Callable[[str], Awaitable[Optional[str]]], ttl: float = 3600.0, max_hosts: int = 1024) -> None:
+        self.fetch = fetch
+        self.ttl = ttl
+        self.max_hosts = max_hosts
+        self._parsers: "OrderedDict[str, Tuple[RobotFileParser, float]]" = OrderedDict()
+        self._flights = SingleFlight()
+
+    async def parser(self, url: str) -> RobotFileParser:
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}".lower()
+        entry = self._parsers.get(origin)
+        if entry is not None and time.time() - entry[1] < self.ttl:
+            self._parsers.move_to_end(origin)
+            return entry[0]
+        return await self._flights.run(origin, lambda: self._load(origin))
+
+    async def _load(self, origin: str) -> RobotFileParser:
+        body = await self.fetch(f"{origin}/robots.txt")
+        parser = RobotFileParser()
+        parser.parse((body or "").splitlines())
+        self._parsers[origin] = (parser, time.time())
+        self._parsers.move_to_end(origin)
+        while len(self._parsers) > self.max_hosts:
+            self._parsers.popitem(last=False)
+        return parser
+
+    async def allowed(self, url: str) -> Tuple[bool, Optional[float]]:
+        """
+        Returns whether the URL may be fetched and the host's Crawl-delay, if it sets one.
+        """
+        parser = await self.parser(url)
+        delay = parser.crawl_delay(ROBOTS_AGENT)
+        return parser.can_fetch(ROBOTS_AGENT, url), float(delay) if delay is not None else None
+
+
+class DomainThrottle:
+    """
+    Keeps at least the requested interval between two crawler fetches from the same host.
+    Slots are reserved before sleeping, so concurrent crawls of one host queue up instead of bursting.
+    """
+    def __init__(self, max_hosts: int = 4096) -> None:
+        self.max_hosts = max_hosts
+        self._next_slot: Dict[str, float] = {}
+
+    async def wait(self, host: str, interval: float) -> None:
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(host, 0.0))
+        self._next_slot[host] = slot + interval
+        if len(self._next_slot) > self.max_hosts:
+            self._next_slot = {key: value for key, value in self._next_slot.items() if value > now}
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class LinkCrawler:
+    """
+    Bounded best-first crawl from a page that did not answer the question. Links are ranked by
+    score_links (no LLM call), discounted by `depth_decay` per hop, and the best `concurrency` are
+    fetched and evaluated at once. The crawl stops at the first relevant answer or when the depth,
+    page or byte budget runs out. robots.txt and a per-host delay are respected.
+    """
+    def __init__(self, robots: RobotsPolicy, throttle: DomainThrottle, max_depth: int = 2, max_pages: int = 4,
+                 max_bytes: int = 4 * 1024 * 1024, concurrency: int = 2, min_score: float = 0.5,
+                 depth_decay: float = 0.5, domain_delay: float = 0.5, max_delay: float = 5.0) -> None:
+        self.robots = robots
+        self.throttle = throttle
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.concurrency = concurrency
+        self.min_score = min_score
+        self.depth_decay = depth_decay
+        self.domain_delay = domain_delay
+        self.max_delay = max_delay
+        self.stats: Dict[str, int] = {"crawls": 0, "answered": 0, "pages": 0, "bytes": 0, "robots_blocked": 0, "too_slow": 0, "errors": 0}
+
+    async def crawl(self, root_url: str, root_links: List[Link], question: str, load_page: LoadPage, evaluate: Evaluate,
+                    skip: Iterable[str] = ()) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Returns the first relevant answer and the page it came from, (None, None) when the budget runs out.
+        URLs in `skip` (e.g. already evaluated search results) are never visited.
+        """
+        self.stats["crawls"] += 1
+        visited = {normalize_url(root_url)} | {normalize_url(url) for url in skip}
+        frontier: List[Tuple[float, int, str, int]] = []
+        self._push(frontier, visited, root_links, question, 1)
+        pending: Dict[asyncio.Task, str] = {}
+        pages = 0
+        downloaded = 0
+        try:
+            while frontier or pending:
+                while frontier and len(pending) < max(self.concurrency, 1) and pages < self.max_pages and downloaded < self.max_bytes:
+                    _, _, url, depth = heapq.heappop(frontier)
+                    # Counted on launch, so concurrent expansions cannot overshoot the page budget
+                    pages += 1
+                    pending[asyncio.create_task(self._visit(url, depth, load_page, evaluate))] = url
+                if not pending:
+                    break
+
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    url = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception:
+                        self.stats["errors"] += 1
+                        continue
+                    if result is None:
+                        continue
+                    answer, links, size, depth = result
+                    downloaded += size
+                    self.stats["bytes"] += size
+                    if answer:
+                        self.stats["answered"] += 1
+                        return answer, url
+                    if depth < self.max_depth:
+                        self._push(frontier, visited, links, question, depth + 1)
+            return None, None
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def _push(self, frontier: List[Tuple[float, int, str, int]], visited: set, links: List[Link], question: str, depth: int) -> None:
+        for (url, _), score in zip(links, score_links(links, question)):
+            key = normalize_url(url)
+            if score < self.min_score or key in visited:
+                continue
+            visited.add(key)
+            # heapq is a min-heap, the sequence number keeps document order among equal scores
+            heapq.heappush(frontier, (-score * self.depth_decay ** (depth - 1), len(visited), url, depth))
+
+    async def _visit(self, url: str, depth: int, load_page: LoadPage, evaluate: Evaluate) -> Optional[Tuple[Optional[str], List[Link], int, int]]:
+        allowed, crawl_delay = await self.robots.allowed(url)
+        if not allowed:
+            self.stats["robots_blocked"] += 1
+            return None
+        interval = max(self.domain_delay, crawl_delay or 0.0)
+        if interval > self.max_delay:
+            self.stats["too_slow"] += 1
+            return None
+        await self.throttle.wait(urlsplit(url).netloc.lower(), interval)
+        page = await load_page(url)
+        if page is None:
+            return None
+        self.stats["pages"] += 1
+        content, links, size = page
+        answer = await evaluate(content, url) if content else None
+        return answer, links, size, depth
@@ -0,0 +1,185 @@
+import asyncio
+import threading
+from typing import Dict, Mapping, Optional, Protocol
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+# Brotli is decoded by httpx and urllib3 only when the brotli package is installed
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+USER_AGENT = "Mozilla/5.0 (compatible; LLMOmer/1.0)"
+
+# Default pool and safety limits shared by both fetchers
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 20
+PER_HOST_LIMIT = 6
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = 15.0
+MAX_BODY_BYTES = 5 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+class FetchError(Exception):
+    """
+    Raised when a page cannot be downloaded.
+    """
+
+
+class BodyTooLarge(FetchError):
+    """
+    Raised when a page body grows past the configured size cap.
+    """
+
+
+class ChunkSink(Protocol):
+    """
+    Receives a body while it downloads: start() with the declared charset and the final URL, then feed() for every chunk.
+    """
+    def start(self, encoding: Optional[str], url: str) -> None: ...
+
+    def feed(self, chunk: bytes) -> None: ...
+
+
+class FetchedPage:
+    """
+    A downloaded page: final URL, status, headers and the decoded (decompressed) body bytes.
+    """
+    def __init__(self, url: str, status_code: int, headers: Mapping[str, str], content: bytes, encoding: Optional[str]) -> None:
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding or "utf-8"
+
+    @property
+    def text(self) -> str:
+        try:
+            return self.content.decode(self.encoding, errors="replace")
+        except LookupError:
+            return self.content.decode("utf-8", errors="replace")
+
+
+def _host(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+def _charset(headers) -> Optional[str]:
+    # Only trust an explicit charset, otherwise FetchedPage falls back to utf-8
+    for param in headers.get("Content-Type", "").split(";")[1:]:
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "charset":
+            return value.strip("'\" ") or None
+    return None
+
+
+def _check_declared_size(headers, url: str, max_bytes: int) -> None:
+    declared = headers.get("Content-Length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise BodyTooLarge(f"{url} declares {declared} bytes, limit is {max_bytes}")
+
+
+class AsyncFetcher:
+    """
+    Pooled keep-alive fetcher for the async server. Connections are reused across requests,
+    each host gets at most `per_host_limit` concurrent downloads and bodies are streamed
+    so a download is aborted as soon as it passes `max_bytes`.
+    """
+    def __init__(self, max_connections: int = MAX_CONNECTIONS, max_keepalive_connections: int = MAX_KEEPALIVE_CONNECTIONS,
+                 per_host_limit: int = PER_HOST_LIMIT, connect_timeout: float = CONNECT_TIMEOUT,
+                 read_timeout: float = READ_TIMEOUT, max_bytes: int = MAX_BODY_BYTES) -> None:
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            headers={"User-Agent": USER_AGENT, "Accept-Encoding": ACCEPT_ENCODING},
+            follow_redirects=True,
+        )
+        self._per_host_limit = per_host_limit
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.max_bytes = max_bytes
+
+    def _semaphore(self, url: str) -> asyncio.Semaphore:
+        host = _host(url)
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._host_semaphores[host] = asyncio.Semaphore(self._per_host_limit)
+        return semaphore
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None, sink: Optional["ChunkSink"] = None) -> FetchedPage:
+        async with self._semaphore(url):
+            try:
+                async with self._client.stream("GET", url, headers=headers) as response:
+                    if response.status_code != 304:  # Not Modified answers a conditional request
+                        response.raise_for_status()
+                    _check_declared_size(response.headers, url, self.max_bytes)
+                    if sink is not None:
+                        sink.start(_charset(response.headers), str(response.url))
+                    chunks = []
+                    size = 0
+                    async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            raise BodyTooLarge(f"{url} is larger than {self.max_bytes} bytes")
+                        chunks.append(chunk)
+                        if sink is not None:
+                            sink.feed(chunk)
+                    return FetchedPage(str(response.url), response.status_code, response.headers, b"".join(chunks), _charset(response.headers))
+            except httpx.HTTPError as e:
+                raise FetchError(str(e)) from e
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+class Fetcher:
+    """
+    Blocking counterpart of AsyncFetcher built on a pooled requests.Session, used by the CLI.
+    """
+    def __init__(self, max_connections: int = MAX_CONNECTIONS, per_host_limit: int = PER_HOST_LIMIT,
+                 connect_timeout: float = CONNECT_TIMEOUT, read_timeout: float = READ_TIMEOUT,
+                 max_bytes: int = MAX_BODY_BYTES) -> None:
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=per_host_limit)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._session.headers.update({"User-Agent": USER_AGENT, "Accept-Encoding": ACCEPT_ENCODING})
+        self._timeout = (connect_timeout, read_timeout)
+        self._per_host_limit = per_host_limit
+        self._host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+        self.max_bytes = max_bytes
+
+    def _semaphore(self, url: str) -> threading.BoundedSemaphore:
+        host = _host(url)
+        with self._lock:
+            semaphore = self._host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = self._host_semaphores[host] = threading.BoundedSemaphore(self._per_host_limit)
+        return semaphore
+
+    def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> FetchedPage:
+        with self._semaphore(url):
+            try:
+                with self._session.get(url, headers=headers, timeout=self._timeout, stream=True) as response:
+                    if response.status_code != 304:  # Not Modified answers a conditional request
+                        response.raise_for_status()
+                    _check_declared_size(response.headers, url, self.max_bytes)
+                    chunks = []
+                    size = 0
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            raise BodyTooLarge(f"{url} is larger than {self.max_bytes} bytes")
+                        chunks.append(chunk)
+                    return FetchedPage(response.url, response.status_code, response.headers, b"".join(chunks), _charset(response.headers))
+            except requests.RequestException as e:
+                raise FetchError(str(e)) from e
+
+    def close(self) -> None:
+        self._session.close()
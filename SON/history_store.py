@@ -0,0 +1,204 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from content_cache import normalize_url
+from llm_cache import jaccard, normalize_question, same_question, shingles
+from shared_state import connect_sqlite
+
+# Largest page of history returned at once
+MAX_PAGE_SIZE = 100
+
+
+class HistoryEntry:
+    __slots__ = ("id", "session_id", "url", "question", "answer", "link", "answer_type", "created_at")
+
+    def __init__(self, id: int, session_id: str, url: str, question: str, answer: Optional[str], link: Optional[str],
+                 answer_type: str, created_at: float) -> None:
+        self.id = id
+        self.session_id = session_id
+        self.url = url
+        self.question = question
+        self.answer = answer
+        self.link = link
+        self.answer_type = answer_type
+        self.created_at = created_at
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "session_id": self.session_id,
+            "url": self.url,
+            "question": self.question,
+            "answer": self.answer,
+            "link": self.link,
+            "answer_type": self.answer_type,
+            "created_at": self.created_at,
+        }
+
+
+class HistoryStore:
+    """
+    Questions and answers per session in SQLite, in a file when `db_path` is set and in memory otherwise.
+    lookup() finds an earlier answer to the same or a near-identical question on the same URL: candidates come
+    from an FTS5 index over the questions (a plain scan of the URL's recent rows when this SQLite has no FTS5)
+    and the best one counts when its shingle similarity reaches `similarity`, its key terms are the same and it
+    is younger than `max_age`. The default `similarity` of 0 reuses exact (normalized) questions only.
+    page() reads history newest first with keyset pagination, so only one page is ever loaded.
+    """
+    _COLUMNS = "id, session_id, url, question, answer, link, answer_type, created_at"
+
+    def __init__(self, db_path: Optional[str] = None, similarity: float = 0.0, max_age: float = 86400.0,
+                 max_entries: int = 100000, candidates: int = 20) -> None:
+        self.similarity = similarity
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.candidates = candidates
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.stats: Dict[str, int] = {"stores": 0, "exact_hits": 0, "near_hits": 0, "misses": 0, "pages": 0}
+        self._db = connect_sqlite(db_path or ":memory:")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS history ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, url TEXT NOT NULL, question TEXT NOT NULL,"
+            "question_key TEXT NOT NULL, answer TEXT, link TEXT, answer_type TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS history_lookup ON history (url, answer_type, question_key)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS history_session ON history (session_id, id)")
+        try:
+            # External content table, the question text is only stored once
+            self._db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(question_key, content='history', content_rowid='id')"
+            )
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+        self._db.commit()
+
+    def add(self, session_id: str, url: str, question: str, answer: Optional[str], link: Optional[str],
+            answer_type: str = "detailed") -> int:
+        """
+        Stores one question of a session, `answer` is None when nothing was found.
+        """
+        key = normalize_question(question)
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO history (session_id, url, question, question_key, answer, link, answer_type, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (session_id, normalize_url(url), question, key, answer, link, answer_type, time.time()),
+            )
+            if self.fts:
+                self._db.execute("INSERT INTO history_fts (rowid, question_key) VALUES (?, ?)", (cursor.lastrowid, key))
+            self.stats["stores"] += 1
+            self._writes += 1
+            if self._writes % 1000 == 0:
+                self._prune()
+            self._db.commit()
+            return cursor.lastrowid
+
+    def lookup(self, url: str, question: str, answer_type: str = "detailed") -> Optional[HistoryEntry]:
+        """
+        Returns the newest answered entry for the same or a near-identical question on the same URL.
+        """
+        if self.max_age <= 0:
+            return None
+        key = normalize_question(question)
+        url = normalize_url(url)
+        oldest = time.time() - self.max_age
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {self._COLUMNS} FROM history WHERE url = ? AND answer_type = ? AND question_key = ? "
+                "AND answer IS NOT NULL AND created_at >= ? ORDER BY id DESC LIMIT 1",
+                (url, answer_type, key, oldest),
+            ).fetchone()
+            if row is not None:
+                self.stats["exact_hits"] += 1
+                return HistoryEntry(*row)
+            if self.similarity > 0 and key:
+                entry = self._near(url, key, answer_type, oldest)
+                if entry is not None:
+                    self.stats["near_hits"] += 1
+                    return entry
+            self.stats["misses"] += 1
+            return None
+
+    def _near(self, url: str, key: str, answer_type: str, oldest: float) -> Optional[HistoryEntry]:
+        columns = ", ".join(f"h.{column.strip()}" for column in self._COLUMNS.split(","))
+        if self.fts:
+            # Any shared word makes a candidate, bm25 puts the closest questions first
+            match = " OR ".join(f'"{word}"' for word in dict.fromkeys(key.split()))
+            rows = self._db.execute(
+                f"SELECT {columns}, h.question_key FROM history_fts JOIN history h ON h.id = history_fts.rowid "
+                "WHERE history_fts MATCH ? AND h.url = ? AND h.answer_type = ? AND h.answer IS NOT NULL AND h.created_at >= ? "
+                "ORDER BY bm25(history_fts) LIMIT ?",
+                (match, url, answer_type, oldest, self.candidates),
+            ).fetchall()
+        else:
+            rows = self._db.execute(
+                f"SELECT {columns}, h.question_key FROM history h WHERE h.url = ? AND h.answer_type = ? "
+                "AND h.answer IS NOT NULL AND h.created_at >= ? ORDER BY h.id DESC LIMIT ?",
+                (url, answer_type, oldest, self.candidates),
+            ).fetchall()
+        question_shingles = shingles(key)
+        best: Optional[Tuple[float, tuple]] = None
+        for row in rows:
+            score = jaccard(question_shingles, shingles(row[-1]))
+            if score >= self.similarity and same_question(key, row[-1]) and (best is None or score > best[0]):
+                best = (score, row)
+        return HistoryEntry(*best[1][:-1]) if best is not None else None
+
+    def page(self, session_id: Optional[str] = None, before: Optional[int] = None, limit: int = 20,
+             query: Optional[str] = None) -> Tuple[List[HistoryEntry], Optional[int]]:
+        """
+        Returns up to `limit` entries older than the id `before`, newest first, and the cursor of the next page
+        (None on the last one). Without `session_id` the history of every session is read; `query` keeps only
+        questions matching those words.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        conditions: List[str] = []
+        params: List = []
+        if session_id is not None:
+            conditions.append("session_id = ?")
+            params.append(session_id)
+        if before is not None:
+            conditions.append("id < ?")
+            params.append(before)
+        words = normalize_question(query or "").split()
+        if words:
+            if self.fts:
+                conditions.append("id IN (SELECT rowid FROM history_fts WHERE history_fts MATCH ?)")
+                params.append(" ".join(f'"{word}"' for word in words))
+            else:
+                for word in words:
+                    conditions.append("question_key LIKE ?")
+                    params.append(f"%{word}%")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            # One row more than asked tells whether there is a next page
+            rows = self._db.execute(
+                f"SELECT {self._COLUMNS} FROM history {where} ORDER BY id DESC LIMIT ?", (*params, limit + 1)
+            ).fetchall()
+            self.stats["pages"] += 1
+        entries = [HistoryEntry(*row) for row in rows[:limit]]
+        return entries, entries[-1].id if len(rows) > limit else None
+
+    def _prune(self) -> None:
+        newest = self._db.execute("SELECT MAX(id) FROM history").fetchone()[0] or 0
+        cutoff = newest - self.max_entries
+        if cutoff <= 0:
+            return
+        if self.fts:
+            # External content tables need the old values to delete index entries
+            self._db.execute(
+                "INSERT INTO history_fts (history_fts, rowid, question_key) "
+                "SELECT 'delete', id, question_key FROM history WHERE id <= ?", (cutoff,)
+            )
+        self._db.execute("DELETE FROM history WHERE id <= ?", (cutoff,))
+
+    def close(self) -> None:
+        # Under the lock, a call still running in a worker thread finishes before the connection goes away
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
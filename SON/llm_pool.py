@@ -0,0 +1,317 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, List, Optional, Set
+
+# Status codes and SDK exception names (Anthropic, Bedrock, Google API core) that mean "try again later"
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504, 529}
+THROTTLING_STATUS_CODES = {429, 529}
+RETRYABLE_ERROR_NAMES = {
+    "RateLimitError", "OverloadedError", "InternalServerError", "APITimeoutError", "APIConnectionError",
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded",
+    "ThrottlingException", "ServiceUnavailableException", "ModelNotReadyException", "TimeoutError",
+}
+THROTTLING_ERROR_NAMES = {"RateLimitError", "OverloadedError", "ResourceExhausted", "TooManyRequests", "ThrottlingException"}
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    code = getattr(error, "status_code", None)
+    if code is None:
+        code = getattr(error, "code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    return _status_code(error) in RETRYABLE_STATUS_CODES or type(error).__name__ in RETRYABLE_ERROR_NAMES
+
+
+def is_throttled(error: BaseException) -> bool:
+    return _status_code(error) in THROTTLING_STATUS_CODES or type(error).__name__ in THROTTLING_ERROR_NAMES
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Requests-per-minute limiter, `burst` requests may go out back to back.
+    """
+    def __init__(self, requests_per_minute: float, burst: Optional[float] = None) -> None:
+        self.rate = requests_per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1.0, self.rate * 5)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self) -> bool:
+        self._refill()
+        return self._tokens >= 1
+
+    async def acquire(self) -> None:
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class PoolMember:
+    """
+    One LLM client (a provider in one region) with its rate limit, health and latency history.
+    The client must provide generate_content_async and stream_content_async, generate_content_async
+    also takes json_schema when the pool is asked for provider-native JSON output.
+    """
+    def __init__(self, name: str, provider: str, client, requests_per_minute: Optional[float] = None, burst: Optional[float] = None) -> None:
+        self.name = name
+        self.provider = provider
+        self.client = client
+        self.bucket = TokenBucket(requests_per_minute, burst) if requests_per_minute else None
+        self.latencies: Deque[float] = deque(maxlen=200)
+        self.inflight = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.stats: Dict[str, int] = {"requests": 0, "successes": 0, "failures": 0, "throttled": 0}
+
+    @property
+    def model_id(self) -> str:
+        return self.client.model_id
+
+    def healthy(self, now: float) -> bool:
+        return self.cooldown_until <= now
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class LLMPool:
+    """
+    Dispatches prompts over several LLM clients. The pool duck-types the single LLM classes
+    (model_id, generate_content_async, stream_content_async), so callers do not change.
+
+    Members are tried in provider order (the first provider is preferred, later ones are failover targets) and,
+    within a provider, the least busy region goes first. Throttled or failing members are put in a cooldown and
+    a retry goes to a healthy member the request has not tried yet, straight away; only when none is left does it
+    ask a tried member again after jittered exponential backoff (or the server's retry-after), and a request that runs past the
+    member's p95 latency gets a hedged duplicate on another member, the first answer wins and the other is cancelled.
+    """
+    def __init__(self, members: List[PoolMember], max_retries: int = 3, request_timeout: float = 60.0,
+                 base_backoff: float = 0.5, max_backoff: float = 8.0, failure_threshold: int = 3,
+                 failure_cooldown: float = 30.0, hedge: bool = True, hedge_min_samples: int = 20,
+                 hedge_min_delay: float = 1.0) -> None:
+        if not members:
+            raise ValueError("LLMPool needs at least one member")
+        self.members = members
+        self.max_retries = max_retries
+        self.request_timeout = request_timeout
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.failure_cooldown = failure_cooldown
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self._providers = list(dict.fromkeys(member.provider for member in members))
+        self.counters: Dict[str, int] = {"retries": 0, "failovers": 0, "hedges": 0, "hedge_wins": 0}
+
+    @property
+    def model_id(self) -> str:
+        return "|".join(dict.fromkeys(member.model_id for member in self.members))
+
+    def _pick(self, exclude: Set[PoolMember] = frozenset()) -> Optional[PoolMember]:
+        now = time.monotonic()
+        candidates = [member for member in self.members if member not in exclude]
+        if not candidates:
+            return None
+        healthy = [member for member in candidates if member.healthy(now)]
+        if not healthy:
+            return min(candidates, key=lambda member: member.cooldown_until)
+
+        def rank(member: PoolMember):
+            priority = self._providers.index(member.provider)
+            # A member with an empty token bucket goes behind every provider that can send right away
+            if member.bucket is not None and not member.bucket.available():
+                priority += len(self._providers)
+            return priority, member.inflight, member.percentile(0.5) or 0.0
+
+        return min(healthy, key=rank)
+
+    def _pick_retry(self, tried: Set[PoolMember]) -> PoolMember:
+        """
+        The member for the next attempt: a healthy one not tried yet for this request, a tried one only when none is left.
+        """
+        untried = self._pick(exclude=tried)
+        if untried is not None and untried.healthy(time.monotonic()):
+            return untried
+        return self._pick()
+
+    def _backoff(self, attempt: int, error: BaseException) -> float:
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        # Full jitter keeps retrying clients from synchronizing
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+
+    def _record_failure(self, member: PoolMember, error: BaseException, attempt: int) -> None:
+        member.stats["failures"] += 1
+        member.consecutive_failures += 1
+        now = time.monotonic()
+        if is_throttled(error):
+            member.stats["throttled"] += 1
+            member.cooldown_until = max(member.cooldown_until, now + self._backoff(attempt, error))
+        if member.consecutive_failures >= self.failure_threshold:
+            member.cooldown_until = max(member.cooldown_until, now + self.failure_cooldown)
+
+    def _record_success(self, member: PoolMember, latency: float) -> None:
+        member.stats["successes"] += 1
+        member.consecutive_failures = 0
+        member.latencies.append(latency)
+
+    async def _call(self, member: PoolMember, content: str, attempt: int, json_schema: Optional[Dict] = None) -> str:
+        if member.bucket is not None:
+            await member.bucket.acquire()
+        member.stats["requests"] += 1
+        member.inflight += 1
+        started = time.monotonic()
+        try:
+            # Clients without JSON mode only ever see the prompt
+            call = member.client.generate_content_async(content, json_schema=json_schema) if json_schema else member.client.generate_content_async(content)
+            output = await asyncio.wait_for(call, self.request_timeout)
+        except Exception as e:
+            self._record_failure(member, e, attempt)
+            raise
+        finally:
+            member.inflight -= 1
+        self._record_success(member, time.monotonic() - started)
+        return output
+
+    def _hedge_delay(self, member: PoolMember) -> Optional[float]:
+        if not self.hedge or len(self.members) < 2 or len(member.latencies) < self.hedge_min_samples:
+            return None
+        return max(member.percentile(0.95), self.hedge_min_delay)
+
+    async def _hedged_call(self, member: PoolMember, content: str, attempt: int, json_schema: Optional[Dict] = None,
+                           tried: Optional[Set[PoolMember]] = None) -> str:
+        primary = asyncio.ensure_future(self._call(member, content, attempt, json_schema))
+        delay = self._hedge_delay(member)
+        if delay is None:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        backup_member = self._pick(exclude={member})
+        if backup_member is None:
+            return await primary
+        if tried is not None:
+            tried.add(backup_member)
+        self.counters["hedges"] += 1
+        backup = asyncio.ensure_future(self._call(backup_member, content, attempt, json_schema))
+        pending = {primary, backup}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.counters["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def generate_content_async(self, content: str, json_schema: Optional[Dict] = None) -> str:
+        tried: Set[PoolMember] = set()
+        member = self._pick()
+        for attempt in range(self.max_retries + 1):
+            tried.add(member)
+            try:
+                return await self._hedged_call(member, content, attempt, json_schema, tried)
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    raise
+                self.counters["retries"] += 1
+                member = await self._next_attempt(tried, attempt, e)
+
+    async def _next_attempt(self, tried: Set[PoolMember], attempt: int, error: BaseException) -> PoolMember:
+        """
+        Fails over to a member not tried yet right away, asking a tried member again waits for the backoff first.
+        """
+        member = self._pick_retry(tried)
+        if member in tried:
+            await asyncio.sleep(self._backoff(attempt, error))
+        else:
+            self.counters["failovers"] += 1
+        return member
+
+    async def stream_content_async(self, content: str) -> AsyncIterator[str]:
+        """
+        Streams from one member. Failures before the first token are retried like generate_content_async,
+        once text has been yielded the error is raised to the caller.
+        """
+        tried: Set[PoolMember] = set()
+        member = self._pick()
+        for attempt in range(self.max_retries + 1):
+            tried.add(member)
+            if member.bucket is not None:
+                await member.bucket.acquire()
+            member.stats["requests"] += 1
+            member.inflight += 1
+            started = time.monotonic()
+            yielded = False
+            error: Optional[BaseException] = None
+            try:
+                async for text in member.client.stream_content_async(content):
+                    yielded = True
+                    yield text
+            except Exception as e:
+                self._record_failure(member, e, attempt)
+                if yielded or not is_retryable(e) or attempt == self.max_retries:
+                    raise
+                error = e
+            finally:
+                member.inflight -= 1
+            if error is None:
+                self._record_success(member, time.monotonic() - started)
+                return
+            # The next member is picked once this attempt no longer counts as in flight
+            self.counters["retries"] += 1
+            member = await self._next_attempt(tried, attempt, error)
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        return {
+            **self.counters,
+            "members": {
+                member.name: {
+                    **member.stats,
+                    "provider": member.provider,
+                    "inflight": member.inflight,
+                    "degraded": not member.healthy(now),
+                    "p50_seconds": member.percentile(0.5),
+                    "p95_seconds": member.percentile(0.95),
+                }
+                for member in self.members
+            },
+        }
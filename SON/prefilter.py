@@ -0,0 +1,123 @@
+import re
+import unicodedata
+from typing import Dict, Set
+
+from context_builder import BM25Index, chunk_text, tokenize
+
+# Stub pages served instead of the content: bot walls, cookie walls, errors and paywalls
+BLOCK_PAGE_RE = re.compile(
+    r"access denied|403 forbidden|404 not found|page not found|enable javascript|javascript is (?:disabled|required)"
+    r"|are you a robot|verify you are (?:a )?human|captcha|just a moment|accept (?:all )?cookies|cookie (?:policy|settings|consent)"
+    r"|subscribe to (?:continue|read)|sign in to continue|log in to continue",
+    re.IGNORECASE,
+)
+# Block page phrases only count on short pages, a long article may mention cookies or captchas
+BLOCK_PAGE_MAX_CHARS = 1500
+# Words of the question that look like names or numbers, e.g. "Guido", "1991", "GPT-4"
+ENTITY_RE = re.compile(r"(?<![\w'])(?:[A-Z][\w-]*|\d[\w.-]*)")
+# Characters sampled from the page for the script check
+SCRIPT_SAMPLE_CHARS = 5000
+# Terms are compared on their first letters, so "created" matches "creator" and "languages" matches "language"
+STEM_CHARS = 5
+
+
+def _stem(token: str) -> str:
+    return token[:STEM_CHARS]
+
+
+def _script(char: str) -> str:
+    # First word of the Unicode name: LATIN, CYRILLIC, CJK, ARABIC, ...
+    return unicodedata.name(char, "UNKNOWN").split(" ", 1)[0]
+
+
+def script_shares(text: str) -> Dict[str, float]:
+    """
+    Share of the letters of `text` written in each script.
+    """
+    counts: Dict[str, int] = {}
+    for char in text:
+        if char.isalpha():
+            script = _script(char)
+            counts[script] = counts.get(script, 0) + 1
+    total = sum(counts.values())
+    return {script: count / total for script, count in counts.items()} if total else {}
+
+
+class PrefilterResult:
+    """
+    Outcome of RelevancePrefilter.check, `reason` says why a page failed ("ok" when it passed).
+    """
+    __slots__ = ("passed", "score", "reason")
+
+    def __init__(self, passed: bool, score: float, reason: str) -> None:
+        self.passed = passed
+        self.score = score
+        self.reason = reason
+
+
+class RelevancePrefilter:
+    """
+    CPU-only check run on a fetched page before it is sent to the LLM. A page fails when it is shorter than
+    `min_chars`, looks like a block page, is written in another script than the question, or scores below
+    `min_score`. The score (0 to 1) blends the share of question terms on the page, the share found
+    together in the page's best BM25 chunk, and the share of the question's names and numbers present.
+    """
+    def __init__(self, min_chars: int = 200, min_score: float = 0.2, min_script_share: float = 0.2, chunk_words: int = 150) -> None:
+        self.min_chars = min_chars
+        self.min_score = min_score
+        self.min_script_share = min_script_share
+        self.chunk_words = chunk_words
+        self.stats: Dict[str, int] = {"checked": 0, "passed": 0, "too_short": 0, "blocked": 0, "language": 0, "low_score": 0,
+                                      "deferred_evaluated": 0, "llm_calls_saved": 0}
+
+    def check(self, content: str, question: str) -> PrefilterResult:
+        self.stats["checked"] += 1
+        result = self._check(content or "", question)
+        self.stats["passed" if result.passed else result.reason] += 1
+        return result
+
+    def _check(self, content: str, question: str) -> PrefilterResult:
+        if len(content) < self.min_chars:
+            return PrefilterResult(False, 0.0, "too_short")
+        if len(content) <= BLOCK_PAGE_MAX_CHARS and BLOCK_PAGE_RE.search(content):
+            return PrefilterResult(False, 0.0, "blocked")
+        if not self._same_script(content, question):
+            return PrefilterResult(False, 0.0, "language")
+
+        terms = {_stem(token) for token in tokenize(question)}
+        if not terms:
+            # Nothing to compare, leave the decision to the LLM
+            return PrefilterResult(True, 1.0, "ok")
+        page_terms = {_stem(token) for token in tokenize(content)}
+        score = self.score(content, question, terms, page_terms)
+        if score < self.min_score:
+            return PrefilterResult(False, score, "low_score")
+        return PrefilterResult(True, score, "ok")
+
+    def score(self, content: str, question: str, terms: Set[str], page_terms: Set[str]) -> float:
+        coverage = len(terms & page_terms) / len(terms)
+        chunks = chunk_text(content, self.chunk_words)
+        if len(chunks) > 1:
+            best_chunk = chunks[int(BM25Index(chunks).scores(question).argmax())]
+            chunk_coverage = len(terms & {_stem(token) for token in tokenize(best_chunk)}) / len(terms)
+        else:
+            chunk_coverage = coverage
+        entities = self._entities(question)
+        if not entities:
+            return 0.5 * coverage + 0.5 * chunk_coverage
+        entity_coverage = len(entities & page_terms) / len(entities)
+        return 0.4 * coverage + 0.4 * chunk_coverage + 0.2 * entity_coverage
+
+    @staticmethod
+    def _entities(question: str) -> Set[str]:
+        # The first word is capitalized anyway ("Who", "When"), only later capitals hint at a name
+        words = question.split(None, 1)
+        rest = words[1] if len(words) > 1 else ""
+        return {_stem(token) for match in ENTITY_RE.findall(rest) for token in tokenize(match)}
+
+    def _same_script(self, content: str, question: str) -> bool:
+        question_scripts = script_shares(question)
+        if not question_scripts:
+            return True
+        script = max(question_scripts, key=question_scripts.get)
+        return script_shares(content[:SCRIPT_SAMPLE_CHARS]).get(script, 0.0) >= self.min_script_share
@@ -0,0 +1,208 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+# Seconds a connection waits for another process's write lock before giving up
+BUSY_TIMEOUT = 10.0
+
+
+def connect_sqlite(path: str) -> sqlite3.Connection:
+    """
+    Opens a SQLite database that several server processes can use at once. In WAL mode readers never
+    wait for the writer and a writer waits up to BUSY_TIMEOUT for another process instead of failing
+    with "database is locked". synchronous=NORMAL drops the fsync per commit, a crash can only lose
+    the last commits, which is fine for caches. Such a wait blocks the calling thread, so the server
+    makes these calls in worker threads and never on the event loop.
+    """
+    db = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+    if path != ":memory:":
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+class StateBackend(ABC):
+    """
+    Key/value state with optional expiry, grouped in namespaces. Values are anything JSON can hold.
+    """
+    name = "base"
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Optional[Any]: ...
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None: ...
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str) -> None: ...
+
+    @abstractmethod
+    def items(self, namespace: str, limit: int = 1000) -> List[Tuple[str, Any]]: ...
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryBackend(StateBackend):
+    """
+    State in a dict of this process. Other uvicorn workers do not see it, so it only suits a single worker.
+    """
+    name = "memory"
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._data: Dict[Tuple[str, str], Tuple[Any, Optional[float]]] = {}
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get((namespace, key))
+            if entry is None:
+                return None
+            if entry[1] is not None and entry[1] <= time.time():
+                del self._data[(namespace, key)]
+                return None
+            return entry[0]
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._data[(namespace, key)] = (value, time.time() + ttl if ttl else None)
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._data.pop((namespace, key), None)
+
+    def items(self, namespace: str, limit: int = 1000) -> List[Tuple[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entries = [(key, value) for (space, key), (value, expires_at) in self._data.items()
+                       if space == namespace and (expires_at is None or expires_at > now)]
+        return entries[:limit]
+
+
+class SQLiteBackend(StateBackend):
+    """
+    State in a SQLite file every worker process on the host opens, so they all read the same values.
+    The caches keep their disk tiers in files next to it, which makes a page, search or LLM answer
+    cached by one worker a hit for the others. Expired rows are deleted every `prune_every` writes.
+    """
+    name = "sqlite"
+
+    def __init__(self, db_path: str = "state.sqlite3", prune_every: int = 1000) -> None:
+        self.db_path = db_path
+        self.prune_every = prune_every
+        self._lock = threading.Lock()
+        self._writes = 0
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._db = connect_sqlite(db_path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL,"
+            "PRIMARY KEY (namespace, key))"
+        )
+        self._db.commit()
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM state WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, key, time.time()),
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, ensure_ascii=False), now + ttl if ttl else None),
+            )
+            self._writes += 1
+            if self._writes % self.prune_every == 0:
+                self._db.execute("DELETE FROM state WHERE expires_at <= ?", (now,))
+            self._db.commit()
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+            self._db.commit()
+
+    def items(self, namespace: str, limit: int = 1000) -> List[Tuple[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, value FROM state WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?) LIMIT ?",
+                (namespace, time.time(), limit),
+            ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def close(self) -> None:
+        # Under the lock, a call still running in a worker thread finishes before the connection goes away
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def open_backend(spec: str) -> StateBackend:
+    """
+    Builds the backend named by `spec`: "memory", or "sqlite" optionally followed by ":" and the file path.
+    """
+    kind, _, path = spec.partition(":")
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "sqlite":
+        return SQLiteBackend(path or "state.sqlite3")
+    raise ValueError(f"Unknown state backend {spec!r}, expected memory or sqlite[:path]")
+
+
+class SessionRegistry:
+    """
+    Metadata of the WebSocket sessions of every worker: which process holds the socket, when it connected,
+    when it was last active and how many questions it asked. A session reconnecting to another worker
+    keeps its record. Records expire `ttl` seconds after the last activity, so sessions of a worker that
+    died without closing them disappear on their own.
+    """
+    NAMESPACE = "sessions"
+
+    def __init__(self, backend: StateBackend, ttl: float = 3600.0) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self.worker = os.getpid()
+
+    def open(self, session_id: str) -> Dict:
+        now = time.time()
+        record = self.backend.get(self.NAMESPACE, session_id) or {"created_at": now, "questions": 0}
+        record.update(worker=self.worker, connected=True, last_seen=now)
+        self.backend.set(self.NAMESPACE, session_id, record, self.ttl)
+        return record
+
+    def touch(self, session_id: str, questions: int = 0) -> None:
+        record = self.backend.get(self.NAMESPACE, session_id)
+        if record is None:
+            record = self.open(session_id)
+        record.update(worker=self.worker, connected=True, last_seen=time.time(), questions=record.get("questions", 0) + questions)
+        self.backend.set(self.NAMESPACE, session_id, record, self.ttl)
+
+    def close(self, session_id: str) -> None:
+        record = self.backend.get(self.NAMESPACE, session_id)
+        if record is not None and not record.get("questions"):
+            # A session that never asked anything, e.g. the id replaced by the client's earlier one
+            self.backend.delete(self.NAMESPACE, session_id)
+        elif record is not None and record.get("worker") == self.worker:
+            record.update(connected=False, last_seen=time.time())
+            self.backend.set(self.NAMESPACE, session_id, record, self.ttl)
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        return self.backend.get(self.NAMESPACE, session_id)
+
+    def active(self, limit: int = 1000) -> List[Dict]:
+        """
+        Connected sessions of all workers, most recently active first.
+        """
+        sessions = [{"session_id": key, **record} for key, record in self.backend.items(self.NAMESPACE, limit)
+                    if record.get("connected")]
+        return sorted(sessions, key=lambda record: record["last_seen"], reverse=True)
@@ -0,0 +1,114 @@
+"""
+Answers many (url, question) jobs with the Baseline.py pipeline and prints one NDJSON result per job.
+
+    python batch.py jobs.jsonl                # one {"url": ..., "question": ...} object per line
+    python batch.py jobs.csv --workers 8      # url,question columns
+    cat jobs.jsonl | python batch.py -
+
+Every distinct URL is fetched once, the questions on it are answered together in multi-question prompts,
+and only the jobs that page cannot answer go through Baseline.search_for_answer's web search.
+Progress output goes to stderr so stdout stays valid NDJSON.
+"""
+import argparse
+import csv
+import json
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import redirect_stdout
+from typing import Dict, List
+
+import Baseline
+from content_cache import normalize_url
+
+
+def load_jobs(path: str) -> List[Dict[str, str]]:
+    """
+    Reads jobs from a JSON lines file, a CSV file with url and question columns, or stdin ("-").
+    """
+    handle = sys.stdin if path == "-" else open(path, encoding="utf-8", newline="")
+    with handle:
+        if path.endswith(".csv"):
+            rows = list(csv.DictReader(handle))
+        else:
+            rows = [json.loads(line) for line in handle if line.strip()]
+    return [{"url": row["url"], "question": row["question"]} for row in rows]
+
+
+class ResultWriter:
+    """
+    Writes one NDJSON line per finished job, safe to call from worker threads.
+    """
+    def __init__(self, stream) -> None:
+        self._stream = stream
+        self._lock = threading.Lock()
+        self.written = 0
+
+    def write(self, index: int, job: Dict[str, str], answer, link) -> None:
+        line = json.dumps({"index": index, "url": job["url"], "question": job["question"], "answer": answer, "link": link}, ensure_ascii=False)
+        with self._lock:
+            self._stream.write(line + "\n")
+            self._stream.flush()
+            self.written += 1
+
+
+def answer_group(jobs: List[Dict[str, str]], indexes: List[int], group_size: int, writer: ResultWriter) -> List[int]:
+    """
+    Answers every job on one URL from a single fetch. Returns the jobs that still need a web search.
+    """
+    url = jobs[indexes[0]]["url"]
+    content = Baseline.extract_content_from_url(url)
+    if not content:
+        return indexes
+
+    unanswered = []
+    for start in range(0, len(indexes), group_size):
+        part = indexes[start:start + group_size]
+        results = Baseline.ask_llm_about_questions(content, [jobs[index]["question"] for index in part])
+        for index, result in zip(part, results):
+            if result and result.get("answer") and result.get("is_relevant") == "yes":
+                writer.write(index, jobs[index], result["answer"], url)
+            else:
+                unanswered.append(index)
+    return unanswered
+
+
+def search_job(jobs: List[Dict[str, str]], index: int, user_choice: str, writer: ResultWriter) -> List[int]:
+    job = jobs[index]
+    answer, link = Baseline.search_for_answer(job["url"], job["question"], user_choice, check_url=False)
+    writer.write(index, job, answer, link)
+    return []
+
+
+def run(jobs: List[Dict[str, str]], workers: int, group_size: int, user_choice: str, writer: ResultWriter) -> None:
+    groups: Dict[str, List[int]] = {}
+    for index, job in enumerate(jobs):
+        groups.setdefault(normalize_url(job["url"]), []).append(index)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(answer_group, jobs, indexes, group_size, writer) for indexes in groups.values()}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                # Web searches are queued on the same pool once their page turned out not to answer them
+                for index in future.result():
+                    pending.add(executor.submit(search_job, jobs, index, user_choice, writer))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("jobs", help="JSON lines or CSV file with url and question, - reads JSON lines from stdin")
+    parser.add_argument("--workers", type=int, default=8, help="fetches, LLM calls and searches running at once")
+    parser.add_argument("--group-size", type=int, default=10, help="most questions in one multi-question prompt")
+    parser.add_argument("--choice", choices=["summary", "detailed"], default="detailed")
+    args = parser.parse_args()
+
+    jobs = load_jobs(args.jobs)
+    writer = ResultWriter(sys.stdout)
+    with redirect_stdout(sys.stderr):
+        run(jobs, args.workers, args.group_size, args.choice, writer)
+    print(f"Answered {writer.written} of {len(jobs)} jobs", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Counts the Gemini round-trips and wall time per question of Baseline.search_for_answer with the
+single structured call (answer + relevance + summary) against the original separate calls.
+The model, pages and web search are fakes, every model call sleeps for --latency seconds.
+
+    python benchmarks/bench_baseline_calls.py
+    python benchmarks/bench_baseline_calls.py --questions 20 --latency 0.8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+from rich.console import Console
+from rich.table import Table
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Baseline  # noqa: E402
+
+
+class FakePart:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeResponse:
+    """
+    Mimics the candidates[0].content.parts[0].text shape of a google.generativeai response.
+    """
+    def __init__(self, text):
+        content = type("Content", (), {"parts": [FakePart(text)]})()
+        self.candidates = [type("Candidate", (), {"finish_reason": "STOP", "content": content})()]
+
+
+class FakeModel:
+    """
+    Answers from the content when it contains the question's topic word, recognizing the prompts Baseline sends.
+    """
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        time.sleep(self.latency)
+        topic = prompt.split("topic:", 1)[1].split()[0] if "topic:" in prompt else ""
+        found = topic and f"fact:{topic}" in prompt
+        answer = f"The page explains {topic}." if found else "The content does not mention it."
+        if "Respond only with JSON" in prompt:
+            return FakeResponse("```json\n" + json.dumps({
+                "answer": answer, "is_relevant": "yes" if found else "no", "summary": answer[:20],
+            }) + "\n```")
+        if prompt.startswith("Question:"):
+            return FakeResponse("yes" if "The page explains" in prompt else "no")
+        if prompt.startswith("Summarize"):
+            return FakeResponse(prompt.split(":", 1)[1].strip()[:20])
+        return FakeResponse(answer)
+
+
+def run(questions, single_call, user_choice, latency):
+    model = FakeModel(latency)
+    Baseline.model = model
+    Baseline.SINGLE_CALL = single_call
+    start = time.perf_counter()
+    answered = 0
+    with redirect_stdout(StringIO()):
+        for index in range(questions):
+            # Every other question is answered by the provided URL, the rest by the first search result
+            answer, _ = Baseline.search_for_answer(f"https://provided/{index}", f"What about topic:t{index} ?", user_choice)
+            answered += answer is not None
+    return model.calls, time.perf_counter() - start, answered
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds per fake model call")
+    args = parser.parse_args()
+
+    def page(url):
+        index = int(url.rsplit("/", 1)[1])
+        if url.startswith("https://provided/"):
+            return f"Some text. fact:t{index} is here." if index % 2 == 0 else "Some unrelated text."
+        return f"Search result text. fact:t{index} explained."
+
+    Baseline.extract_content_from_url = page
+    Baseline.SPECULATIVE_SEARCH = False
+    Baseline.search_additional_links = lambda question, num_results=5: [
+        f"https://result/{question.split('topic:t')[1].split()[0]}"
+    ]
+
+    table = Table(title=f"{args.questions} questions, {args.latency}s per model call")
+    for column in ("mode", "answer type", "answered", "calls/question", "seconds/question", "saved"):
+        table.add_column(column, justify="left" if column in ("mode", "answer type") else "right")
+    for user_choice in ("detailed", "summary"):
+        separate_calls, separate_time, answered = run(args.questions, False, user_choice, args.latency)
+        table.add_row("separate calls", user_choice, f"{answered}", f"{separate_calls / args.questions:.1f}",
+                      f"{separate_time / args.questions:.2f}", "")
+        single_calls, single_time, answered = run(args.questions, True, user_choice, args.latency)
+        table.add_row("single call", user_choice, f"{answered}", f"{single_calls / args.questions:.1f}",
+                      f"{single_time / args.questions:.2f}", f"{1 - single_time / separate_time:.0%}")
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Broadcasts to many simulated WebSocket clients, one of them stalled, once with the old sequential loop
+(await send_text on each connection in turn) and once through ConnectionManager's queues and writer tasks.
+Reports how long until every healthy client has the message and how long removing all clients, in random
+order, takes.
+
+    python benchmarks/bench_connections.py
+    python benchmarks/bench_connections.py --clients 5000 --send-ms 1 --stall 5
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connections import ConnectionManager  # noqa: E402
+
+
+class FakeSocket:
+    def __init__(self, delay):
+        self.delay = delay
+        self.received = asyncio.Event()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        await asyncio.sleep(self.delay)
+        self.received.set()
+
+    async def close(self, code=1000):
+        pass
+
+
+async def sequential(sockets, healthy, deadline):
+    # What ConnectionManager did before: a list, one send after another, list.remove per disconnect
+    connections = list(sockets)
+    started = time.perf_counter()
+
+    async def broadcast():
+        for connection in connections:
+            await connection.send_text("message")
+
+    task = asyncio.create_task(broadcast())
+    delivered = await wait_for_all(healthy, deadline)
+    elapsed = time.perf_counter() - started
+    task.cancel()
+    started = time.perf_counter()
+    for connection in leaving(sockets):
+        connections.remove(connection)
+    return elapsed if delivered else None, time.perf_counter() - started
+
+
+async def queued(sockets, healthy, deadline, send_timeout):
+    manager = ConnectionManager(send_timeout=send_timeout, heartbeat_interval=0)
+    for socket in sockets:
+        await manager.connect(socket)
+    started = time.perf_counter()
+    await manager.broadcast("message")
+    delivered = await wait_for_all(healthy, deadline)
+    elapsed = time.perf_counter() - started
+    started = time.perf_counter()
+    for socket in leaving(sockets):
+        manager.disconnect(socket)
+    return elapsed if delivered else None, time.perf_counter() - started
+
+
+def leaving(sockets):
+    # Clients leave in no particular order, the same order for both managers
+    order = list(sockets)
+    random.Random(0).shuffle(order)
+    return order
+
+
+async def wait_for_all(sockets, deadline):
+    try:
+        await asyncio.wait_for(asyncio.gather(*(socket.received.wait() for socket in sockets)), deadline)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+async def run(args):
+    table = Table(title=f"Broadcast to {args.clients} clients, {args.send_ms} ms per send, 1 client stalled for {args.stall} s")
+    for column in ("manager", "all healthy clients served", "remove all clients"):
+        table.add_column(column, justify="left" if column == "manager" else "right")
+    for name in ("sequential list", "queues + writers"):
+        healthy = [FakeSocket(args.send_ms / 1000) for _ in range(args.clients - 1)]
+        # The stalled client sits near the front, as a client connected early would
+        sockets = healthy[:1] + [FakeSocket(args.stall)] + healthy[1:]
+        if name == "sequential list":
+            served, removal = await sequential(sockets, healthy, args.stall * 2)
+        else:
+            served, removal = await queued(sockets, healthy, args.stall * 2, args.stall / 2)
+        table.add_row(name, f"{served * 1000:.0f} ms" if served is not None else f"> {args.stall * 2} s",
+                      f"{removal * 1000:.1f} ms")
+    Console().print(table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--send-ms", type=float, default=0.5, help="time one send takes")
+    parser.add_argument("--stall", type=float, default=5.0, help="seconds the stalled client blocks a send")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
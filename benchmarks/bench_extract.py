@@ -0,0 +1,112 @@
+"""
+Compares HTML to text throughput and output size of the extractor backends against the
+original find_content_from_url parsing (BeautifulSoup html.parser + get_text).
+
+    python benchmarks/bench_extract.py                  # synthetic pages
+    python benchmarks/bench_extract.py page1.html ...   # saved pages
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Callable, List
+
+from bs4 import BeautifulSoup
+from rich.console import Console
+from rich.table import Table
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extractor import StreamingExtractor, available_backends, get_extractor  # noqa: E402
+
+WORDS = "python language guido design release version syntax library module interpreter memory typing speed".split()
+
+
+def synthetic_page(paragraphs: int, seed: int) -> str:
+    rng = random.Random(seed)
+    menu = "".join(f"<li><a href='/section/{i}'>Section {i}</a></li>" for i in range(60))
+    body = "".join(
+        f"<p>{' '.join(rng.choice(WORDS) for _ in range(rng.randint(40, 120)))}</p>" for _ in range(paragraphs)
+    )
+    return (
+        "<html><head><title>Page</title>"
+        + "<script>var tracking = {};</script>" * 20
+        + "<style>.a{color:red}</style>" * 10
+        + f"</head><body><header><nav><ul>{menu}</ul></nav></header>"
+        + "<div class='cookie-consent'>We use cookies to improve your experience. Accept all cookies</div>"
+        + f"<main><article><h1>Python</h1>{body}</article></main>"
+        + f"<aside class='sidebar'><ul>{menu}</ul></aside>"
+        + f"<footer><ul>{menu}</ul><p>Copyright</p></footer></body></html>"
+    )
+
+
+def original_extract(html: str) -> str:
+    soup = BeautifulSoup(html, "html.parser")
+    return soup.get_text(separator=" ", strip=True)
+
+
+def streaming_extract(html: str) -> str:
+    stream = StreamingExtractor(get_extractor("lxml"))
+    data = html.encode("utf-8")
+    stream.start("utf-8")
+    for i in range(0, len(data), 64 * 1024):
+        stream.feed(data[i:i + 64 * 1024])
+    return stream.close()
+
+
+def measure(extract: Callable[[str], str], pages: List[str], rounds: int):
+    output_chars = sum(len(extract(page)) for page in pages)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for page in pages:
+            extract(page)
+    elapsed = time.perf_counter() - start
+    return elapsed, output_chars
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="saved HTML pages, synthetic pages are used when empty")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--paragraphs", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.files:
+        pages = [open(path, encoding="utf-8", errors="replace").read() for path in args.files]
+    else:
+        pages = [synthetic_page(args.paragraphs, seed) for seed in range(args.pages)]
+    input_bytes = sum(len(page.encode("utf-8")) for page in pages)
+
+    candidates = [("find_content_from_url (bs4 html.parser)", original_extract)]
+    for backend in available_backends():
+        candidates.append((f"{backend} (raw text)", get_extractor(backend, strip_boilerplate=False).extract))
+        candidates.append((f"{backend} (boilerplate stripped)", get_extractor(backend).extract))
+    if "lxml" in available_backends():
+        candidates.append(("lxml streaming (boilerplate stripped)", streaming_extract))
+
+    table = Table(title=f"{len(pages)} pages, {input_bytes / 1e6:.1f} MB of HTML, {args.rounds} rounds")
+    for column in ("extractor", "pages/s", "MB/s", "speedup", "output chars", "est. tokens", "output vs original"):
+        table.add_column(column, justify="right" if column != "extractor" else "left")
+
+    baseline_elapsed, baseline_chars = None, None
+    for name, extract in candidates:
+        elapsed, output_chars = measure(extract, pages, args.rounds)
+        if baseline_elapsed is None:
+            baseline_elapsed, baseline_chars = elapsed, output_chars
+        processed = len(pages) * args.rounds
+        table.add_row(
+            name,
+            f"{processed / elapsed:.1f}",
+            f"{input_bytes * args.rounds / elapsed / 1e6:.1f}",
+            f"{baseline_elapsed / elapsed:.1f}x",
+            f"{output_chars}",
+            f"{(output_chars + 3) // 4}",
+            f"{output_chars / baseline_chars:.0%}",
+        )
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    main()
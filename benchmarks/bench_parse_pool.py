@@ -0,0 +1,90 @@
+"""
+Parses many large pages at once through ParsePool, once in threads of this process (0 workers) and once
+in worker processes, and reports pages per second and how late the event loop's timers fire meanwhile.
+Loop lag is what every other WebSocket session feels while pages are parsed.
+
+    python benchmarks/bench_parse_pool.py
+    python benchmarks/bench_parse_pool.py --pages 32 --kb 2048 --workers 4 --backend bs4
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extractor import get_extractor  # noqa: E402
+from parse_pool import ParsePool  # noqa: E402
+
+
+def make_page(kb):
+    paragraph = "<p>Some paragraph text about the topic <a href='/page{0}'>with a link {0}</a> and more words.</p>"
+    parts = ["<html><head><title>Large page</title></head><body><nav>Home About</nav><main>"]
+    size, index = 0, 0
+    while size < kb * 1024:
+        parts.append(paragraph.format(index))
+        size += len(parts[-1])
+        index += 1
+    parts.append("</main><footer>Footer</footer></body></html>")
+    return "".join(parts).encode()
+
+
+async def measure(pool, page, pages):
+    """
+    Returns the wall time of parsing `pages` copies at once and the timer lag samples in milliseconds.
+    """
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append((time.perf_counter() - started - 0.005) * 1000)
+
+    tick = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await asyncio.gather(*(pool.parse(page, "utf-8", f"https://example.com/{index}") for index in range(pages)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await tick
+    return elapsed, lags
+
+
+async def run(args):
+    page = make_page(args.kb)
+    extractor = get_extractor(args.backend)
+    table = Table(title=f"{args.pages} pages of {len(page) // 1024} KiB, {extractor.name} backend, {os.cpu_count()} CPUs")
+    for column in ("mode", "pages/s", "loop lag p50", "loop lag p99", "loop lag max"):
+        table.add_column(column, justify="left" if column == "mode" else "right")
+    for workers in (0, args.workers):
+        pool = ParsePool(extractor, workers=workers, inline_max_bytes=args.inline_kb * 1024)
+        await pool.warm_up()
+        await measure(pool, page, 1)
+        elapsed, lags = await measure(pool, page, args.pages)
+        pool.close()
+        lags.sort()
+        mode = "threads" if workers == 0 else f"{workers} processes"
+        table.add_row(mode, f"{args.pages / elapsed:.1f}", f"{statistics.median(lags):.1f} ms",
+                      f"{lags[int(len(lags) * 0.99)]:.1f} ms", f"{lags[-1]:.1f} ms")
+    Console().print(table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=16)
+    parser.add_argument("--kb", type=int, default=1024, help="page size in KiB")
+    parser.add_argument("--workers", type=int, default=max(os.cpu_count() or 1, 2))
+    parser.add_argument("--inline-kb", type=int, default=256, help="pages below this size are parsed in a thread")
+    parser.add_argument("--backend", default="auto")
+    asyncio.run(run(parser.parse_args()))
+
+
+# Worker processes import this file again, only the parent runs the benchmark
+if __name__ == "__main__":
+    main()
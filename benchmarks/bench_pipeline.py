@@ -0,0 +1,301 @@
+"""
+Drives main.py's /ws pipeline end to end with no network access: pages come from a local fixture server,
+`search` is a fake provider and the LLM is a fake pool member with configurable latency and replies.
+Reports QPS, p50/p95/p99 latency and memory per concurrent WebSocket session.
+
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --requests 400 --concurrency 32 --llm-latency 0.8 --first-hit 0.3
+    python benchmarks/bench_pipeline.py --pages saved_pages/ --output results.json   # recorded pages, JSON for CI
+
+Each question has one answer sentence. It sits on the provided page with probability --first-hit,
+otherwise on one of the search results, so both the direct path and the fallback path are exercised.
+"""
+import argparse
+import asyncio
+import http.server
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+from rich.console import Console
+from rich.table import Table
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# main.py reads its settings at import time: fake provider, memory-only caches
+os.environ.setdefault("LLM", "Claude")
+for name in ("CONTENT_CACHE_PATH", "LLM_CACHE_PATH", "SEARCH_CACHE_PATH", "HISTORY_PATH"):
+    os.environ.setdefault(name, "")
+os.environ.setdefault("STATE_BACKEND", "memory")
+
+import uvicorn  # noqa: E402
+import websockets  # noqa: E402
+
+import main  # noqa: E402
+from bench_extract import synthetic_page  # noqa: E402
+from llm_pool import LLMPool, PoolMember  # noqa: E402
+
+QUESTION_RE = re.compile(r"zorblat(\d+)")
+
+
+class Fixtures:
+    """
+    Pages for every question: /q<i>/provided and /q<i>/result<j>, with the answer sentence on exactly one of them.
+    """
+    def __init__(self, questions: int, results: int, first_hit: float, recorded: List[str], seed: int) -> None:
+        rng = random.Random(seed)
+        self.results = results
+        self.pages: Dict[str, bytes] = {}
+        self.answer_page: Dict[int, str] = {}
+        for index in range(questions):
+            paths = [f"/q{index}/provided"] + [f"/q{index}/result{j}" for j in range(results)]
+            answer_path = paths[0] if rng.random() < first_hit else rng.choice(paths[1:])
+            self.answer_page[index] = answer_path
+            for path in paths:
+                html = rng.choice(recorded) if recorded else synthetic_page(40, rng.randrange(1 << 30))
+                if path == answer_path:
+                    sentence = f"<p>The zorblat{index} value is ANSWER-{index}, measured in the lab.</p>"
+                    # Inside the main content, the extractor keeps only the <main> text of a page that has one
+                    closing = next((tag for tag in ("</article>", "</main>", "</body>") if tag in html), None)
+                    html = html.replace(closing, sentence + closing, 1) if closing else html + sentence
+                self.pages[path] = html.encode("utf-8")
+
+    def serve(self) -> str:
+        pages = self.pages
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                body = pages.get(self.path.split("?")[0])
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{server.server_port}"
+
+
+class FakeLLM:
+    """
+    Answers "yes" when the prompt contains the question's answer sentence. Latency is lognormal around
+    `latency` seconds, a `malformed` share of replies is wrapped in prose or code fences.
+    """
+    model_id = "fake-llm"
+
+    def __init__(self, latency: float, jitter: float, malformed: float, token_delay: float, seed: int) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.malformed = malformed
+        self.token_delay = token_delay
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    def _delay(self) -> float:
+        return self.latency * math.exp(self.rng.gauss(0, self.jitter)) if self.jitter else self.latency
+
+    def _reply(self, prompt: str) -> str:
+        self.calls += 1
+        match = QUESTION_RE.search(prompt.rsplit("Question", 1)[-1])
+        found = match is not None and f"ANSWER-{match.group(1)}" in prompt
+        reply = json.dumps({
+            "answer": f"The value is ANSWER-{match.group(1)}." if found else "I dont find the information from the content.",
+            "is_relevant": "yes" if found else "no",
+            "decision": "search_links",
+        })
+        if self.rng.random() < self.malformed:
+            reply = f"Sure, here is the JSON you asked for:\n```json\n{reply}\n```\nLet me know if you need more."
+        return reply
+
+    async def generate_content_async(self, content: str, json_schema: Optional[Dict] = None) -> str:
+        await asyncio.sleep(self._delay())
+        return self._reply(content)
+
+    async def stream_content_async(self, content: str):
+        await asyncio.sleep(self._delay())
+        reply = self._reply(content)
+        for start in range(0, len(reply), 8):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield reply[start:start + 8]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(int(math.ceil(fraction * len(ordered))) - 1, len(ordered) - 1)] if fraction > 0 else ordered[0]
+
+
+async def ask(ws_url: str, base: str, index: int, stream: bool) -> Dict:
+    started = time.perf_counter()
+    async with websockets.connect(ws_url, max_size=None) as websocket:
+        await websocket.send(json.dumps({
+            "url": f"{base}/q{index}/provided",
+            "question": f"What is the zorblat{index} value?",
+            "stream": stream,
+        }))
+        while True:
+            raw = await websocket.recv()
+            if not raw.startswith("{"):
+                continue  # plain text broadcasts such as "Client disconnected"
+            message = json.loads(raw)
+            if message.get("type") == "busy":
+                return {"latency": time.perf_counter() - started, "status": "busy"}
+            if "answer" in message and "type" not in message:
+                answered = f"ANSWER-{index}" in (message.get("answer") or "")
+                return {"latency": time.perf_counter() - started, "status": "answered" if answered else "unanswered"}
+
+
+async def run_load(ws_url: str, base: str, requests: int, concurrency: int, distinct: int, stream: bool, sample_memory: bool = False) -> Dict:
+    queue: asyncio.Queue = asyncio.Queue()
+    for request in range(requests):
+        queue.put_nowait(request % distinct)
+    results: List[Dict] = []
+    peak = [0]
+
+    async def worker():
+        while not queue.empty():
+            index = queue.get_nowait()
+            try:
+                results.append(await ask(ws_url, base, index, stream))
+            except Exception as e:
+                results.append({"latency": 0.0, "status": f"error: {e!r}"})
+
+    async def sampler():
+        while True:
+            peak[0] = max(peak[0], tracemalloc.get_traced_memory()[0])
+            await asyncio.sleep(0.01)
+
+    sampling = asyncio.create_task(sampler()) if sample_memory else None
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    if sampling is not None:
+        sampling.cancel()
+    return {"results": results, "elapsed": elapsed, "peak": peak[0]}
+
+
+def start_server() -> str:
+    config = uvicorn.Config(main.app, host="127.0.0.1", port=0, log_level="warning", ws_max_size=16 * 1024 * 1024)
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return f"ws://127.0.0.1:{port}/ws"
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent WebSocket sessions")
+    parser.add_argument("--distinct", type=int, default=0, help="distinct questions, fewer than --requests exercises the caches (default: all distinct)")
+    parser.add_argument("--first-hit", type=float, default=0.5, help="share of questions answered by the provided URL")
+    parser.add_argument("--results", type=int, default=3, help="search results per question")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="median seconds per fake LLM call")
+    parser.add_argument("--llm-jitter", type=float, default=0.3, help="lognormal sigma of the LLM latency, 0 for constant")
+    parser.add_argument("--malformed", type=float, default=0.1, help="share of LLM replies wrapped in prose")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed chunks")
+    parser.add_argument("--search-latency", type=float, default=0.2, help="seconds per fake web search")
+    parser.add_argument("--stream", action="store_true", help="request progress and token events")
+    parser.add_argument("--pages", help="directory of recorded .html pages used as page bodies")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="keep main.py's console logging")
+    args = parser.parse_args()
+    if not args.verbose:
+        main.console = Console(file=open(os.devnull, "w"))
+    distinct = args.distinct or args.requests
+
+    recorded: List[str] = []
+    if args.pages:
+        for name in sorted(os.listdir(args.pages)):
+            if name.endswith((".html", ".htm")):
+                with open(os.path.join(args.pages, name), encoding="utf-8", errors="replace") as handle:
+                    recorded.append(handle.read())
+    fixtures = Fixtures(distinct, args.results, args.first_hit, recorded, args.seed)
+    base = fixtures.serve()
+
+    llm = FakeLLM(args.llm_latency, args.llm_jitter, args.malformed, args.token_delay, args.seed)
+    main.model = LLMPool([PoolMember("fake", "fake", llm)], hedge=False)
+
+    def fake_search(question: str, num_results: int = 5):
+        time.sleep(args.search_latency)
+        index = int(QUESTION_RE.search(question).group(1))
+        return [f"{base}/q{index}/result{j}" for j in range(min(args.results, num_results))]
+
+    main.search = fake_search
+    ws_url = start_server()
+
+    load = asyncio.run(run_load(ws_url, base, args.requests, args.concurrency, distinct, args.stream))
+    llm_calls = llm.calls
+
+    # Separate pass for memory, tracemalloc slows everything down
+    memory_requests = args.concurrency
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    memory = asyncio.run(run_load(ws_url, base, memory_requests, args.concurrency, memory_requests, args.stream, sample_memory=True))
+    tracemalloc.stop()
+
+    latencies = [result["latency"] for result in load["results"] if result["status"] in ("answered", "unanswered")]
+    statuses: Dict[str, int] = {}
+    for result in load["results"]:
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+    report = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "qps": args.requests / load["elapsed"],
+        "p50_seconds": percentile(latencies, 0.50),
+        "p95_seconds": percentile(latencies, 0.95),
+        "p99_seconds": percentile(latencies, 0.99),
+        "statuses": statuses,
+        "llm_calls_per_request": llm_calls / args.requests,
+        "memory_per_session_kib": max(memory["peak"] - baseline, 0) / args.concurrency / 1024,
+        "llm_pool": main.model.stats()["members"]["fake"],
+        "parser": main.response_parser.stats,
+    }
+
+    table = Table(title=f"{args.requests} requests, {args.concurrency} sessions, LLM {args.llm_latency}s, search {args.search_latency}s")
+    for column in ("QPS", "p50", "p95", "p99", "answered", "LLM calls/request", "memory/session"):
+        table.add_column(column, justify="right")
+    table.add_row(
+        f"{report['qps']:.1f}",
+        f"{report['p50_seconds'] * 1000:.0f} ms",
+        f"{report['p95_seconds'] * 1000:.0f} ms",
+        f"{report['p99_seconds'] * 1000:.0f} ms",
+        f"{statuses.get('answered', 0)}/{args.requests}",
+        f"{report['llm_calls_per_request']:.2f}",
+        f"{report['memory_per_session_kib']:.0f} KiB",
+    )
+    Console().print(table)
+    others = {status: count for status, count in statuses.items() if status not in ("answered", "unanswered")}
+    if others:
+        Console().print(f"[bold red]Not answered normally:[/bold red] {others}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main_cli()
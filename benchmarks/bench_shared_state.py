@@ -0,0 +1,97 @@
+"""
+Runs several processes against one ContentCache file, the way uvicorn workers share it, once with a plain
+SQLite connection (rollback journal, fsync per commit) and once with shared_state.connect_sqlite (WAL).
+Every process stores its own pages and then reads all pages, so most reads are pages another process
+stored. Reports operations per second over all processes, the share of reads that hit and the
+"database is locked" errors.
+
+    python benchmarks/bench_shared_state.py
+    python benchmarks/bench_shared_state.py --workers 8 --pages 500
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import content_cache  # noqa: E402
+from content_cache import ContentCache  # noqa: E402
+from shared_state import connect_sqlite  # noqa: E402
+
+
+def plain_connect(path):
+    return sqlite3.connect(path, check_same_thread=False)
+
+
+def open_cache(mode, db_path):
+    # WAL is a property of the file, so even the schema must be created with the mode's connection
+    content_cache.connect_sqlite = plain_connect if mode == "plain" else connect_sqlite
+    return ContentCache(max_entries=16, db_path=db_path)
+
+
+def worker(mode, db_path, worker_id, workers, pages, barrier, results):
+    cache = open_cache(mode, db_path)
+    text = "page text " * 200
+    barrier.wait()
+    started = time.perf_counter()
+    errors = hits = reads = 0
+    for index in range(pages):
+        try:
+            cache.put(f"https://example.com/{worker_id}/{index}", text)
+        except sqlite3.OperationalError:
+            errors += 1
+    # Every page is stored before anyone reads
+    barrier.wait()
+    for index in range(pages):
+        for other in range(workers):
+            try:
+                reads += 1
+                hits += cache.get(f"https://example.com/{other}/{index}") is not None
+            except sqlite3.OperationalError:
+                errors += 1
+    results.put((time.perf_counter() - started, pages + reads, hits, reads, errors))
+    cache.close()
+
+
+def run(mode, workers, pages):
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "content_cache.sqlite3")
+        # Create the schema once so the workers only race on the data
+        open_cache(mode, db_path).close()
+        barrier = multiprocessing.Barrier(workers)
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=worker, args=(mode, db_path, index, workers, pages, barrier, results))
+                     for index in range(workers)]
+        for process in processes:
+            process.start()
+        outcomes = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+    elapsed = max(outcome[0] for outcome in outcomes)
+    operations, hits, reads, errors = (sum(outcome[column] for outcome in outcomes) for column in range(1, 5))
+    return operations / elapsed, hits / reads, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=200, help="pages each worker stores")
+    args = parser.parse_args()
+    table = Table(title=f"{args.workers} processes sharing one content cache, {os.cpu_count()} CPUs")
+    for column in ("connection", "ops/s", "hit rate", "lock errors"):
+        table.add_column(column, justify="left" if column == "connection" else "right")
+    for mode in ("plain", "wal"):
+        throughput, hit_rate, errors = run(mode, args.workers, args.pages)
+        table.add_row(mode, f"{throughput:.0f}", f"{hit_rate:.0%}", str(errors))
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Measures how long `import main` takes and which modules dominate it, once per LLM setting.
+Every run is a fresh interpreter started with -X importtime, so nothing is cached between runs.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 5 --llm Claude --llm Gemini --top 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+from rich.console import Console
+from rich.table import Table
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(llm, build):
+    """
+    Runs one interpreter and returns the -X importtime rows as {module: cumulative microseconds}
+    and the total wall time in milliseconds, including build_model() when `build` is set.
+    """
+    code = "import time; s = time.perf_counter(); import main"
+    if build:
+        code += "; main.build_model()"
+    code += "; print(round((time.perf_counter() - s) * 1000, 1))"
+    env = dict(os.environ, LLM=llm, CONTENT_CACHE_PATH="", LLM_CACHE_PATH="", SEARCH_CACHE_PATH="", HISTORY_PATH="", STATE_BACKEND="memory")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Keep the indentation, nested imports are printed indented under their parent
+        modules[name[1:].rstrip()] = int(cumulative)
+    return modules, float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--llm", action="append", help="LLM setting to measure, repeatable (default Claude, Gemini, Claude,Gemini)")
+    parser.add_argument("--top", type=int, default=6, help="slowest imports of main to list")
+    args = parser.parse_args()
+
+    console = Console()
+    table = Table(title=f"import main, median of {args.runs} runs")
+    for column in ("LLM", "import ms", "import + build_model ms", "slowest imports"):
+        table.add_column(column, justify="left" if column in ("LLM", "slowest imports") else "right")
+    for llm in args.llm or ["Claude", "Gemini", "Claude,Gemini"]:
+        imports, built, modules = [], [], {}
+        for _ in range(args.runs):
+            modules, elapsed = import_times(llm, build=False)
+            imports.append(elapsed)
+            built.append(import_times(llm, build=True)[1])
+        # main's own imports are the ones -X importtime prints one level (two spaces) deep
+        top = sorted(((name.strip(), us) for name, us in modules.items() if name.startswith("  ") and name[2] != " "),
+                     key=lambda item: -item[1])
+        slowest = ", ".join(f"{name} {us / 1000:.0f}" for name, us in top[:args.top])
+        table.add_row(llm, f"{statistics.median(imports):.0f}", f"{statistics.median(built):.0f}", slowest)
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
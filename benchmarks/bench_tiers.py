@@ -0,0 +1,148 @@
+"""
+Answers questions over several candidate pages each, the way the link search does: pages are read in rank
+order until one answers. Runs once with the answer model alone and once behind a triage model that screens
+every page first, both fakes with configurable latency, and reports answer-model calls, time per question,
+estimated cost per tier (list prices of the default models) and how many questions were still answered.
+
+    python benchmarks/bench_tiers.py
+    python benchmarks/bench_tiers.py --questions 100 --pages 8 --answer-latency 1.5 --triage-miss 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# main.py reads its settings at import time: fake provider, memory-only caches, and no near-duplicate
+# question hits, the generated questions differ only in their number
+os.environ.setdefault("LLM", "Claude")
+for name in ("CONTENT_CACHE_PATH", "LLM_CACHE_PATH", "SEARCH_CACHE_PATH", "HISTORY_PATH"):
+    os.environ.setdefault(name, "")
+os.environ.setdefault("STATE_BACKEND", "memory")
+os.environ.setdefault("LLM_CACHE_SIMILARITY", "0")
+
+import main  # noqa: E402
+from llm_pool import LLMPool, PoolMember  # noqa: E402
+from model_tiers import MODEL_PRICES, TierUsage  # noqa: E402
+
+ANSWER_RE = re.compile(r"The zorblat (\w+) answer")
+FILLER = "Unrelated filler sentence about something else entirely. "
+
+
+class FakeModel:
+    """
+    Finds the answer sentence in the prompt. The triage fake misses it with probability `miss`.
+    """
+    def __init__(self, model_id, latency, triage, miss=0.0, seed=0):
+        self.model_id = model_id
+        self.latency = latency
+        self.triage = triage
+        self.miss = miss
+        self.rng = random.Random(seed)
+
+    async def generate_content_async(self, prompt, json_schema=None):
+        await asyncio.sleep(self.latency)
+        match = ANSWER_RE.search(prompt)
+        relevant = match is not None and not (self.triage and self.rng.random() < self.miss)
+        reply = {"is_relevant": "yes" if relevant else "no", "decision": "search_links"}
+        if not self.triage:
+            reply["answer"] = f"It is {match.group(1)}. " * 40 if relevant else "I dont find the information from the content."
+        return json.dumps(reply)
+
+
+def fake_pool(name, model):
+    return LLMPool([PoolMember(name, "fake", model)])
+
+
+def candidate_pages(questions, pages, run, seed):
+    rng = random.Random(seed)
+    cases = []
+    for index in range(questions):
+        answer_at = rng.randrange(pages)
+        cases.append((f"What is zorblat {run}{index}?", [
+            f"Page {page} for question {run}{index}. " + FILLER * 200 + (f"The zorblat {run}{index} answer is here. " if page == answer_at else "")
+            for page in range(pages)
+        ]))
+    return cases
+
+
+async def answer(question, pages):
+    for content in pages:
+        result = await main.call_llm_with_json(content, question)
+        if result["is_relevant"] == "yes":
+            return True
+    return False
+
+
+async def run_mode(name, args):
+    main.model = fake_pool("answer", FakeModel(main.TIER_MODELS["answer"]["claude"], args.answer_latency, False))
+    main.triage_model = None
+    if name == "tiered":
+        main.triage_model = fake_pool("triage", FakeModel(main.TIER_MODELS["triage"]["claude"], args.triage_latency, True,
+                                                          args.triage_miss, args.seed))
+    main.tier_usage = TierUsage()
+    main.tier_usage.set_price("answer", MODEL_PRICES[main.model.model_id])
+    if main.triage_model is not None:
+        main.tier_usage.set_price("triage", MODEL_PRICES[main.triage_model.model_id])
+
+    cases = candidate_pages(args.questions, args.pages, name.replace(" ", "_"), args.seed)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def one(question, pages):
+        async with semaphore:
+            started = time.perf_counter()
+            found = await answer(question, pages)
+            latencies.append(time.perf_counter() - started)
+            return found
+
+    answered = sum(await asyncio.gather(*(one(question, pages) for question, pages in cases)))
+    stats = main.tier_usage.stats()
+    latencies.sort()
+    return {
+        "answer_calls": stats["tiers"].get("answer", {}).get("calls", 0),
+        "triage_calls": stats["tiers"].get("triage", {}).get("calls", 0),
+        "p50": latencies[len(latencies) // 2],
+        "answer_cost": stats["tiers"].get("answer", {}).get("cost_usd", 0.0),
+        "triage_cost": stats["tiers"].get("triage", {}).get("cost_usd", 0.0),
+        "answered": answered,
+    }
+
+
+async def run(args):
+    table = Table(title=f"{args.questions} questions, {args.pages} candidate pages each, answer model {args.answer_latency} s, "
+                        f"triage model {args.triage_latency} s")
+    columns = ("routing", "answer calls", "triage calls", "p50 per question", "answer cost", "triage cost", "total cost", "answered")
+    for column in columns:
+        table.add_column(column, justify="left" if column == "routing" else "right")
+    for name in ("single model", "tiered"):
+        result = await run_mode(name, args)
+        table.add_row(name, str(result["answer_calls"]), str(result["triage_calls"]), f"{result['p50'] * 1000:.0f} ms",
+                      f"${result['answer_cost']:.4f}", f"${result['triage_cost']:.4f}",
+                      f"${result['answer_cost'] + result['triage_cost']:.4f}", f"{result['answered']}/{args.questions}")
+    Console().print(table)
+    main.parse_pool.close()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=5, help="candidate pages per question, one of them answers it")
+    parser.add_argument("--answer-latency", type=float, default=0.8)
+    parser.add_argument("--triage-latency", type=float, default=0.15)
+    parser.add_argument("--triage-miss", type=float, default=0.0, help="share of answering pages the triage model rejects")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
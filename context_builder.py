@@ -0,0 +1,131 @@
+import re
+from typing import Dict, List
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how i in is it its of on or that the this to was were what when "
+    "where which who whom why will with do does did can you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough LLM token count, about four characters per token.
+    """
+    return (len(text) + 3) // 4
+
+
+def chunk_text(text: str, chunk_words: int) -> List[str]:
+    words = text.split()
+    return [" ".join(words[i:i + chunk_words]) for i in range(0, len(words), chunk_words)]
+
+
+class BM25Index:
+    """
+    BM25 over a list of documents. Only the token id stream is stored, term frequencies for the
+    query terms are built on demand with NumPy so scoring stays vectorized even for very long pages.
+    """
+    def __init__(self, documents: List[str], k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        tokens_per_document = [tokenize(document) for document in documents]
+        self.document_lengths = np.array([len(tokens) for tokens in tokens_per_document], dtype=np.float32)
+        all_tokens = [token for tokens in tokens_per_document for token in tokens]
+        if all_tokens:
+            self.vocabulary, self.token_ids = np.unique(np.array(all_tokens), return_inverse=True)
+        else:
+            self.vocabulary, self.token_ids = np.array([], dtype=str), np.array([], dtype=np.int64)
+        self.document_ids = np.repeat(np.arange(len(documents)), self.document_lengths.astype(np.int64))
+
+    def scores(self, query: str) -> np.ndarray:
+        n_documents = len(self.document_lengths)
+        terms = np.unique(np.array(tokenize(query)))
+        if n_documents == 0 or terms.size == 0 or self.vocabulary.size == 0:
+            return np.zeros(n_documents, dtype=np.float32)
+
+        positions = np.minimum(np.searchsorted(self.vocabulary, terms), self.vocabulary.size - 1)
+        term_ids = positions[self.vocabulary[positions] == terms]
+        if term_ids.size == 0:
+            return np.zeros(n_documents, dtype=np.float32)
+
+        mask = np.isin(self.token_ids, term_ids)
+        term_freqs = np.zeros((n_documents, term_ids.size), dtype=np.float32)
+        np.add.at(term_freqs, (self.document_ids[mask], np.searchsorted(term_ids, self.token_ids[mask])), 1)
+
+        document_freqs = (term_freqs > 0).sum(axis=0)
+        idf = np.log1p((n_documents - document_freqs + 0.5) / (document_freqs + 0.5))
+        average_length = max(float(self.document_lengths.mean()), 1.0)
+        norm = self.k1 * (1 - self.b + self.b * self.document_lengths / average_length)
+        return (idf * term_freqs * (self.k1 + 1) / (term_freqs + norm[:, None])).sum(axis=1)
+
+
+class SelectedContext:
+    """
+    The text that goes into the prompt and how many tokens the selection saved.
+    """
+    __slots__ = ("text", "original_tokens", "selected_tokens", "chunks_used", "chunks_total")
+
+    def __init__(self, text: str, original_tokens: int, selected_tokens: int, chunks_used: int, chunks_total: int) -> None:
+        self.text = text
+        self.original_tokens = original_tokens
+        self.selected_tokens = selected_tokens
+        self.chunks_used = chunks_used
+        self.chunks_total = chunks_total
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.original_tokens - self.selected_tokens
+
+
+class ContextBuilder:
+    """
+    Splits page text into chunks, ranks them against the question with BM25 and keeps the
+    best `top_k` chunks that fit in `token_budget`, in their original page order.
+    Pages that already fit in the budget are sent whole. A budget of 0 disables selection.
+    """
+    def __init__(self, token_budget: int = 3000, top_k: int = 8, chunk_words: int = 150) -> None:
+        self.token_budget = token_budget
+        self.top_k = top_k
+        self.chunk_words = chunk_words
+        self.stats: Dict[str, int] = {"requests": 0, "tokens_in": 0, "tokens_sent": 0, "tokens_saved": 0}
+
+    def build(self, text: str, question: str) -> SelectedContext:
+        original_tokens = estimate_tokens(text)
+        if self.token_budget <= 0 or original_tokens <= self.token_budget:
+            selected = SelectedContext(text, original_tokens, original_tokens, 1, 1)
+        else:
+            selected = self._select(text, question, original_tokens)
+        self.stats["requests"] += 1
+        self.stats["tokens_in"] += selected.original_tokens
+        self.stats["tokens_sent"] += selected.selected_tokens
+        self.stats["tokens_saved"] += selected.tokens_saved
+        return selected
+
+    def _select(self, text: str, question: str, original_tokens: int) -> SelectedContext:
+        chunks = chunk_text(text, self.chunk_words)
+        scores = BM25Index(chunks).scores(question)
+        # Stable sort keeps page order among equally scored chunks, so a question with no matches gets the page start
+        ranked = np.argsort(-scores, kind="stable")
+
+        chosen: List[int] = []
+        used_tokens = 0
+        for index in ranked[:self.top_k]:
+            chunk_tokens = estimate_tokens(chunks[index])
+            if used_tokens + chunk_tokens > self.token_budget:
+                continue
+            chosen.append(int(index))
+            used_tokens += chunk_tokens
+
+        if chosen:
+            selected_text = " ... ".join(chunks[index] for index in sorted(chosen))
+        else:
+            # Budget smaller than a single chunk, cut the best chunk down to fit
+            selected_text = chunks[int(ranked[0])][:self.token_budget * 4]
+            chosen = [int(ranked[0])]
+        return SelectedContext(selected_text, original_tokens, estimate_tokens(selected_text), len(chosen), len(chunks))
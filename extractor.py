@@ -0,0 +1,313 @@
+import codecs
+import re
+from typing import Iterable, List, Optional, Tuple
+from urllib.parse import urldefrag, urljoin
+
+from bs4 import BeautifulSoup
+
+# Optional fast parsers, BeautifulSoup with html.parser is always available as the fallback
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+except ImportError:
+    SelectolaxParser = None
+
+try:
+    import lxml.etree
+    import lxml.html
+except ImportError:
+    lxml = None
+
+# Tags that never hold the answer to a question
+NOISE_TAGS = ["script", "style", "noscript", "template", "svg", "iframe", "canvas"]
+BOILERPLATE_TAGS = ["nav", "footer", "header", "aside"]
+BOILERPLATE_ROLES = ["navigation", "banner", "contentinfo", "complementary"]
+BOILERPLATE_HINTS = ["cookie", "consent", "gdpr", "banner", "newsletter", "sidebar", "breadcrumb", "advert", "promo", "popup", "modal", "share", "social", "subscribe"]
+# A class token or id names page chrome when it is a hint or starts with one ("cookie-notice", "sidebar_left").
+# Tokens merely containing a hint ("has-sidebar", "hero-banner", "sharedaddy") are layout around the content and kept
+BOILERPLATE_HINT_RE = re.compile(rf"(?:{'|'.join(BOILERPLATE_HINTS)})(?:$|[-_])", re.IGNORECASE)
+MAIN_SELECTORS = ["main", "article", "[role=main]"]
+# Never stripped, whatever their class says
+STRUCTURAL_TAGS = ("html", "body")
+
+# Main content must hold at least this many characters, otherwise the whole cleaned body is used
+MIN_MAIN_CONTENT_CHARS = 200
+# Anchors kept per page, in document order
+MAX_LINKS = 200
+
+# (absolute URL, anchor text)
+Link = Tuple[str, str]
+
+
+def _collapse(text: str) -> str:
+    return " ".join(text.split())
+
+
+def has_boilerplate_hint(classes: Optional[str], element_id: Optional[str]) -> bool:
+    return any(BOILERPLATE_HINT_RE.match(token) for token in f"{classes or ''} {element_id or ''}".split())
+
+
+def resolve_links(anchors: Iterable[Tuple[Optional[str], str]], base_url: str, max_links: int = MAX_LINKS) -> List[Link]:
+    """
+    Turns raw (href, text) anchors into absolute http(s) URLs without fragments, one entry per URL.
+    Anchors pointing back at the page itself (e.g. "#section") are dropped.
+    """
+    page, _ = urldefrag(base_url)
+    links: List[Link] = []
+    index = {}
+    for href, text in anchors:
+        href = (href or "").strip()
+        if not href or href.startswith(("#", "javascript:", "mailto:", "tel:", "data:")):
+            continue
+        url, _ = urldefrag(urljoin(base_url, href))
+        if not url.startswith(("http://", "https://")) or url == page:
+            continue
+        text = _collapse(text)
+        if url in index:
+            # The same target linked twice, e.g. an image and a caption: keep both texts
+            position = index[url]
+            if text and text not in links[position][1]:
+                links[position] = (url, f"{links[position][1]} {text}".strip())
+            continue
+        index[url] = len(links)
+        links.append((url, text))
+        if len(links) >= max_links:
+            break
+    return links
+
+
+class Extractor:
+    """
+    Turns raw HTML into plain text. With `strip_boilerplate` a <main>/<article> element is preferred when it
+    holds enough text once the navigation, footers, cookie banners and similar chrome inside it are removed.
+    Otherwise the chrome is removed from the whole page, except <html>, <body> and the ancestors of a main
+    element, so a wrapper with a boilerplate-looking class never takes the content with it.
+    """
+    name = "base"
+
+    def __init__(self, strip_boilerplate: bool = True) -> None:
+        self.strip_boilerplate = strip_boilerplate
+
+    def extract(self, html: str) -> str:
+        return self.extract_with_links(html)[0]
+
+    def extract_with_links(self, html: str, base_url: Optional[str] = None) -> Tuple[str, List[Link]]:
+        """
+        Returns the text and, when `base_url` is given, the page's links resolved against it.
+        Links are read from the same parse before boilerplate is stripped, so navigation links are kept.
+        """
+        raise NotImplementedError
+
+
+class BeautifulSoupExtractor(Extractor):
+    name = "bs4"
+
+    def extract_with_links(self, html: str, base_url: Optional[str] = None) -> Tuple[str, List[Link]]:
+        soup = BeautifulSoup(html, "html.parser")
+        for tag in soup(NOISE_TAGS):
+            tag.decompose()
+        links: List[Link] = []
+        if base_url is not None:
+            links = resolve_links(((a.get("href"), a.get_text(" ")) for a in soup.find_all("a", href=True)), base_url)
+        return self._text(soup), links
+
+    def _text(self, soup) -> str:
+        if not self.strip_boilerplate:
+            return soup.get_text(separator=" ", strip=True)
+
+        full_text = soup.get_text(separator=" ", strip=True)
+        mains = [main for main in (soup.select_one(selector) for selector in MAIN_SELECTORS) if main is not None]
+        keep = {id(ancestor) for main in mains for ancestor in main.parents}
+        for main in mains:
+            self._strip(main, keep)
+            text = main.get_text(separator=" ", strip=True)
+            if len(text) >= MIN_MAIN_CONTENT_CHARS:
+                return text
+        self._strip(soup, keep | {id(main) for main in mains})
+        return soup.get_text(separator=" ", strip=True) or full_text
+
+    @staticmethod
+    def _strip(scope, keep) -> None:
+        # find_all only searches below the scope, so the scope itself is never removed
+        for tag in scope.find_all(lambda t: t.name in BOILERPLATE_TAGS or t.get("role") in BOILERPLATE_ROLES
+                                  or has_boilerplate_hint(" ".join(t.get("class", [])), t.get("id"))):
+            if not tag.decomposed and tag.name not in STRUCTURAL_TAGS and id(tag) not in keep:
+                tag.decompose()
+
+
+class LxmlExtractor(Extractor):
+    name = "lxml"
+
+    def extract_with_links(self, html: str, base_url: Optional[str] = None) -> Tuple[str, List[Link]]:
+        if not html.strip():
+            return "", []
+        try:
+            root = lxml.html.fromstring(html, parser=lxml.html.HTMLParser(remove_comments=True))
+        except (lxml.etree.ParserError, ValueError):
+            # lxml refuses str input with an XML encoding declaration
+            root = lxml.html.fromstring(html.encode("utf-8", errors="replace"), parser=lxml.html.HTMLParser(remove_comments=True))
+        return self.extract_tree(root, base_url)
+
+    def extract_tree(self, root, base_url: Optional[str] = None) -> Tuple[str, List[Link]]:
+        self._drop(root.xpath("|".join(f"//{tag}" for tag in NOISE_TAGS)))
+        links: List[Link] = []
+        if base_url is not None:
+            links = resolve_links(((a.get("href"), a.text_content()) for a in root.xpath("//a[@href]")), base_url)
+        return self._text(root), links
+
+    def _text(self, root) -> str:
+        if not self.strip_boilerplate:
+            return _collapse(" ".join(root.itertext()))
+
+        full_text = _collapse(" ".join(root.itertext()))
+        mains = [found[0] for found in (root.xpath(xpath) for xpath in ("//main", "//article", "//*[@role='main']")) if found]
+        keep = {ancestor for main in mains for ancestor in main.iterancestors()}
+        for main in mains:
+            self._strip(main, keep)
+            text = _collapse(" ".join(main.itertext()))
+            if len(text) >= MIN_MAIN_CONTENT_CHARS:
+                return text
+        self._strip(root, keep | set(mains))
+        return _collapse(" ".join(root.itertext())) or full_text
+
+    def _strip(self, scope, keep) -> None:
+        # Descendants of the scope only, so the scope itself is never removed
+        self._drop([element for element in scope.iterdescendants()
+                    if isinstance(element.tag, str) and element.tag not in STRUCTURAL_TAGS and element not in keep
+                    and (element.tag in BOILERPLATE_TAGS or element.get("role") in BOILERPLATE_ROLES
+                         or has_boilerplate_hint(element.get("class"), element.get("id")))])
+
+    @staticmethod
+    def _drop(elements: List) -> None:
+        for element in elements:
+            # drop_tree keeps the text that follows the element, the root has no parent to drop from
+            if element.getparent() is not None:
+                element.drop_tree()
+
+
+class SelectolaxExtractor(Extractor):
+    name = "selectolax"
+
+    def extract_with_links(self, html: str, base_url: Optional[str] = None) -> Tuple[str, List[Link]]:
+        tree = SelectolaxParser(html)
+        tree.strip_tags(NOISE_TAGS)
+        if tree.body is None:
+            return "", []
+        links: List[Link] = []
+        if base_url is not None:
+            links = resolve_links(((node.attributes.get("href"), node.text(separator=" ")) for node in tree.css("a[href]")), base_url)
+        return self._text(tree), links
+
+    def _text(self, tree) -> str:
+        if tree.body is None:
+            return ""
+        if not self.strip_boilerplate:
+            return _collapse(tree.body.text(separator=" "))
+
+        full_text = _collapse(tree.body.text(separator=" "))
+        mains = [main for main in (tree.css_first(selector) for selector in MAIN_SELECTORS) if main is not None]
+        keep = {ancestor.mem_id for main in mains for ancestor in self._ancestors(main)}
+        for main in mains:
+            self._strip(main, keep | {main.mem_id})
+            text = _collapse(main.text(separator=" "))
+            if len(text) >= MIN_MAIN_CONTENT_CHARS:
+                return text
+        self._strip(tree.body, keep | {main.mem_id for main in mains} | {tree.body.mem_id})
+        return _collapse(tree.body.text(separator=" ")) or full_text
+
+    @staticmethod
+    def _ancestors(node) -> Iterable:
+        node = node.parent
+        while node is not None:
+            yield node
+            node = node.parent
+
+    def _strip(self, scope, keep) -> None:
+        selector = ", ".join(BOILERPLATE_TAGS + [f"[role={role}]" for role in BOILERPLATE_ROLES] + ["[class]", "[id]"])
+        # css() on a node matches the node itself too, it is in keep
+        matched = [node for node in scope.css(selector)
+                   if node.mem_id not in keep and node.tag not in STRUCTURAL_TAGS
+                   and (node.tag in BOILERPLATE_TAGS or node.attributes.get("role") in BOILERPLATE_ROLES
+                        or has_boilerplate_hint(node.attributes.get("class"), node.attributes.get("id")))]
+        # Decomposing frees the node's subtree, so nodes inside another match are left to it. Decided before
+        # anything is decomposed, walking up from a node whose ancestor is already freed would read freed memory
+        matched_ids = {node.mem_id for node in matched}
+        outermost = [node for node in matched if not any(ancestor.mem_id in matched_ids for ancestor in self._ancestors(node))]
+        for node in outermost:
+            node.decompose()
+
+
+BACKENDS = {
+    "selectolax": (SelectolaxExtractor, lambda: SelectolaxParser is not None),
+    "lxml": (LxmlExtractor, lambda: lxml is not None),
+    "bs4": (BeautifulSoupExtractor, lambda: True),
+}
+
+
+def available_backends() -> List[str]:
+    return [name for name, (_, available) in BACKENDS.items() if available()]
+
+
+def get_extractor(backend: str = "auto", strip_boilerplate: bool = True) -> Extractor:
+    """
+    Returns the requested backend, "auto" picks the fastest installed one (selectolax, then lxml, then bs4).
+    """
+    if backend == "auto":
+        backend = available_backends()[0]
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown extractor backend {backend!r}, choose from {', '.join(BACKENDS)} or auto")
+    extractor_class, available = BACKENDS[backend]
+    if not available():
+        raise ValueError(f"Extractor backend {backend!r} is not installed")
+    return extractor_class(strip_boilerplate=strip_boilerplate)
+
+
+class StreamingExtractor:
+    """
+    Parses a page while its bytes arrive, it plugs into AsyncFetcher.fetch as the chunk sink.
+    With lxml the chunks go straight into libxml2's push parser so parsing overlaps the download,
+    other backends buffer the bytes and parse once at close(). With `base_url` the page's links are in
+    `links` after close().
+    """
+    def __init__(self, extractor: Extractor, base_url: Optional[str] = None) -> None:
+        self._extractor = extractor
+        self._base_url = base_url
+        self.links: List[Link] = []
+        self._encoding = "utf-8"
+        self._chunks: List[bytes] = []
+        self._parser = None
+
+    def start(self, encoding: Optional[str], url: Optional[str] = None) -> None:
+        """
+        `url` is the page's address after redirects, links resolve against it. An unknown charset is read as
+        utf-8, one that Python knows but libxml2 does not is buffered and decoded at close().
+        """
+        try:
+            self._encoding = codecs.lookup(encoding or "utf-8").name
+        except LookupError:
+            self._encoding = "utf-8"
+        if url is not None and self._base_url is not None:
+            self._base_url = url
+        if isinstance(self._extractor, LxmlExtractor):
+            try:
+                self._parser = lxml.html.HTMLParser(encoding=self._encoding, remove_comments=True)
+            except LookupError:
+                self._parser = None
+
+    def feed(self, chunk: bytes) -> None:
+        if self._parser is not None:
+            self._parser.feed(chunk)
+        else:
+            self._chunks.append(chunk)
+
+    def close(self) -> str:
+        if self._parser is not None:
+            try:
+                root = self._parser.close()
+            except (lxml.etree.XMLSyntaxError, LookupError):
+                return ""
+            if root is None:
+                return ""
+            text, self.links = self._extractor.extract_tree(root, self._base_url)
+            return text
+        text, self.links = self._extractor.extract_with_links(b"".join(self._chunks).decode(self._encoding, errors="replace"), self._base_url)
+        return text
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from shared_state import connect_sqlite
+
+
+def normalize_question(question: str) -> str:
+    """
+    Lowercases the question and drops punctuation and repeated whitespace.
+    """
+    return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8", errors="replace")).hexdigest()
+
+
+def shingles(text: str, size: int = 3) -> FrozenSet[str]:
+    """
+    Character shingles used for near-duplicate question matching.
+    """
+    padded = f" {text} "
+    return frozenset(padded[i:i + size] for i in range(max(len(padded) - size + 1, 1)))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+# Words that do not change what a question asks for, a near-duplicate may differ in these only
+STOPWORDS = frozenset(
+    "a an the is are was were be been being am do does did of in on at to for from by with about as and or "
+    "what which who whom whose when where why how that this these those it its s can could would should will "
+    "shall may might i you me my your we our us they them their there he she his her tell please give explain "
+    "describe know".split()
+)
+
+
+def key_terms(normalized: str) -> FrozenSet[str]:
+    """
+    The words of a normalized question that carry its meaning: names, numbers and content words.
+    """
+    return frozenset(word for word in normalized.split() if word not in STOPWORDS)
+
+
+def same_question(a: str, b: str) -> bool:
+    """
+    Guards near-duplicate matches: high shingle overlap is not enough when one number, name or content word
+    differs ("Python 3.10" and "3.11", "Niger" and "Nigeria", "minimum" and "maximum"), those ask something else.
+    """
+    return key_terms(a) == key_terms(b)
+
+
+class LLMResponseCache:
+    """
+    Cache of parsed LLM results keyed by (content hash, normalized question, model id).
+    Holds at most `max_entries` results in memory (LRU) and, when `db_path` is set, keeps every result in SQLite.
+    With a `similarity` threshold above 0, a question whose shingle Jaccard similarity to a cached question
+    on the same page and model reaches the threshold, and that has the same key terms, reuses that answer.
+    """
+    def __init__(self, max_entries: int = 1024, db_path: Optional[str] = None, similarity: float = 0.0) -> None:
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self._memory: "OrderedDict[Tuple[str, str, str], Dict]" = OrderedDict()
+        # (content hash, model id) -> {normalized question: shingles}, mirrors the memory tier
+        self._questions: Dict[Tuple[str, str], Dict[str, FrozenSet[str]]] = {}
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.stats: Dict[str, int] = {"exact_hits": 0, "near_hits": 0, "misses": 0, "stores": 0}
+        if db_path:
+            self._db = connect_sqlite(db_path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "content_hash TEXT NOT NULL, model_id TEXT NOT NULL, question TEXT NOT NULL,"
+                "result TEXT NOT NULL, created_at REAL NOT NULL,"
+                "PRIMARY KEY (content_hash, model_id, question))"
+            )
+            self._db.commit()
+
+    def get(self, content: str, question: str, model_id: str) -> Optional[Dict]:
+        page = content_hash(content)
+        normalized = normalize_question(question)
+        key = (page, normalized, model_id)
+        with self._lock:
+            result = self._memory.get(key)
+            if result is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT result FROM responses WHERE content_hash = ? AND model_id = ? AND question = ?",
+                    (page, model_id, normalized),
+                ).fetchone()
+                if row is not None:
+                    result = json.loads(row[0])
+                    self._remember(key, result)
+            if result is not None:
+                self._memory.move_to_end(key)
+                self.stats["exact_hits"] += 1
+                return result
+
+            if self.similarity > 0:
+                result = self._nearest(page, normalized, model_id)
+                if result is not None:
+                    self.stats["near_hits"] += 1
+                    return result
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, content: str, question: str, model_id: str, result: Dict) -> None:
+        page = content_hash(content)
+        normalized = normalize_question(question)
+        with self._lock:
+            self._remember((page, normalized, model_id), result)
+            self.stats["stores"] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (content_hash, model_id, question, result, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (page, model_id, normalized, json.dumps(result, ensure_ascii=False), time.time()),
+                )
+                self._db.commit()
+
+    def _nearest(self, page: str, normalized: str, model_id: str) -> Optional[Dict]:
+        target = shingles(normalized)
+        candidates = dict(self._questions.get((page, model_id), {}))
+        if self._db is not None:
+            for (question,) in self._db.execute(
+                "SELECT question FROM responses WHERE content_hash = ? AND model_id = ?", (page, model_id)
+            ):
+                if question not in candidates:
+                    candidates[question] = shingles(question)
+
+        best_question, best_score = None, self.similarity
+        for question, question_shingles in candidates.items():
+            score = jaccard(target, question_shingles)
+            if score >= best_score and same_question(normalized, question):
+                best_question, best_score = question, score
+        if best_question is None:
+            return None
+
+        key = (page, best_question, model_id)
+        result = self._memory.get(key)
+        if result is None and self._db is not None:
+            row = self._db.execute(
+                "SELECT result FROM responses WHERE content_hash = ? AND model_id = ? AND question = ?",
+                (page, model_id, best_question),
+            ).fetchone()
+            if row is not None:
+                result = json.loads(row[0])
+                self._remember(key, result)
+        return result
+
+    def _remember(self, key: Tuple[str, str, str], result: Dict) -> None:
+        page, question, model_id = key
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        self._questions.setdefault((page, model_id), {})[question] = shingles(question)
+        while len(self._memory) > self.max_entries:
+            (old_page, old_question, old_model), _ = self._memory.popitem(last=False)
+            questions = self._questions.get((old_page, old_model))
+            if questions is not None:
+                questions.pop(old_question, None)
+                if not questions:
+                    del self._questions[(old_page, old_model)]
+
+    def close(self) -> None:
+        # Under the lock, a call still running in a worker thread finishes before the connection goes away
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
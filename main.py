@@ -1,27 +1,77 @@
-import google.generativeai as genai
-import requests
-from bs4 import BeautifulSoup
-from googlesearch import search
 from rich.console import Console
 from rich.panel import Panel
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from typing import List, Optional, Tuple, Dict
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from typing import Awaitable, Callable, List, Optional, Set, Tuple, Dict
 import json
-from anthropic import AnthropicBedrock
+import asyncio
+import time
+import uuid
 from dotenv import load_dotenv
 import os
+from fetcher import AsyncFetcher, FetchError
+from content_cache import ContentCache, normalize_url
+from llm_cache import LLMResponseCache
+from context_builder import ContextBuilder
+from extractor import Link, StreamingExtractor, get_extractor
+from streaming import AnswerStreamer
+from scheduler import RequestScheduler, SchedulerBusy
+from llm_pool import LLMPool, PoolMember
+from search_cache import SearchCache, SingleFlight
+from llm_cache import normalize_question
+from response_parser import ANSWER_SCHEMA, QUESTION_ANSWER_SCHEMA, TRIAGE_SCHEMA, ParseError, ResponseParser
+from metrics import MetricsRegistry, Tracer
+from context_builder import estimate_tokens
+from crawler import DomainThrottle, LinkCrawler, RobotsPolicy
+from prefilter import RelevancePrefilter
+from history_store import MAX_PAGE_SIZE, HistoryStore
+from parse_pool import ParsePool
+from shared_state import SessionRegistry, open_backend
+from connections import ConnectionManager
+from session_state import MoreInfoNeeded, SessionState
+from model_tiers import TierUsage, parse_price
 
 # Load environment variables
 load_dotenv(dotenv_path="main.env")
 
 
+# Provider SDKs are imported when the first client of that provider is built, so a Claude-only worker
+# never loads google.generativeai and the other way round
+
 # Claude LLM Class
 class ClaudeLLM():
     def __init__(self, model_id: str, temperature: float, aws_region: str) -> None:
-        self._client = AnthropicBedrock(aws_region=aws_region)
+        self._aws_region = aws_region
+        self._sync_client = None
+        self._async_client_instance = None
         self._model_id = model_id
         self._temperature = temperature
 
+    @property
+    def model_id(self) -> str:
+        return self._model_id
+
+    @property
+    def _client(self):
+        if self._sync_client is None:
+            from anthropic import AnthropicBedrock
+            self._sync_client = AnthropicBedrock(aws_region=self._aws_region)
+        return self._sync_client
+
+    @property
+    def _async_client(self):
+        if self._async_client_instance is None:
+            from anthropic import AsyncAnthropicBedrock
+            self._async_client_instance = AsyncAnthropicBedrock(aws_region=self._aws_region)
+        return self._async_client_instance
+
+    def warm_up(self) -> None:
+        """
+        Builds the async client (SDK import, AWS credential lookup) ahead of the first request.
+        """
+        self._async_client
+
     def generate_content(self, content: str) -> str:
         response = self._client.messages.create(
             temperature=self._temperature,
@@ -31,12 +81,81 @@ class ClaudeLLM():
         )
         output = response.content[-1].text
         return output
+
+    async def generate_content_async(self, content: str, json_schema: Optional[Dict] = None) -> str:
+        if json_schema is None:
+            response = await self._async_client.messages.create(
+                temperature=self._temperature,
+                model=self._model_id,
+                max_tokens=1024,
+                messages=[{"role": "user", "content": content}]
+            )
+            output = response.content[-1].text
+            return output
+        # Forcing a tool call makes Claude return arguments that follow the schema
+        response = await self._async_client.messages.create(
+            temperature=self._temperature,
+            model=self._model_id,
+            max_tokens=1024,
+            messages=[{"role": "user", "content": content}],
+            tools=[{"name": "respond", "description": "Send the structured response.", "input_schema": json_schema}],
+            tool_choice={"type": "tool", "name": "respond"}
+        )
+        for block in response.content:
+            if block.type == "tool_use":
+                return json.dumps(block.input, ensure_ascii=False)
+        return response.content[-1].text
+
+    async def stream_content_async(self, content: str):
+        async with self._async_client.messages.stream(
+            temperature=self._temperature,
+            model=self._model_id,
+            max_tokens=1024,
+            messages=[{"role": "user", "content": content}]
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
 # Gemini LLM Class (Modified for raw text return)
 class GeminiLLM():
-    def __init__(self, model_id: str):
-        self._model = genai.GenerativeModel(model_id)
+    def __init__(self, model_id: str, api_key: Optional[str] = None):
+        self._api_key = api_key
+        self._model_instance = None
+        self._model_id = model_id
+
+    @property
+    def model_id(self) -> str:
+        return self._model_id
+
+    @property
+    def _model(self):
+        if self._model_instance is None:
+            import google.generativeai as genai
+            genai.configure(api_key=self._api_key)
+            self._model_instance = genai.GenerativeModel(self._model_id)
+        return self._model_instance
+
+    def warm_up(self) -> None:
+        self._model
+
     def generate_content(self, content: str) -> str:
         response = self._model.generate_content(content)
+        return self._response_text(response)
+
+    async def generate_content_async(self, content: str, json_schema: Optional[Dict] = None) -> str:
+        if json_schema is None:
+            response = await self._model.generate_content_async(content)
+        else:
+            response = await self._model.generate_content_async(content, generation_config={"response_mime_type": "application/json"})
+        return self._response_text(response)
+
+    async def stream_content_async(self, content: str):
+        response = await self._model.generate_content_async(content, stream=True)
+        async for chunk in response:
+            if chunk.candidates and chunk.candidates[0].content.parts:
+                yield chunk.text
+
+    @staticmethod
+    def _response_text(response) -> Optional[str]:
         # Return raw text, assuming the first candidate's content
         if response.candidates and len(response.candidates) > 0:
             candidate = response.candidates[0]
@@ -45,70 +164,492 @@ class GeminiLLM():
         else:
             return "No response generated by Gemini."
 
-# Model selection based on environment variable
-model = None
-if "Gemini" in os.getenv("LLM"):
-    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-    model = GeminiLLM('gemini-1.5-flash')
-elif "Claude" in os.getenv("LLM"):
-    model = ClaudeLLM(
-        model_id="anthropic.claude-3-5-sonnet-20240620-v1:0",
-        temperature=0.7,
-        aws_region="us-east-1",
+# Default model per provider and tier: the answer tier writes answers, the triage tier only screens pages for it
+TIER_MODELS = {
+    "answer": {"claude": "anthropic.claude-3-5-sonnet-20240620-v1:0", "gemini": "gemini-1.5-flash"},
+    "triage": {"claude": "anthropic.claude-3-haiku-20240307-v1:0", "gemini": "gemini-1.5-flash-8b"},
+}
+
+def build_model(tier: str = "answer") -> Optional[LLMPool]:
+    """
+    This function builds the LLM pool of a tier from the LLM (answer tier) or LLM_TRIAGE environment variable,
+    LLM=Claude,Gemini uses Gemini as the failover for Claude. The triage tier is optional and None without LLM_TRIAGE.
+    Clients are cheap to build here, each one loads its SDK on first use or in warm_up().
+    """
+    setting = os.getenv("LLM" if tier == "answer" else "LLM_TRIAGE", "")
+    # Per-tier settings: CLAUDE_MODEL, CLAUDE_RPM, ... for the answer tier, CLAUDE_TRIAGE_MODEL, ... for triage
+    prefix = "" if tier == "answer" else "TRIAGE_"
+    suffix = "" if tier == "answer" else f"-{tier}"
+    members: List[PoolMember] = []
+    for provider in setting.split(","):
+        if "Gemini" in provider:
+            members.append(PoolMember(f"gemini{suffix}", "gemini", GeminiLLM(
+                os.getenv(f"GEMINI_{prefix}MODEL", TIER_MODELS[tier]["gemini"]), os.getenv("GOOGLE_API_KEY"),
+            ), requests_per_minute=float(os.getenv(f"GEMINI_{prefix}RPM", "1000"))))
+        elif "Claude" in provider:
+            # One pool member per Bedrock region, each region has its own quota
+            for region in os.getenv("CLAUDE_REGIONS", "us-east-1").split(","):
+                members.append(PoolMember(f"claude{suffix}-{region.strip()}", "claude", ClaudeLLM(
+                    model_id=os.getenv(f"CLAUDE_{prefix}MODEL", TIER_MODELS[tier]["claude"]),
+                    temperature=0.7 if tier == "answer" else 0.0,
+                    aws_region=region.strip(),
+                ), requests_per_minute=float(os.getenv(f"CLAUDE_{prefix}RPM", "50" if tier == "answer" else "200"))))
+    if not members:
+        if tier != "answer":
+            return None
+        raise ValueError(f"Model is not initialized: set LLM to Claude, Gemini or Claude,Gemini (got {setting!r}).")
+    return LLMPool(
+        members,
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+        request_timeout=float(os.getenv("LLM_TIMEOUT", "60")),
+        hedge=os.getenv("LLM_HEDGE", "1") == "1",
     )
 
-if model is None:
-    raise ValueError("Model is not initialized.")
+# Built in the startup hook (or on first use), so importing main stays fast and a bad LLM setting gives a clear error
+model: Optional[LLMPool] = None
+# Small fast model that screens pages before the answer model reads them, None keeps the single-model behavior
+triage_model: Optional[LLMPool] = None
+# Latency, token and cost counters per tier, prices are set when the pools are built
+tier_usage = TierUsage()
+
+def search(query: str, num_results: int = 10):
+    """
+    This function runs a Google search, googlesearch is imported on the first search.
+    """
+    from googlesearch import search as google_search
+    return google_search(query, num_results=num_results)
+
+# Ask the provider for schema-conforming JSON (Claude tool use, Gemini JSON mime type) on non-streamed calls
+LLM_JSON_MODE = os.getenv("LLM_JSON_MODE", "0") == "1"
+
+def json_mode(json_schema: Dict) -> Dict:
+    """
+    This function returns the generate_content_async keyword arguments that turn on provider JSON output.
+    """
+    return {"json_schema": json_schema} if LLM_JSON_MODE else {}
+
+# Tolerant JSON extraction for LLM responses, its failure rate is reported on /stats
+response_parser = ResponseParser()
 
-if model is None:
-    raise ValueError("Model is not initialized.")
+# Fan-out settings for the additional link search
+LINK_CONCURRENCY = int(os.getenv("LINK_CONCURRENCY", "3"))
+LINK_ORDERING = os.getenv("LINK_ORDERING", "rank")  # "rank" keeps search order, "arrival" takes the fastest relevant link
+if LINK_ORDERING not in ("rank", "arrival"):
+    raise ValueError(f"LINK_ORDERING must be 'rank' or 'arrival', got {LINK_ORDERING!r}")
 
 console = Console()
 
+# Receives progress and token events when a client asked for streaming, None otherwise
+EventSink = Optional[Callable[[Dict], Awaitable[None]]]
+
+async def emit(on_event: EventSink, event_type: str, **fields) -> None:
+    if on_event is not None:
+        await on_event({"type": event_type, **fields})
+
+# Batch endpoint limits, BATCH_GROUP_SIZE is the most questions sent in one multi-question prompt
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_JOBS = int(os.getenv("BATCH_MAX_JOBS", "1000"))
+BATCH_GROUP_SIZE = int(os.getenv("BATCH_GROUP_SIZE", "10"))
+
+# Admission control between /ws and search_for_answer
+scheduler = RequestScheduler(
+    max_inflight=int(os.getenv("SCHEDULER_MAX_INFLIGHT", "16")),
+    max_inflight_per_connection=int(os.getenv("SCHEDULER_MAX_INFLIGHT_PER_CONNECTION", "1")),
+    max_queued_per_connection=int(os.getenv("SCHEDULER_MAX_QUEUED_PER_CONNECTION", "4")),
+    max_queued=int(os.getenv("SCHEDULER_MAX_QUEUED", "256")),
+    timeout=float(os.getenv("PIPELINE_TIMEOUT", "120")) or None,
+)
+
+# A question the LLM finds unrelated to its page asks the client for a new URL and question. The waiting session holds
+# no pipeline slot or page, the wait expires after MORE_INFO_TIMEOUT seconds (0 never) and one question asks at most
+# MORE_INFO_MAX_FOLLOW_UPS times in a row before the web search takes over (0 never asks)
+MORE_INFO_TIMEOUT = float(os.getenv("MORE_INFO_TIMEOUT", "300"))
+MORE_INFO_MAX_FOLLOW_UPS = int(os.getenv("MORE_INFO_MAX_FOLLOW_UPS", "3"))
+more_info_stats: Dict[str, int] = {"asked": 0, "resumed": 0, "expired": 0, "abandoned": 0, "limit_reached": 0}
+
+# Time to first byte of streamed requests, reported on /stats
+stream_stats: Dict[str, float] = {"requests": 0, "first_event_seconds": 0.0, "first_token_requests": 0, "first_token_seconds": 0.0}
+
 # Initialize FastAPI app
 app = FastAPI()
 
-# WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+# Open WebSockets by connection id, each with a bounded outbound queue and its own writer task.
+# Broadcasts to a full queue are dropped ("drop") or disconnect the slow client ("disconnect"), sends stalled
+# for WS_SEND_TIMEOUT close the socket, and clients silent for WS_IDLE_TIMEOUT seconds are closed (0 never)
+manager = ConnectionManager(
+    max_queue=int(os.getenv("WS_MAX_QUEUE", "256")),
+    send_timeout=float(os.getenv("WS_SEND_TIMEOUT", "10")),
+    slow_policy=os.getenv("WS_SLOW_POLICY", "drop"),
+    heartbeat_interval=float(os.getenv("WS_HEARTBEAT_INTERVAL", "30")),
+    idle_timeout=float(os.getenv("WS_IDLE_TIMEOUT", "600")),
+)
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+# Session state shared by the uvicorn worker processes of this host. "sqlite:path" keeps it in a SQLite file every
+# worker opens; "memory" keeps it in this process and only suits a single worker
+state = open_backend(os.getenv("STATE_BACKEND", "sqlite:state.sqlite3"))
+sessions = SessionRegistry(state, ttl=float(os.getenv("SESSION_TTL", "3600")))
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+# Directory of the caches' and history's SQLite files, whatever STATE_BACKEND is. Workers opening the same files
+# share one hit rate
+CACHE_DIR = os.getenv("CACHE_DIR", "")
+
+def cache_path(env: str, filename: str) -> Optional[str]:
+    """
+    This function returns the SQLite file of a cache: the path in `env` when it is set (an empty one keeps
+    the cache in memory only), otherwise the file in CACHE_DIR.
+    """
+    path = os.getenv(env)
+    if path is None:
+        if CACHE_DIR:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+        path = os.path.join(CACHE_DIR, filename)
+    return path or None
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+# Shared pooled fetcher so page fetches reuse connections and never block the event loop
+fetcher = AsyncFetcher()
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
+# Extracted page text cache, repeat questions on the same URL skip the network
+content_cache = ContentCache(
+    max_entries=int(os.getenv("CONTENT_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("CONTENT_CACHE_TTL", "3600")),
+    db_path=cache_path("CONTENT_CACHE_PATH", "content_cache.sqlite3"),
+)
 
-manager = ConnectionManager()
+# Parsed LLM results keyed on (page content, normalized question, model), LLM_CACHE_SIMILARITY lets reworded questions reuse answers
+llm_cache = LLMResponseCache(
+    max_entries=int(os.getenv("LLM_CACHE_SIZE", "1024")),
+    db_path=cache_path("LLM_CACHE_PATH", "llm_cache.sqlite3"),
+    similarity=float(os.getenv("LLM_CACHE_SIMILARITY", "0")),
+)
 
-def find_content_from_url(url: str) -> Optional[str]:
+# Only the page chunks most relevant to the question are sent to the LLM
+context_builder = ContextBuilder(
+    token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000")),
+    top_k=int(os.getenv("CONTEXT_TOP_K", "8")),
+    chunk_words=int(os.getenv("CONTEXT_CHUNK_WORDS", "150")),
+)
+
+# Answered questions per WebSocket session, a repeated question on the same URL reuses the earlier answer (reworded ones with HISTORY_SIMILARITY)
+history = HistoryStore(
+    db_path=cache_path("HISTORY_PATH", "history.sqlite3"),
+    similarity=float(os.getenv("HISTORY_SIMILARITY", "0")),
+    max_age=float(os.getenv("HISTORY_REUSE_TTL", "86400")),
+)
+
+# Local relevance check of fetched search results and crawled pages before they cost an LLM call.
+# "defer" evaluates failing pages only after every other link came back irrelevant, "skip" drops them, "off" disables the check
+PREFILTER_MODE = os.getenv("PREFILTER_MODE", "defer")
+prefilter = RelevancePrefilter(
+    min_chars=int(os.getenv("PREFILTER_MIN_CHARS", "200")),
+    min_score=float(os.getenv("PREFILTER_MIN_SCORE", "0.2")),
+)
+
+# Web search results per normalized question, repeated questions skip the slow and rate limited Google search
+search_cache = SearchCache(
+    max_entries=int(os.getenv("SEARCH_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "86400")),
+    db_path=cache_path("SEARCH_CACHE_PATH", "search_cache.sqlite3"),
+)
+# Start the fallback search next to the first URL's fetch and LLM call, and fetch its top results ahead of time
+SEARCH_SPECULATIVE = os.getenv("SEARCH_SPECULATIVE", "1") == "1"
+SEARCH_PREFETCH = int(os.getenv("SEARCH_PREFETCH", "3"))
+search_stats: Dict[str, int] = {"speculative": 0, "speculative_used": 0, "prefetched": 0}
+
+# Concurrent searches for the same question and fetches of the same URL share one task
+search_flights = SingleFlight()
+page_flights = SingleFlight()
+
+async def fetch_robots(url: str) -> Optional[str]:
     """
-    This function extracts content from the URL.
+    This function downloads a robots.txt, None when there is none or it cannot be read.
     """
-    content: str = ""
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        content = soup.get_text(separator=' ', strip=True)
-        return content
-    except requests.RequestException as e:
-        console.print(f"[bold red]Error fetching URL {url}:[/bold red] {e}")
+        page = await fetcher.fetch(url)
+    except FetchError:
+        return None
+    return page.text
+
+# Follows the links of a page that did not answer the question before falling back to the web search,
+# CRAWL_MAX_PAGES=0 turns it off
+link_crawler = LinkCrawler(
+    RobotsPolicy(fetch_robots, ttl=float(os.getenv("CRAWL_ROBOTS_TTL", "3600"))),
+    DomainThrottle(),
+    max_depth=int(os.getenv("CRAWL_MAX_DEPTH", "2")),
+    max_pages=int(os.getenv("CRAWL_MAX_PAGES", "4")),
+    max_bytes=int(os.getenv("CRAWL_MAX_BYTES", str(4 * 1024 * 1024))),
+    concurrency=int(os.getenv("CRAWL_CONCURRENCY", "2")),
+    min_score=float(os.getenv("CRAWL_MIN_SCORE", "0.5")),
+    domain_delay=float(os.getenv("CRAWL_DOMAIN_DELAY", "0.5")),
+)
+
+# Per-stage latency histograms and counters served on /metrics, recent request traces on /traces/{trace_id}
+registry = MetricsRegistry()
+tracer = Tracer(registry, max_traces=int(os.getenv("TRACE_HISTORY", "256")))
+registry.gauge("scheduler_inflight", "Answer pipelines running.", lambda: scheduler.inflight)
+registry.gauge("scheduler_queued", "Answer pipelines waiting for a slot.", lambda: scheduler.queued)
+registry.gauge("websocket_connections", "Open WebSocket connections of this worker.", lambda: len(manager.connections))
+registry.gauge("websocket_outbound_queued", "Messages waiting in WebSocket outbound queues.", lambda: manager.queued())
+registry.gauge("content_cache_hit_rate", "Share of page lookups served from the content cache.", lambda: content_cache.hit_rate())
+registry.gauge("search_cache_hit_rate", "Share of web searches served from the search cache.", lambda: search_cache.hit_rate())
+registry.gauge("llm_parse_failure_rate", "Share of LLM replies without usable JSON.", lambda: response_parser.failure_rate())
+registry.gauge("llm_cost_usd", "Estimated LLM spend of both model tiers.", lambda: tier_usage.total_cost())
+registry.gauge("prefilter_llm_calls_saved", "LLM calls avoided by the relevance prefilter.", lambda: prefilter.stats["llm_calls_saved"])
+
+async def warm_up_model() -> None:
+    """
+    This function builds every pool member's client in a worker thread, so SDK imports and credential
+    lookups do not land on the first request.
+    """
+    for member in [*getattr(model, "members", ()), *getattr(triage_model, "members", ())]:
+        warm_up = getattr(member.client, "warm_up", None)
+        if warm_up is None:
+            continue
+        try:
+            await asyncio.to_thread(warm_up)
+        except Exception as e:
+            console.print(f"[bold red]Warming up {member.name} failed:[/bold red] {e!r}")
+
+@app.on_event("startup")
+async def load_model():
+    global model, triage_model
+    if model is None:
+        model = build_model()
+    if triage_model is None:
+        triage_model = build_model("triage")
+    tier_usage.set_price("answer", parse_price(os.getenv("LLM_ANSWER_PRICE"), model.model_id))
+    if triage_model is not None:
+        tier_usage.set_price("triage", parse_price(os.getenv("LLM_TRIAGE_PRICE"), triage_model.model_id))
+    # Keep a reference so the task is not garbage collected before it finishes
+    app.state.warm_up = asyncio.create_task(warm_up_model())
+    app.state.parse_warm_up = asyncio.create_task(parse_pool.warm_up())
+
+@app.on_event("shutdown")
+async def close_fetcher():
+    await fetcher.aclose()
+    content_cache.close()
+    llm_cache.close()
+    search_cache.close()
+    history.close()
+    parse_pool.close()
+    state.close()
+    manager.close()
+
+@app.get("/stats")
+async def stats():
+    return {
+        "content_cache": {**content_cache.stats, "hit_rate": content_cache.hit_rate()},
+        "llm_cache": llm_cache.stats,
+        "context": context_builder.stats,
+        "parser": {**response_parser.stats, "failure_rate": response_parser.failure_rate()},
+        "search": {**search_cache.stats, "hit_rate": search_cache.hit_rate(), **search_stats},
+        "crawler": link_crawler.stats,
+        "prefilter": prefilter.stats,
+        "history": history.stats,
+        "more_info": {**more_info_stats, "waiting": more_info_stats["asked"] - more_info_stats["resumed"]
+                      - more_info_stats["expired"] - more_info_stats["abandoned"]},
+        "state": {"backend": state.name, "worker": sessions.worker},
+        "connections": {**manager.stats, "open": len(manager.connections), "queued": manager.queued()},
+        "parse_pool": {**parse_pool.stats, "workers": parse_pool.workers, "inflight": parse_pool.inflight, "saturation": parse_pool.saturation()},
+        "llm": model.stats(),
+        "llm_triage": triage_model.stats() if triage_model is not None else None,
+        "llm_tiers": tier_usage.stats(),
+        "scheduler": {**scheduler.stats, "inflight": scheduler.inflight, "queued": scheduler.queued},
+        "stream": {
+            "requests": stream_stats["requests"],
+            "avg_first_event_seconds": stream_stats["first_event_seconds"] / max(stream_stats["requests"], 1),
+            "avg_first_token_seconds": stream_stats["first_token_seconds"] / max(stream_stats["first_token_requests"], 1),
+        },
+    }
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/sessions")
+async def list_sessions():
+    return {"worker": sessions.worker, "sessions": await asyncio.to_thread(sessions.active)}
+
+@app.get("/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    trace = tracer.traces.get(trace_id)
+    if trace is None:
+        return {"error": f"Unknown or expired trace id {trace_id}"}
+    return trace.summary()
+
+# HTML to text backend, "auto" prefers selectolax or lxml when installed and falls back to BeautifulSoup
+extractor = get_extractor(
+    os.getenv("EXTRACTOR_BACKEND", "auto"),
+    strip_boilerplate=os.getenv("EXTRACTOR_STRIP_BOILERPLATE", "1") == "1",
+)
+# Parse pages while they download instead of after the last byte
+EXTRACTOR_STREAMING = os.getenv("EXTRACTOR_STREAMING", "0") == "1"
+# Large pages are parsed in worker processes so parsing uses more than one core, small ones stay in this process
+parse_pool = ParsePool(
+    extractor,
+    workers=int(os.getenv("PARSE_WORKERS", str(min(4, (os.cpu_count() or 1) - 1)))),
+    inline_max_bytes=int(os.getenv("PARSE_INLINE_MAX_BYTES", str(256 * 1024))),
+    shared_memory_min_bytes=int(os.getenv("PARSE_SHARED_MEMORY_MIN_BYTES", str(1024 * 1024))),
+)
+registry.gauge("parse_pool_saturation", "Pages being parsed in the process pool per worker.", lambda: parse_pool.saturation())
+
+def extract_text(html: str) -> str:
+    """
+    This function turns raw HTML into plain text.
+    """
+    return extractor.extract(html)
+
+async def load_content(url: str) -> Optional[Tuple[str, List[Link], int, bool]]:
+    """
+    This function returns the text and links of a page with the downloaded size and whether it came from the cache.
+    """
+    with tracer.span("fetch", url=url) as span:
+        cached = await asyncio.to_thread(content_cache.get, url)
+        if cached and cached.is_fresh(content_cache.ttl):
+            span.set(cache="hit")
+            return cached.text, cached.links or [], 0, True
+        try:
+            # Stale entries are revalidated with If-None-Match / If-Modified-Since
+            stream = StreamingExtractor(extractor, url) if EXTRACTOR_STREAMING else None
+            page = await fetcher.fetch(url, cached.conditional_headers() if cached else None, sink=stream)
+        except FetchError as e:
+            console.print(f"[bold red]Error fetching URL {url}:[/bold red] {e}")
+            span.set(cache="miss", error=str(e))
+            return None
+        if page.status_code == 304 and cached:
+            await asyncio.to_thread(content_cache.mark_revalidated, cached)
+            span.set(cache="revalidated")
+            return cached.text, cached.links or [], 0, True
+        span.set(cache="stale" if cached else "miss", bytes=len(page.content), status=page.status_code)
+    # Parsing is CPU bound, run it off the event loop
+    with tracer.span("parse", bytes=len(page.content), streaming=stream is not None) as span:
+        if stream is not None:
+            content = await asyncio.to_thread(stream.close)
+            links = stream.links
+        else:
+            # Links are resolved against the final URL, after redirects
+            content, links = await parse_pool.parse(page.content, page.encoding, page.url)
+        span.set(chars_out=len(content or ""), links=len(links))
+    if content:
+        await asyncio.to_thread(content_cache.put, url, content, page.headers.get("ETag"), page.headers.get("Last-Modified"), links)
+    return content, links, len(page.content), False
+
+async def find_page_from_url(url: str, on_event: EventSink = None) -> Optional[Tuple[str, List[Link], int]]:
+    """
+    This function returns the text, links and downloaded size of the page at the URL.
+    A fetch of the same URL that is already running, e.g. a prefetch, is joined instead of repeated.
+    """
+    loaded = await page_flights.run(normalize_url(url), lambda: load_content(url))
+    if loaded is None:
         return None
-def call_llm_with_json(content: str, question: str) -> Dict:
+    content, links, size, cached = loaded
+    await emit(on_event, "progress", stage="fetched", url=url, bytes=size, cached=cached)
+    return content, links, size
+
+async def find_content_from_url(url: str, on_event: EventSink = None) -> Optional[str]:
+    """
+    This function extracts content from the URL.
+    """
+    page = await find_page_from_url(url, on_event)
+    return page[0] if page is not None else None
+
+async def web_search(question: str, num_results: int) -> List[str]:
+    """
+    This function runs the blocking Google search in a worker thread.
+    Results are cached per normalized question and identical searches in flight are shared.
+    """
+    with tracer.span("search") as span:
+        cached = await asyncio.to_thread(search_cache.get, question, num_results)
+        if cached is not None:
+            span.set(cache="hit", results=len(cached))
+            return cached
+
+        def run_search() -> List[str]:
+            links = [url for url in search(question, num_results=num_results)]
+            # Stored from the worker thread, so the result is kept even when every waiting request was cancelled
+            search_cache.put(question, num_results, links)
+            return links
+
+        links = await search_flights.run(f"{num_results}:{normalize_question(question)}", lambda: asyncio.to_thread(run_search))
+        span.set(cache="miss", results=len(links))
+        return links
+
+async def prefetch_links(search_task: asyncio.Task, count: int) -> None:
+    """
+    This function waits for a speculative search and downloads its top results into content_cache.
+    """
+    links = await asyncio.shield(search_task)
+    search_stats["prefetched"] += min(len(links), count)
+    await asyncio.gather(*(find_content_from_url(link) for link in links[:count]), return_exceptions=True)
+
+async def triage_page(content: str, context_text: str, context_tokens: int, question: str) -> Optional[Dict]:
+    """
+    This function asks the triage model whether the page answers the question, without writing the answer.
+    It returns the is_relevant and decision verdict, or None when the triage model failed and the answer model has to decide.
+    Verdicts are cached in llm_cache under the triage model's id, only fresh ones count as answer calls avoided.
+    """
+    triage_id = f"triage:{triage_model.model_id}"
+    cached = await asyncio.to_thread(llm_cache.get, content, question, triage_id)
+    if cached is not None:
+        return cached
+    prompt: str = (
+        f"Here is the content: {context_text}\n\n"
+        f"Question: {question}\n\n"
+        f"Do not answer the question. For the is_relevant part in JSON: respond 'yes' if the content contains the answer to the question's topic, otherwise 'no'."
+        f"For the decision part in JSON: respond with 'search_links' if the question is loosely related to the content (e.g., both belong to similar categories or fields) and 'more_info' if it is completely unrelated."
+        "Respond in the following JSON format, dont write any additional prompt or something:\n"
+        "{\n"
+        "  \"is_relevant\": \"yes\" or \"no\",\n"
+        "  \"decision\": \"search_links\" or \"more_info\"\n"
+        "}\n"
+    )
+    tokens_in = estimate_tokens(prompt)
+    with tracer.span("triage", tokens_in=tokens_in) as span:
+        try:
+            with tier_usage.measure("triage", tokens_in) as call:
+                response = await triage_model.generate_content_async(prompt, **json_mode(TRIAGE_SCHEMA.json_schema()))
+                call.tokens_out = estimate_tokens(response)
+                verdict = response_parser.parse(response.strip(), TRIAGE_SCHEMA)
+        except Exception as e:
+            # A failing cheap model must not cost an answer, the answer model judges the page as before
+            console.print(f"[bold yellow]Triage model failed ({e}), the answer model decides[/bold yellow]")
+            tier_usage.routing["triage_failures"] += 1
+            span.set(verdict="failed")
+            return None
+        span.set(verdict=verdict["is_relevant"])
+    if verdict["is_relevant"] == "no":
+        tier_usage.screened_out(context_tokens)
+    await asyncio.to_thread(llm_cache.put, content, question, triage_id, verdict)
+    return verdict
+
+async def call_llm_with_json(content: str, question: str, on_event: EventSink = None, link: Optional[str] = None) -> Dict:
     """
     Calls the LLM once (Claude in this case) and returns a JSON result with answer, relevance, and decision info.
+    Results for a (content, question, model) seen before are served from llm_cache.
+    With a triage model configured it screens the page first, and the answer model only reads pages it finds relevant.
+    With an event sink the response is streamed and the answer text is pushed as token events while it is generated.
     """
+    with tracer.span("llm_cache") as span:
+        cached = await asyncio.to_thread(llm_cache.get, content, question, model.model_id)
+        span.set(cache="hit" if cached is not None else "miss")
+    if cached is not None:
+        return cached
+
+    # BM25 ranking over the page chunks is CPU bound, run it off the event loop
+    with tracer.span("context") as span:
+        context = await asyncio.to_thread(context_builder.build, content, question)
+        span.set(tokens_original=context.original_tokens, tokens_selected=context.selected_tokens)
+    console.print(f"Context: sent {context.selected_tokens} of {context.original_tokens} tokens "
+                  f"({context.chunks_used}/{context.chunks_total} chunks, saved {context.tokens_saved})")
+    triaged = False
+    if triage_model is not None:
+        verdict = await triage_page(content, context.text, context.selected_tokens, question)
+        if verdict is not None and verdict["is_relevant"] == "no":
+            return {"answer": "", "is_relevant": "no", "decision": verdict["decision"]}
+        if verdict is not None:
+            tier_usage.routing["escalated"] += 1
+            triaged = True
     prompt: str = (
-        f"Here is the content: {content}\n\n"
+        f"Here is the content: {context.text}\n\n"
         f"Question: {question}\n\n"
         f"Firstly Create the answer part in JSON with question from the content, DONT USE YOUR BACK-UP INFORMATION, strictly stick to the content if relevant information cannot be found you can say I dont find the information from the content."
         f"For the is_relevant part in JSON If the answer doesn't contain relevant information, do the is_relevant part 'no'.Only do the is_relevant part 'yes' if the answer specifically answers the question's topic."
@@ -122,29 +663,38 @@ def call_llm_with_json(content: str, question: str) -> Dict:
     )
     
     # Call Claude's LLM (raw text response)
-    response = model.generate_content(prompt)
+    tokens_in = estimate_tokens(prompt)
+    with tracer.span("llm", tokens_in=tokens_in, streamed=on_event is not None) as span, tier_usage.measure("answer", tokens_in) as call:
+        if on_event is None:
+            response = await model.generate_content_async(prompt, **json_mode(ANSWER_SCHEMA.json_schema()))
+        else:
+            streamer = AnswerStreamer()
+            parts: List[str] = []
+            async for delta in model.stream_content_async(prompt):
+                if not parts:
+                    span.set(first_token_ms=round((time.perf_counter() - span.started) * 1000, 2))
+                parts.append(delta)
+                text = streamer.feed(delta)
+                if text:
+                    await emit(on_event, "token", question=question, link=link, text=text)
+            response = "".join(parts)
+        call.tokens_out = estimate_tokens(response)
+        span.set(tokens_out=call.tokens_out)
     
     # Handle Claude's raw response (no 'candidates' structure, direct output)
     result = response.strip()
-    print("Result :",result)
-    # Try to clean and parse the result assuming it's returned as a JSON-like string
+    # Pull the JSON object out of code fences, preamble or trailing prose and check its fields
     try:
-        # Clean up the result if it has code block delimiters
-        if result.startswith("```") and result.endswith("```"):
-            print("HERE1")
-            result = result[3:-3].strip()  # Remove the backticks
-
-        # If the output starts with 'json', clean that prefix if it exists
-        if result.startswith("json"):
-            print("here2")
-            result = result[4:].strip()
-
-        # Try to parse the response as JSON
-        return json.loads(result)
+        with tracer.span("json_parse", chars=len(result)):
+            parsed = response_parser.parse(result, ANSWER_SCHEMA)
+        if triaged and parsed["is_relevant"] == "no":
+            tier_usage.routing["answer_rejected"] += 1
+        await asyncio.to_thread(llm_cache.put, content, question, model.model_id, parsed)
+        return parsed
     
-    except json.JSONDecodeError:
+    except ParseError as e:
         # If parsing fails, log the error and return a default structure
-        console.print(f"[bold red]Error: Claude LLM did not return valid JSON. Output was: {result}[/bold red]")
+        console.print(f"[bold red]Error: Claude LLM did not return valid JSON ({e}). Output was: {result}[/bold red]")
         return {
             "answer": result,  # Return the raw result as the answer if JSON parsing fails
             "is_relevant": "no",
@@ -152,22 +702,213 @@ def call_llm_with_json(content: str, question: str) -> Dict:
         }
 
 
+async def call_llm_with_questions(content: str, questions: List[str]) -> List[Dict]:
+    """
+    Answers several questions about the same page with one LLM call and returns one result per question.
+    Cached questions are skipped and any question the model leaves out falls back to call_llm_with_json.
+    """
+    results: List[Optional[Dict]] = await asyncio.to_thread(
+        lambda: [llm_cache.get(content, question, model.model_id) for question in questions])
+    missing = [index for index, result in enumerate(results) if result is None]
+    if len(missing) == 1:
+        results[missing[0]] = await call_llm_with_json(content, questions[missing[0]])
+        missing = []
+
+    if missing:
+        # One BM25 query over all questions keeps the chunks any of them needs
+        with tracer.span("context") as span:
+            context = await asyncio.to_thread(context_builder.build, content, " ".join(questions[index] for index in missing))
+            span.set(tokens_original=context.original_tokens, tokens_selected=context.selected_tokens)
+        numbered = "\n".join(f"{number}. {questions[index]}" for number, index in enumerate(missing, 1))
+        prompt: str = (
+            f"Here is the content: {context.text}\n\n"
+            f"Questions:\n{numbered}\n\n"
+            f"Answer every question separately from the content, DONT USE YOUR BACK-UP INFORMATION, strictly stick to the content if relevant information cannot be found you can say I dont find the information from the content."
+            f"For the is_relevant part If the answer doesn't contain relevant information, do the is_relevant part 'no'.Only do the is_relevant part 'yes' if the answer specifically answers the question's topic."
+            f"For the decision part: respond with 'search_links' if the question is loosely related to the content and 'more_info' if it is completely unrelated."
+            "Respond with a JSON array that has one object per question in the same order, dont write any additional prompt or something:\n"
+            "[\n"
+            "  {\"id\": <question number>, \"answer\": \"<Your answer here>\", \"is_relevant\": \"yes\" or \"no\", \"decision\": \"search_links\" or \"more_info\"}\n"
+            "]\n"
+        )
+        tokens_in = estimate_tokens(prompt)
+        with tracer.span("llm", tokens_in=tokens_in, questions=len(missing)) as span, tier_usage.measure("answer", tokens_in) as call:
+            result = await model.generate_content_async(prompt, **json_mode(QUESTION_ANSWER_SCHEMA.json_list_schema("answers")))
+            call.tokens_out = estimate_tokens(result)
+            span.set(tokens_out=call.tokens_out)
+        try:
+            with tracer.span("json_parse", chars=len(result)):
+                answers = response_parser.parse_list(result, QUESTION_ANSWER_SCHEMA)
+        except ParseError as e:
+            console.print(f"[bold red]Error: multi-question response was not valid JSON ({e}), answering one by one[/bold red]")
+            answers = []
+        for item in answers:
+            number = item["id"]
+            if 1 <= number <= len(missing) and results[missing[number - 1]] is None:
+                index = missing[number - 1]
+                results[index] = {key: item[key] for key in ("answer", "is_relevant", "decision")}
+                await asyncio.to_thread(llm_cache.put, content, questions[index], model.model_id, results[index])
+
+    for index, result in enumerate(results):
+        if result is None:
+            results[index] = await call_llm_with_json(content, questions[index])
+    return results
+
+async def evaluate_link(link: str, question: str, index: int = 0, total: int = 1, on_event: EventSink = None,
+                        deferred: Optional[List[Tuple[float, int, str, str]]] = None) -> Optional[str]:
+    """
+    This function fetches one additional link and returns the answer if the LLM finds it relevant.
+    A page failing the prefilter is appended to `deferred` as (score, index, link, content) instead, or dropped without one.
+    """
+    console.print(f"🔍 Searching in URL: [bold blue]{link}[/bold blue]")
+    await emit(on_event, "progress", stage="searching", question=question, url=link)
+    content = await find_content_from_url(link, on_event)
+    if not content:
+        return None
+    score = await prefilter_page(content, link, question, on_event)
+    if score is not None:
+        if deferred is not None:
+            deferred.append((score, index, link, content))
+        else:
+            prefilter.stats["llm_calls_saved"] += 1
+        return None
+    return await evaluate_content(content, link, question, index + 1, total, on_event)
+
+async def prefilter_page(content: str, link: str, question: str, on_event: EventSink = None) -> Optional[float]:
+    """
+    This function runs the CPU-only relevance prefilter, it returns None when the page should go to the LLM
+    and the page's prefilter score when it failed.
+    """
+    if PREFILTER_MODE == "off":
+        return None
+    with tracer.span("prefilter", url=link) as span:
+        result = await asyncio.to_thread(prefilter.check, content, question)
+        span.set(passed=result.passed, score=round(result.score, 3), reason=result.reason)
+    if result.passed:
+        return None
+    console.print(f"⏭️ Prefilter held back [bold blue]{link}[/bold blue]: {result.reason} (score {result.score:.2f})")
+    await emit(on_event, "progress", stage="prefiltered", question=question, url=link, reason=result.reason)
+    return result.score
+
+async def evaluate_content(content: str, link: str, question: str, index: int, total: int, on_event: EventSink = None) -> Optional[str]:
+    """
+    This function asks the LLM about an already loaded page and returns the answer if it is relevant.
+    """
+    # Reuse the LLM with the extracted content from the new link
+    await emit(on_event, "progress", stage="evaluating", question=question, url=link, index=index, total=total)
+    llm_result = await call_llm_with_json(content, question, on_event, link)
+    if llm_result.get("is_relevant", "no") == "yes":
+        return llm_result.get("answer")
+    # Any answer tokens already streamed for this link are no longer valid
+    await emit(on_event, "discard", question=question, link=link)
+    return None
+
+async def search_links_concurrently(links: List[str], question: str, concurrency: int = LINK_CONCURRENCY, ordering: str = LINK_ORDERING, on_event: EventSink = None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    This function evaluates up to `concurrency` links at once and returns the first relevant answer.
+    With "arrival" ordering the first relevant result to finish wins, with "rank" ordering a link only
+    wins once every higher ranked link has come back irrelevant. Remaining fetches and LLM calls are cancelled.
+    """
+    pending: Dict[asyncio.Task, int] = {}
+    results: Dict[int, Optional[str]] = {}
+    next_index: int = 0
+    next_rank: int = 0
+    # Pages that failed the prefilter, evaluated best score first once every other link was irrelevant
+    deferred: Optional[List[Tuple[float, int, str, str]]] = [] if PREFILTER_MODE == "defer" else None
+    try:
+        while next_index < len(links) or pending:
+            while next_index < len(links) and len(pending) < max(concurrency, 1):
+                task = asyncio.create_task(evaluate_link(links[next_index], question, next_index, len(links), on_event, deferred))
+                pending[task] = next_index
+                next_index += 1
+
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index = pending.pop(task)
+                try:
+                    results[index] = task.result()
+                except Exception as e:
+                    console.print(f"[bold red]Error evaluating URL {links[index]}:[/bold red] {e}")
+                    results[index] = None
+
+            if ordering == "arrival":
+                for index in sorted(results):
+                    if results[index]:
+                        return results[index], links[index]
+            else:
+                while next_rank in results:
+                    if results[next_rank]:
+                        return results[next_rank], links[next_rank]
+                    next_rank += 1
+
+        return await evaluate_deferred(deferred, question, len(links), on_event)
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        if deferred:
+            # Deferred pages left over once another link answered never cost an LLM call
+            prefilter.stats["llm_calls_saved"] += len(deferred)
+
+async def evaluate_deferred(deferred: Optional[List[Tuple[float, int, str, str]]], question: str, total: int, on_event: EventSink = None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    This function evaluates the pages held back by the prefilter, best score first, and returns the first relevant answer.
+    Evaluated entries are removed from `deferred`.
+    """
+    deferred = deferred if deferred is not None else []
+    deferred.sort(key=lambda entry: (-entry[0], entry[1]))
+    while deferred:
+        _, index, link, content = deferred.pop(0)
+        prefilter.stats["deferred_evaluated"] += 1
+        answer = await evaluate_content(content, link, question, index + 1, total, on_event)
+        if answer:
+            return answer, link
+    return None, None
+
 # Updated search_for_answer function
-async def search_for_answer(websocket: WebSocket, url: str, question: str, user_choice: str, max_attempts: int = 3) -> Tuple[Optional[str], Optional[str]]:
+async def search_for_answer(websocket: WebSocket, url: str, question: str, user_choice: str, max_attempts: int = 3, on_event: EventSink = None, ask_more_info: bool = False) -> Tuple[Optional[str], Optional[str]]:
     """
     This function searches for the answer by first looking at the provided URL.
     If no relevant answer is found, it searches additional links obtained via a web search.
-    If more information is required, it asks the WebSocket client to provide a new URL or question.
+    If more information is required and `ask_more_info` is set, it raises MoreInfoNeeded so the caller asks the
+    WebSocket client for a new URL and question; otherwise it goes on with the link search.
+    Progress and answer tokens are reported through on_event when the client asked for streaming.
     """
     console.print(Panel(f"Searching the provided URL: {url}", style="bold cyan"))
-    
-    # Extract content from the URL
-    content: Optional[str] = find_content_from_url(url)
+    await emit(on_event, "progress", stage="searching", question=question, url=url)
+    num_results: int = 5
+
+    # The fallback search runs while the provided URL is checked, so a miss does not wait for Google
+    search_task: Optional[asyncio.Task] = None
+    prefetch_task: Optional[asyncio.Task] = None
+    if SEARCH_SPECULATIVE:
+        search_stats["speculative"] += 1
+        search_task = asyncio.create_task(web_search(question, num_results))
+        if SEARCH_PREFETCH > 0:
+            prefetch_task = asyncio.create_task(prefetch_links(search_task, min(SEARCH_PREFETCH, max_attempts)))
+    try:
+        return await check_url_then_search(websocket, url, question, user_choice, max_attempts, on_event, ask_more_info, search_task)
+    finally:
+        for task in (prefetch_task, search_task):
+            if task is not None:
+                task.cancel()
+        # Nobody reads a failed speculative search, keep asyncio from reporting it
+        await asyncio.gather(*(task for task in (prefetch_task, search_task) if task is not None), return_exceptions=True)
+
+async def check_url_then_search(websocket: WebSocket, url: str, question: str, user_choice: str, max_attempts: int, on_event: EventSink,
+                                ask_more_info: bool, search_task: Optional[asyncio.Task]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    This function is the body of search_for_answer, `search_task` is the web search already started for the question.
+    """
+    # Extract content from the URL, its links are kept for the crawl
+    page = await find_page_from_url(url, on_event)
+    content: Optional[str] = page[0] if page is not None else None
     if not content:
         console.print(f"[bold red]No content found in the provided URL: {url}[/bold red]")
         return None, None
     # Call LLM once and get all required information
-    llm_result = call_llm_with_json(content, question)
+    await emit(on_event, "progress", stage="evaluating", question=question, url=url, index=0, total=1)
+    llm_result = await call_llm_with_json(content, question, on_event, url)
     console.print(f"[bold red]LLM_RESULT ======={llm_result}[/bold red] ")
 
     answer = llm_result.get("answer", None)
@@ -179,84 +920,499 @@ async def search_for_answer(websocket: WebSocket, url: str, question: str, user_
         return answer, url
     else:
         console.print(Panel(f"❌ No relevant answer found.", style="bold red"))
+        await emit(on_event, "discard", question=question, link=url)
 
-    # If more information is needed
+    # If more information is needed, the pipeline ends here and the client is asked for a new URL and question
     if "more_info" in decision:
-        console.print("HERE")
-        await manager.send_personal_message(json.dumps({
-            "message": "The LLM needs more information. Please provide a new URL and question."
-        }), websocket)
-
-        # Receive the new input (URL and question) from the WebSocket client
-        data = await websocket.receive_text()
-        new_data = json.loads(data)
-        new_url = new_data.get("url")
-        new_question = new_data.get("question")
-        
-        # Recursively call search_for_answer with the new input (including updated question)
-        return await search_for_answer(websocket, new_url, new_question, user_choice, max_attempts)
-    
+        if ask_more_info:
+            raise MoreInfoNeeded(decision)
+        # Out of follow-ups, the web may still know
+        more_info_stats["limit_reached"] += 1
+
+    # Follow the most promising links of the page before asking the web
+    answer, link = await crawl_links(url, page[1], question, on_event)
+    if answer:
+        return answer, link
+
     # Continue with additional link search if no relevant answer was found in the initial URL
     additional_links: List[str] = []
-    num_results: int = 5
     console.print(f"🔍 Searching the web for more information about: [bold yellow]{question}[/bold yellow]")
+    await emit(on_event, "progress", stage="web_search", question=question)
     try:
-        search_results: List[str] = [url for url in search(question, num_results=num_results)]
+        if search_task is not None:
+            search_stats["speculative_used"] += 1
+            search_results: List[str] = await asyncio.shield(search_task)
+        else:
+            search_results = await web_search(question, num_results)
         additional_links = search_results
     except Exception as e:
         console.print(f"[bold red]Error during web search:[/bold red] {e}")
         additional_links = []
     
-    attempts: int = 0
-    for link in additional_links:
-        console.print(f"🔍 Searching in URL: [bold blue]{link}[/bold blue]")
-        answer = find_content_from_url(link)
-        if answer:
-            # Reuse the LLM with the extracted content from the new link
-            llm_result = call_llm_with_json(answer, question)
-            if llm_result.get("is_relevant", "no") == "yes":
-                return llm_result.get("answer"), link
-        
-        attempts += 1
-        if attempts >= max_attempts:
-            console.print(f"[bold red]Max attempts reached: {attempts}[/bold red]")
-            break
+    answer, link = await search_links_concurrently(additional_links[:max_attempts], question, on_event=on_event)
+    if answer:
+        return answer, link
     
     console.print("[bold red]No relevant answer found after checking additional links.[/bold red]")
     return None, None
 
+async def crawl_links(url: str, links: List[Link], question: str, on_event: EventSink = None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    This function explores the links of a page best-first (see LinkCrawler) and returns the first relevant answer.
+    """
+    if link_crawler.max_pages <= 0 or not links:
+        return None, None
+    console.print(f"🔗 Following links of [bold blue]{url}[/bold blue]")
+    await emit(on_event, "progress", stage="crawling", question=question, url=url)
+    crawled = 0
+    deferred: Optional[List[Tuple[float, int, str, str]]] = [] if PREFILTER_MODE == "defer" else None
+
+    async def load_page(link: str) -> Optional[Tuple[str, List[Link], int]]:
+        console.print(f"🔍 Searching in URL: [bold blue]{link}[/bold blue]")
+        await emit(on_event, "progress", stage="searching", question=question, url=link)
+        return await find_page_from_url(link, on_event)
+
+    async def evaluate(content: str, link: str) -> Optional[str]:
+        nonlocal crawled
+        crawled += 1
+        # A page failing the prefilter still has its links followed
+        score = await prefilter_page(content, link, question, on_event)
+        if score is not None:
+            if deferred is not None:
+                deferred.append((score, crawled - 1, link, content))
+            else:
+                prefilter.stats["llm_calls_saved"] += 1
+            return None
+        return await evaluate_content(content, link, question, crawled, link_crawler.max_pages, on_event)
+
+    with tracer.span("crawl", links=len(links)) as span:
+        try:
+            answer, link = await link_crawler.crawl(url, links, question, load_page, evaluate)
+            if not answer:
+                answer, link = await evaluate_deferred(deferred, question, link_crawler.max_pages, on_event)
+        finally:
+            if deferred:
+                prefilter.stats["llm_calls_saved"] += len(deferred)
+        span.set(pages=crawled, answered=answer is not None)
+    if answer:
+        console.print(Panel(f"✅ Relevant answer found by following links:\n{answer}", style="bold green"))
+    return answer, link
+
+def streaming_sink(websocket: WebSocket, question: str) -> EventSink:
+    """
+    This function builds the event sink for one streamed request, events are sent to the client as JSON.
+    """
+    started = time.perf_counter()
+    seen = set()
+
+    async def send_event(event: Dict) -> None:
+        if not seen:
+            stream_stats["requests"] += 1
+            stream_stats["first_event_seconds"] += time.perf_counter() - started
+        if event["type"] == "token" and "token" not in seen:
+            stream_stats["first_token_requests"] += 1
+            stream_stats["first_token_seconds"] += time.perf_counter() - started
+        seen.add(event["type"])
+        await manager.send_personal_message(json.dumps({"question": question, **event}, ensure_ascii=False), websocket)
+
+    return send_event
+
+class BatchJob(BaseModel):
+    url: str
+    question: str
+
+class BatchRequest(BaseModel):
+    jobs: List[BatchJob]
+    concurrency: Optional[int] = None
+
+async def answer_from_search(question: str, max_attempts: int = 3, concurrency: int = LINK_CONCURRENCY) -> Tuple[Optional[str], Optional[str]]:
+    """
+    This function runs the additional link search of search_for_answer for one question, evaluating up to `concurrency` links at once.
+    """
+    try:
+        additional_links = await web_search(question, 5)
+    except Exception as e:
+        console.print(f"[bold red]Error during web search:[/bold red] {e}")
+        return None, None
+    return await search_links_concurrently(additional_links[:max_attempts], question, concurrency)
+
+async def run_batch(jobs: List[BatchJob], concurrency: int, batch_id: str):
+    """
+    This function answers many (url, question) jobs and yields one result per job as soon as it is ready.
+    Every distinct URL is fetched once and the questions on it are answered by shared multi-question prompts.
+    Each fetch, LLM call and fallback search is a scheduler job under `batch_id`, so batches share the global
+    pipeline slots with /ws and one batch holds at most `concurrency` of them. A fallback search evaluates its
+    links one at a time, inside the one slot it holds.
+    """
+    concurrency = max(concurrency, 1)
+    # Bounds the batch's queued and running jobs, so it never fills the scheduler's queue on its own
+    semaphore = asyncio.Semaphore(concurrency)
+    results: asyncio.Queue = asyncio.Queue()
+    groups: Dict[str, List[int]] = {}
+    for index, job in enumerate(jobs):
+        groups.setdefault(normalize_url(job.url), []).append(index)
+
+    reported: Set[int] = set()
+
+    async def finish(index: int, answer: Optional[str], link: Optional[str], error: Optional[str] = None) -> None:
+        # A group that fails after handing questions to fallbacks must not report those twice
+        if index in reported:
+            return
+        reported.add(index)
+        job = jobs[index]
+        result = {"index": index, "url": job.url, "question": job.question, "answer": answer, "link": link}
+        if error:
+            result["error"] = error
+        await results.put(result)
+
+    async def scheduled(factory):
+        async with semaphore:
+            return await scheduler.submit(batch_id, factory, limit=concurrency)
+
+    async def fallback(index: int) -> None:
+        try:
+            answer, link = await scheduled(lambda: answer_from_search(jobs[index].question, concurrency=1))
+        except Exception as e:
+            await finish(index, None, None, batch_error(e))
+            return
+        await finish(index, answer, link)
+
+    async def answer_group(indexes: List[int]) -> None:
+        url = jobs[indexes[0]].url
+        try:
+            content = await scheduled(lambda: find_content_from_url(url))
+            if not content:
+                for index in indexes:
+                    await finish(index, None, None, f"No content found in the provided URL: {url}")
+                return
+            fallbacks = []
+            for start in range(0, len(indexes), BATCH_GROUP_SIZE):
+                part = indexes[start:start + BATCH_GROUP_SIZE]
+                llm_results = await scheduled(lambda part=part: call_llm_with_questions(content, [jobs[index].question for index in part]))
+                for index, llm_result in zip(part, llm_results):
+                    if llm_result.get("answer") and llm_result.get("is_relevant") == "yes":
+                        await finish(index, llm_result["answer"], jobs[index].url)
+                    else:
+                        # Nobody can answer a more_info request in a batch, search the web instead
+                        fallbacks.append(asyncio.create_task(fallback(index)))
+            await asyncio.gather(*fallbacks)
+        except Exception as e:
+            console.print(f"[bold red]Batch group for {url} failed:[/bold red] {e!r}")
+            for index in indexes:
+                await finish(index, None, None, batch_error(e))
+
+    tasks = [asyncio.create_task(answer_group(indexes)) for indexes in groups.values()]
+    try:
+        for _ in range(len(jobs)):
+            yield await results.get()
+    finally:
+        # The client went away or everything is done, stop whatever is still running
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        scheduler.cancel_connection(batch_id)
+
+def batch_error(error: Exception) -> str:
+    """
+    This function turns an exception of a batch job into the error reported for it.
+    """
+    if isinstance(error, SchedulerBusy):
+        return "The server is busy, please try again in a moment."
+    if isinstance(error, asyncio.TimeoutError):
+        return "The request timed out."
+    return str(error)
+
+@app.post("/batch")
+async def batch(request: BatchRequest):
+    """
+    Answers a list of (url, question) jobs and streams the results back as NDJSON, one line per job.
+    """
+    if len(request.jobs) > BATCH_MAX_JOBS:
+        return StreamingResponse(iter([json.dumps({"error": f"At most {BATCH_MAX_JOBS} jobs per batch"}) + "\n"]),
+                                 status_code=413, media_type="application/x-ndjson")
+    concurrency = min(request.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY)
+    trace_id = uuid.uuid4().hex
+
+    async def lines():
+        # The trace starts here because the body is streamed after this handler returned
+        tracer.start_trace(trace_id)
+        with tracer.span("batch", jobs=len(request.jobs)):
+            async for result in run_batch(request.jobs, concurrency, f"batch:{trace_id}"):
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Trace-Id": trace_id})
+
+async def ask_for_more_info(websocket: WebSocket, state: SessionState, message: Dict, trace_id: str, follow_ups: int) -> None:
+    """
+    This function parks the session until the client sends a new URL and question. The pipeline that asked
+    has already ended, only the session state waits, and it gives up after MORE_INFO_TIMEOUT seconds.
+    """
+    if state.waiting:
+        # Only one question waits per session, the older one is answered as not found
+        await expire_more_info(websocket, state)
+    question = message.get("question")
+    state.await_info(question, message.get("url"), trace_id, follow_ups + 1, MORE_INFO_TIMEOUT,
+                     lambda: asyncio.create_task(expire_more_info(websocket, state)))
+    more_info_stats["asked"] += 1
+    await manager.send_personal_message(json.dumps({
+        "message": "The LLM needs more information. Please provide a new URL and question.",
+        "question": question,
+        "trace_id": trace_id,
+        "timeout": MORE_INFO_TIMEOUT
+    }, ensure_ascii=False), websocket)
+
+async def expire_more_info(websocket: WebSocket, state: SessionState) -> None:
+    """
+    This function ends a "more_info" wait without an answer and tells the client its question found nothing.
+    """
+    if not state.waiting:
+        return
+    question, trace_id = state.question, state.trace_id
+    state.clear()
+    more_info_stats["expired"] += 1
+    await manager.send_personal_message(json.dumps({
+        "question": question,
+        "answer": "No relevant information is found",
+        "link": "There is no link",
+        "trace_id": trace_id
+    }, ensure_ascii=False), websocket)
+
+async def answer_question(websocket: WebSocket, message: Dict, state: SessionState, trace_id: Optional[str] = None,
+                          submitted_at: Optional[float] = None, session_id: Optional[str] = None, follow_ups: int = 0) -> None:
+    """
+    This function runs one answer pipeline for a client message and sends the result back.
+    The reply carries the request's trace id, clients that send "trace": true also get its spans.
+    The outcome is stored in the session's history. `follow_ups` counts the "more_info" round-trips
+    that led to this message, the pipeline only asks for more information while it is below MORE_INFO_MAX_FOLLOW_UPS.
+    """
+    url = message.get("url")
+    question = message.get("question")
+    trace = tracer.start_trace(trace_id)
+    if submitted_at is not None:
+        tracer.record("queue_wait", time.perf_counter() - submitted_at)
+
+    # Clients that send "stream": true get progress and answer token events before the final message
+    on_event: EventSink = None
+    if message.get("stream"):
+        on_event = streaming_sink(websocket, question)
+
+    # Step 2: Extract content from the URL and use the updated function
+    more_info = False
+    with tracer.span("pipeline", streamed=on_event is not None) as span:
+        try:
+            answer, link = await search_for_answer(websocket, url, question, "detailed", on_event=on_event,
+                                                   ask_more_info=follow_ups < MORE_INFO_MAX_FOLLOW_UPS)
+        except MoreInfoNeeded:
+            answer, link, more_info = None, None, True
+            span.set(more_info=True)
+        else:
+            span.set(answered=answer is not None)
+    if session_id is not None and url and question:
+        await asyncio.to_thread(history.add, session_id, url, question, answer, link)
+    if more_info:
+        await ask_for_more_info(websocket, state, message, trace.trace_id, follow_ups)
+        return
+
+    if answer is None:
+        answer = "No relevant information is found"
+        link = "There is no link"
+        
+    console.print(f"Sending answer: {answer}")  # Log the answer before sending it back
+
+    # Step 4: Send the answer, updated question, and link back to the client
+    response = {
+        "question": question,  # Ensure the updated question is sent back
+        "answer": answer,
+        "link": link,
+        "trace_id": trace.trace_id,
+        "session_id": session_id
+    }
+    if message.get("follow_up_of"):
+        response["follow_up_of"] = message["follow_up_of"]
+    if message.get("trace"):
+        response["trace"] = trace.summary()
+    response_data = json.dumps(response, ensure_ascii=False, indent=4)  # Properly format JSON with readable indentations
+
+    await manager.send_personal_message(response_data, websocket)
+
+def report_pipeline_failure(websocket: WebSocket, question: Optional[str], trace_id: Optional[str] = None):
+    """
+    This function tells the client when its pipeline timed out or crashed instead of leaving it pending.
+    """
+    def callback(future: asyncio.Future) -> None:
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            return
+        if isinstance(error, asyncio.TimeoutError):
+            text = "The request took too long and was cancelled."
+        else:
+            console.print(f"[bold red]Pipeline failed for question {question}:[/bold red] {error!r}")
+            text = "The request failed."
+        response_data = json.dumps({"question": question, "answer": text, "link": "There is no link", "trace_id": trace_id}, ensure_ascii=False)
+        asyncio.create_task(manager.send_personal_message(response_data, websocket))
+
+    return callback
+
+def invalid_question_message(message: Dict) -> Optional[str]:
+    """
+    This function checks the url and question of a client message, it returns what is wrong with them or None.
+    """
+    for name in ("url", "question"):
+        value = message.get(name)
+        if not isinstance(value, str) or not value.strip():
+            return f"The message needs a non-empty \"{name}\" string."
+    return None
+
+def message_int(message: Dict, name: str, default: Optional[int], low: int, high: int) -> Optional[int]:
+    """
+    This function reads an integer field of a client message clamped to [low, high], malformed values give the default.
+    """
+    value = message.get(name)
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        return default
+    try:
+        return max(low, min(int(value), high))
+    except (ValueError, OverflowError):
+        return default
+
+async def send_history(websocket: WebSocket, message: Dict, session_id: str) -> None:
+    """
+    This function answers a {"type": "history"} message with one page of this session's history, newest first.
+    "before" is the "next_before" of the previous page and "query" keeps only questions containing those words.
+    Other sessions' history is never readable over the socket.
+    """
+    query = message.get("query")
+    entries, next_before = await asyncio.to_thread(
+        history.page,
+        session_id=session_id,
+        before=message_int(message, "before", None, 0, 2 ** 63 - 1),
+        limit=message_int(message, "limit", 20, 1, MAX_PAGE_SIZE),
+        query=query if isinstance(query, str) else None,
+    )
+    await manager.send_personal_message(json.dumps({
+        "type": "history",
+        "session_id": session_id,
+        "entries": [entry.to_dict() for entry in entries],
+        "next_before": next_before,
+    }, ensure_ascii=False), websocket)
+
+async def answer_from_history(websocket: WebSocket, message: Dict, session_id: str, trace_id: str) -> bool:
+    """
+    This function replies straight away when the same question on the URL (or a near-identical one with HISTORY_SIMILARITY) was answered before,
+    clients send "fresh": true to always run the pipeline. Returns whether it replied.
+    """
+    url = message.get("url")
+    question = message.get("question")
+    if message.get("fresh") or not url or not question:
+        return False
+    entry = await asyncio.to_thread(history.lookup, url, question)
+    if entry is None:
+        return False
+    console.print(f"♻️ Reusing the answer from history entry {entry.id} for: {question}")
+    await asyncio.to_thread(history.add, session_id, url, question, entry.answer, entry.link)
+    await manager.send_personal_message(json.dumps({
+        "question": question,
+        "answer": entry.answer,
+        "link": entry.link,
+        "trace_id": trace_id,
+        "session_id": session_id,
+        "from_history": entry.id
+    }, ensure_ascii=False, indent=4), websocket)
+    return True
+
+def is_heartbeat_reply(data: str) -> bool:
+    """
+    This function tells whether a client message is the {"type": "pong"} answer to a heartbeat.
+    """
+    if '"pong"' not in data:
+        return False
+    try:
+        message = json.loads(data)
+    except json.JSONDecodeError:
+        return False
+    return isinstance(message, dict) and message.get("type") == "pong"
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    connection_id = await manager.connect(websocket)
+    # Clients that reconnect send their earlier session_id to continue its history
+    session_id = uuid.uuid4().hex
+    await asyncio.to_thread(sessions.open, session_id)
+    # Where the session stands in a "more_info" round-trip
+    state = SessionState()
     try:
         while True:
             # Step 1: Receive the JSON message from the client
             data = await websocket.receive_text()
+            manager.touch(websocket)
+            # Replies to heartbeats only keep the connection alive
+            if is_heartbeat_reply(data):
+                continue
+
             message = json.loads(data)
-            
-            url = message.get("url")
+            if message.get("session_id") and str(message["session_id"]) != session_id:
+                await asyncio.to_thread(sessions.close, session_id)
+                session_id = str(message["session_id"])
+                await asyncio.to_thread(sessions.open, session_id)
+            if message.get("type") == "history":
+                await send_history(websocket, message, session_id)
+                continue
             question = message.get("question")
+            console.print(f"Received URL: {message.get('url')}, Question: {question}")  # Log URL and question
+            problem = invalid_question_message(message)
+            if problem:
+                await manager.send_personal_message(json.dumps({
+                    "question": question,
+                    "answer": problem,
+                    "link": "There is no link"
+                }, ensure_ascii=False), websocket)
+                continue
+
+            # The new URL and question after a "more_info" request continue that question as a new pipeline
+            follow_ups = 0
+            if state.waiting:
+                message["follow_up_of"] = state.question
+                follow_ups = state.resume()
+                more_info_stats["resumed"] += 1
+
+            # Clients may pass their own trace id to correlate with their logs
+            trace_id = str(message.get("trace_id") or uuid.uuid4().hex)
+            await asyncio.to_thread(sessions.touch, session_id, questions=1)
+            if await answer_from_history(websocket, message, session_id, trace_id):
+                continue
+            submitted_at = time.perf_counter()
+            try:
+                future = scheduler.submit(connection_id, lambda message=message, trace_id=trace_id, submitted_at=submitted_at, session_id=session_id, follow_ups=follow_ups:
+                                          answer_question(websocket, message, state, trace_id, submitted_at, session_id, follow_ups))
+            except SchedulerBusy as e:
+                console.print(f"[bold red]Rejecting request, server busy:[/bold red] {e}")
+                await manager.send_personal_message(json.dumps({
+                    "type": "busy",
+                    "question": question,
+                    "message": "The server is busy, please try again in a moment."
+                }), websocket)
+                continue
+            future.add_done_callback(report_pipeline_failure(websocket, question, trace_id))
 
-            console.print(f"Received URL: {url}, Question: {question}")  # Log URL and question
-
-            # Step 2: Extract content from the URL and use the updated function
-            answer, link = await search_for_answer(websocket, url, question, "detailed")
-            
-            if answer is None:
-                answer = "No relevant information is found"
-                link = "There is no link"
-                
-            console.print(f"Sending answer: {answer}")  # Log the answer before sending it back
-
-            # Step 4: Send the answer, updated question, and link back to the client
-            response_data = json.dumps({
-                "question": question,  # Ensure the updated question is sent back
-                "answer": answer,
-                "link": link
-            }, ensure_ascii=False, indent=4)  # Properly format JSON with readable indentations
-
-            await manager.send_personal_message(response_data, websocket)
+            position = scheduler.queue_position(connection_id)
+            if message.get("stream") and position:
+                await manager.send_personal_message(json.dumps({
+                    "type": "progress",
+                    "stage": "queued",
+                    "question": question,
+                    "position": position,
+                    "waiting": scheduler.queued
+                }), websocket)
     
     except WebSocketDisconnect:
+        pass
+    finally:
+        # Drop queued work and cancel running pipelines of the client that left
+        scheduler.cancel_connection(connection_id)
         manager.disconnect(websocket)
-        await manager.broadcast(f"Client disconnected")
+        await asyncio.to_thread(sessions.close, session_id)
+        if state.waiting:
+            more_info_stats["abandoned"] += 1
+            state.clear()
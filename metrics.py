@@ -0,0 +1,228 @@
+import math
+import time
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Seconds, from a cache hit to a slow LLM call or pipeline timeout
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, *label_values: str) -> None:
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, label_values)} {_number(value)}")
+        return lines
+
+
+class Gauge:
+    """
+    Value read from `collect` at scrape time, e.g. the scheduler queue length.
+    """
+    def __init__(self, name: str, documentation: str, collect: Callable[[], float]) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge", f"{self.name} {_number(self.collect())}"]
+
+
+class Histogram:
+    """
+    Cumulative bucket histogram in the Prometheus text format, one series per label combination.
+    """
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [per-bucket counts (not cumulative), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][index] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, label_values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, label_values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, label_values)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: "OrderedDict[str, object]" = OrderedDict()
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, collect: Callable[[], float]) -> Gauge:
+        return self._register(Gauge(name, documentation, collect))
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class Trace:
+    """
+    Spans of one request, kept so a slow request can be looked up by its trace id.
+    Only the first `max_spans` spans are kept, a large batch still counts the rest in `dropped`.
+    """
+    __slots__ = ("trace_id", "started", "spans", "max_spans", "dropped")
+
+    def __init__(self, trace_id: Optional[str] = None, max_spans: int = 1000) -> None:
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.spans: List[Dict] = []
+        self.max_spans = max_spans
+        self.dropped = 0
+
+    def add(self, span: Dict) -> None:
+        if len(self.spans) < self.max_spans:
+            self.spans.append(span)
+        else:
+            self.dropped += 1
+
+    def summary(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "elapsed_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "spans": self.spans,
+            "dropped_spans": self.dropped,
+        }
+
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+class Span:
+    """
+    Times one pipeline stage. Attributes set with set() end up in the trace, and the known ones
+    (bytes, tokens_in, tokens_out, cache) also feed the Tracer's counters.
+    """
+    __slots__ = ("tracer", "stage", "attributes", "started")
+
+    def __init__(self, tracer: "Tracer", stage: str, attributes: Dict) -> None:
+        self.tracer = tracer
+        self.stage = stage
+        self.attributes = attributes
+        self.started = 0.0
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> "Span":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            outcome = "ok"
+        elif exc_type.__name__ == "CancelledError":
+            outcome = "cancelled"
+        else:
+            outcome = "error"
+        self.tracer.record(self.stage, time.perf_counter() - self.started, outcome, self.attributes, self.started)
+
+
+class Tracer:
+    """
+    Per-stage spans for the answer pipeline: every span is observed in the stage latency histogram and,
+    inside start_trace(), appended to the request's trace. The last `max_traces` traces stay retrievable.
+    """
+    def __init__(self, registry: MetricsRegistry, max_traces: int = 256) -> None:
+        self.max_traces = max_traces
+        self.traces: "OrderedDict[str, Trace]" = OrderedDict()
+        self.stage_seconds = registry.histogram("pipeline_stage_seconds", "Time spent per pipeline stage.", ("stage", "outcome"))
+        self.stage_bytes = registry.counter("pipeline_stage_bytes_total", "Bytes read by pipeline stages.", ("stage",))
+        self.llm_tokens = registry.counter("llm_tokens_total", "Estimated LLM tokens sent and received.", ("direction",))
+        self.cache_lookups = registry.counter("pipeline_cache_lookups_total", "Cache lookups per stage and result.", ("stage", "result"))
+
+    def start_trace(self, trace_id: Optional[str] = None) -> Trace:
+        trace = Trace(trace_id)
+        current_trace.set(trace)
+        self.traces[trace.trace_id] = trace
+        while len(self.traces) > self.max_traces:
+            self.traces.popitem(last=False)
+        return trace
+
+    def span(self, stage: str, **attributes) -> Span:
+        return Span(self, stage, attributes)
+
+    def record(self, stage: str, seconds: float, outcome: str = "ok", attributes: Optional[Dict] = None, started: Optional[float] = None) -> None:
+        attributes = attributes or {}
+        self.stage_seconds.observe(seconds, stage, outcome)
+        if attributes.get("bytes"):
+            self.stage_bytes.inc(attributes["bytes"], stage)
+        if attributes.get("tokens_in"):
+            self.llm_tokens.inc(attributes["tokens_in"], "in")
+        if attributes.get("tokens_out"):
+            self.llm_tokens.inc(attributes["tokens_out"], "out")
+        if "cache" in attributes:
+            self.cache_lookups.inc(1, stage, str(attributes["cache"]))
+
+        trace = current_trace.get()
+        if trace is not None:
+            started = started if started is not None else time.perf_counter() - seconds
+            trace.add({
+                "stage": stage,
+                "start_ms": round((started - trace.started) * 1000, 2),
+                "duration_ms": round(seconds * 1000, 2),
+                "outcome": outcome,
+                **attributes,
+            })
@@ -0,0 +1,99 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+# List prices in USD per million input and output tokens, for the cost counters when a tier sets no price
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "anthropic.claude-3-5-sonnet-20240620-v1:0": (3.0, 15.0),
+    "anthropic.claude-3-haiku-20240307-v1:0": (0.25, 1.25),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-1.5-flash-8b": (0.0375, 0.15),
+}
+
+
+def parse_price(setting: Optional[str], model_id: str) -> Tuple[float, float]:
+    """
+    Reads an "input,output" price per million tokens, falling back to the list price of the tier's first model.
+    """
+    if setting:
+        price_in, _, price_out = setting.partition(",")
+        return float(price_in), float(price_out or price_in)
+    return MODEL_PRICES.get(model_id.split("|", 1)[0], (0.0, 0.0))
+
+
+class TierCall:
+    """
+    One measured model call, the caller fills in tokens_out once the response is in.
+    """
+    __slots__ = ("tokens_in", "tokens_out")
+
+    def __init__(self, tokens_in: int) -> None:
+        self.tokens_in = tokens_in
+        self.tokens_out = 0
+
+
+class TierUsage:
+    """
+    Calls, latency, estimated tokens and cost per model tier ("triage", "answer"), and how the triage tier
+    routed pages: screened out (the answer model never saw them), escalated to the answer model, triage
+    failures that fell back to the answer model, and escalated pages the answer model still found irrelevant.
+    Tokens are the usual 4-characters estimate, so costs are estimates too.
+    """
+    def __init__(self) -> None:
+        self.prices: Dict[str, Tuple[float, float]] = {}
+        self.tiers: Dict[str, Dict[str, float]] = {}
+        self.routing: Dict[str, float] = {"screened_out": 0, "escalated": 0, "triage_failures": 0, "answer_rejected": 0,
+                                          "answer_cost_avoided_usd": 0.0}
+
+    def set_price(self, tier: str, price: Tuple[float, float]) -> None:
+        self.prices[tier] = price
+
+    def cost(self, tier: str, tokens_in: int, tokens_out: int) -> float:
+        price_in, price_out = self.prices.get(tier, (0.0, 0.0))
+        return (tokens_in * price_in + tokens_out * price_out) / 1_000_000
+
+    def record(self, tier: str, seconds: float, tokens_in: int, tokens_out: int, failed: bool = False) -> None:
+        usage = self.tiers.setdefault(tier, {"calls": 0, "failures": 0, "seconds": 0.0, "tokens_in": 0, "tokens_out": 0, "cost_usd": 0.0})
+        usage["calls"] += 1
+        usage["failures"] += failed
+        usage["seconds"] += seconds
+        usage["tokens_in"] += tokens_in
+        usage["tokens_out"] += tokens_out
+        usage["cost_usd"] += self.cost(tier, tokens_in, tokens_out)
+
+    @contextmanager
+    def measure(self, tier: str, tokens_in: int) -> Iterator[TierCall]:
+        """
+        Records the call made inside the block, as failed when the block raises.
+        """
+        call = TierCall(tokens_in)
+        started = time.perf_counter()
+        try:
+            yield call
+        except BaseException:
+            self.record(tier, time.perf_counter() - started, call.tokens_in, call.tokens_out, failed=True)
+            raise
+        self.record(tier, time.perf_counter() - started, call.tokens_in, call.tokens_out)
+
+    def screened_out(self, tokens_in: int) -> None:
+        """
+        Counts a page the answer model did not have to read, priced at its prompt and an average answer.
+        """
+        self.routing["screened_out"] += 1
+        answer = self.tiers.get("answer")
+        tokens_out = answer["tokens_out"] / answer["calls"] if answer and answer["calls"] else 0
+        self.routing["answer_cost_avoided_usd"] += self.cost("answer", tokens_in, int(tokens_out))
+
+    def total_cost(self) -> float:
+        return sum(usage["cost_usd"] for usage in self.tiers.values())
+
+    def stats(self) -> Dict:
+        return {
+            "tiers": {
+                tier: {**usage, "avg_seconds": usage["seconds"] / usage["calls"] if usage["calls"] else 0.0,
+                       "price_per_million": self.prices.get(tier)}
+                for tier, usage in self.tiers.items()
+            },
+            "routing": self.routing,
+            "cost_usd": self.total_cost(),
+        }
@@ -0,0 +1,137 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+from extractor import Extractor, Link, get_extractor
+
+# Pages smaller than this are parsed in a thread of the server process, shipping them to a worker costs more than it saves
+INLINE_MAX_BYTES = 256 * 1024
+# Bodies from this size on reach the worker through shared memory instead of being pickled through a pipe
+SHARED_MEMORY_MIN_BYTES = 1024 * 1024
+
+# Set in every worker process by _init_worker
+_worker_extractor: Optional[Extractor] = None
+
+
+def _init_worker(backend: str, strip_boilerplate: bool) -> None:
+    global _worker_extractor
+    _worker_extractor = get_extractor(backend, strip_boilerplate=strip_boilerplate)
+
+
+def _decode(data, encoding: str) -> str:
+    # str() decodes straight from a bytes object or a shared memory view, without another copy
+    try:
+        return str(data, encoding, "replace")
+    except LookupError:
+        return str(data, "utf-8", "replace")
+
+
+def _parse_bytes(content: bytes, encoding: str, base_url: Optional[str]) -> Tuple[str, List[Link]]:
+    return _worker_extractor.extract_with_links(_decode(content, encoding), base_url)
+
+
+def _parse_shared(name: str, size: int, encoding: str, base_url: Optional[str]) -> Tuple[str, List[Link]]:
+    segment = shared_memory.SharedMemory(name=name)
+    try:
+        view = segment.buf[:size]
+        try:
+            html = _decode(view, encoding)
+        finally:
+            view.release()
+    finally:
+        segment.close()
+    return _worker_extractor.extract_with_links(html, base_url)
+
+
+def _ready() -> bool:
+    return _worker_extractor is not None
+
+
+class ParsePool:
+    """
+    Routes HTML parsing by size: small pages are parsed in a thread of this process, large ones in a pool of
+    `workers` processes running the same extractor backend, so parsing big pages is not serialized on this
+    process's GIL. Bodies of at least `shared_memory_min_bytes` are handed over in a shared memory segment.
+    With 0 workers everything is parsed in a thread. A crashed worker restarts the pool and the page is
+    parsed in a thread instead.
+    """
+    def __init__(self, extractor: Extractor, workers: int, inline_max_bytes: int = INLINE_MAX_BYTES,
+                 shared_memory_min_bytes: int = SHARED_MEMORY_MIN_BYTES) -> None:
+        self.extractor = extractor
+        self.workers = workers
+        self.inline_max_bytes = inline_max_bytes
+        self.shared_memory_min_bytes = shared_memory_min_bytes
+        self.inflight = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.stats: Dict[str, int] = {"inline": 0, "pooled": 0, "shared_memory": 0, "pooled_bytes": 0, "restarts": 0}
+
+    def saturation(self) -> float:
+        """
+        Pages in the pool per worker, above 1 pages are waiting for a free worker.
+        """
+        return self.inflight / self.workers if self.workers > 0 else 0.0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Workers come from a clean forkserver process, not a fork of this threaded server
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(method),
+                initializer=_init_worker,
+                initargs=(self.extractor.name, self.extractor.strip_boilerplate),
+            )
+        return self._executor
+
+    async def warm_up(self) -> None:
+        """
+        Starts the worker processes ahead of the first large page.
+        """
+        if self.workers <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._pool(), _ready) for _ in range(self.workers)))
+
+    async def parse(self, content: bytes, encoding: str, base_url: Optional[str] = None) -> Tuple[str, List[Link]]:
+        """
+        Returns the text and links of a downloaded page body.
+        """
+        if self.workers <= 0 or len(content) < self.inline_max_bytes:
+            self.stats["inline"] += 1
+            return await asyncio.to_thread(self._parse_inline, content, encoding, base_url)
+        self.inflight += 1
+        try:
+            return await self._parse_in_pool(content, encoding, base_url)
+        except BrokenProcessPool:
+            self.stats["restarts"] += 1
+            self._executor = None
+            return await asyncio.to_thread(self._parse_inline, content, encoding, base_url)
+        finally:
+            self.inflight -= 1
+
+    def _parse_inline(self, content: bytes, encoding: str, base_url: Optional[str]) -> Tuple[str, List[Link]]:
+        return self.extractor.extract_with_links(_decode(content, encoding), base_url)
+
+    async def _parse_in_pool(self, content: bytes, encoding: str, base_url: Optional[str]) -> Tuple[str, List[Link]]:
+        loop = asyncio.get_running_loop()
+        executor = self._pool()
+        self.stats["pooled"] += 1
+        self.stats["pooled_bytes"] += len(content)
+        if len(content) < self.shared_memory_min_bytes:
+            return await loop.run_in_executor(executor, _parse_bytes, content, encoding, base_url)
+        segment = shared_memory.SharedMemory(create=True, size=len(content))
+        try:
+            segment.buf[:len(content)] = content
+            self.stats["shared_memory"] += 1
+            return await loop.run_in_executor(executor, _parse_shared, segment.name, len(content), encoding, base_url)
+        finally:
+            segment.close()
+            segment.unlink()
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
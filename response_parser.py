@@ -0,0 +1,283 @@
+import ast
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Characters that matter for brace matching, everything in between is skipped by the regex engine
+_STRUCTURE_RE = re.compile(r"[\"'\\{}\[\]]")
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_CLOSERS = {"{": "}", "[": "]"}
+_decoder = json.JSONDecoder(strict=False)
+
+
+class ParseError(ValueError):
+    """
+    Raised when an LLM response holds no JSON value that satisfies the schema.
+    """
+
+
+def _scan(text: str, start: int) -> Tuple[int, List[str], Optional[str]]:
+    """
+    Brace matching from the opening bracket at `start`. Returns the index after the matching close bracket
+    (-1 when the text ends first), the brackets still open and the quote character of an unterminated string.
+    Single quoted strings are tracked too, so braces inside them do not count.
+    """
+    stack: List[str] = []
+    quote: Optional[str] = None
+    escaped_at = -1  # index of the character a backslash inside a string escapes
+    for match in _STRUCTURE_RE.finditer(text, start):
+        char = match.group()
+        if match.start() == escaped_at:
+            continue
+        if quote is not None:
+            if char == "\\":
+                escaped_at = match.start() + 1
+            elif char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char in _CLOSERS:
+            stack.append(char)
+        elif char in "}]":
+            if not stack or _CLOSERS[stack[-1]] != char:
+                return -1, stack, quote
+            stack.pop()
+            if not stack:
+                return match.end(), stack, quote
+    return -1, stack, quote
+
+
+def _repair(candidate: str) -> Any:
+    """
+    Tries the usual LLM mistakes: trailing commas and Python style single quoted literals.
+    """
+    without_commas = _TRAILING_COMMA_RE.sub(r"\1", candidate)
+    try:
+        return _decoder.decode(without_commas)
+    except ValueError:
+        pass
+    try:
+        value = ast.literal_eval(without_commas)
+    except Exception:
+        raise ValueError("not repairable") from None
+    if not isinstance(value, (dict, list)):
+        raise ValueError("not a JSON container")
+    return value
+
+
+def iter_json_values(text: str) -> Iterator[Tuple[Any, bool]]:
+    """
+    Yields the top level JSON objects and arrays in `text` in order, with a flag telling if the value needed repair.
+    Preamble, trailing prose and code fences around the JSON are skipped without copying the text;
+    a value cut off by the token limit is closed and yielded as repaired.
+    """
+    position = 0
+    length = len(text)
+    while position < length:
+        brace = text.find("{", position)
+        bracket = text.find("[", position)
+        starts = [index for index in (brace, bracket) if index != -1]
+        if not starts:
+            return
+        start = min(starts)
+        try:
+            # raw_decode reads straight from the original string
+            value, end = _decoder.raw_decode(text, start)
+            yield value, False
+            position = end
+            continue
+        except ValueError:
+            pass
+
+        end, stack, quote = _scan(text, start)
+        if end != -1:
+            try:
+                yield _repair(text[start:end]), True
+                position = end
+                continue
+            except ValueError:
+                pass
+        elif stack:
+            # Truncated output: close the open string and brackets
+            closing = (quote or "") + "".join(_CLOSERS[char] for char in reversed(stack))
+            try:
+                yield _repair(text[start:] + closing), True
+                return
+            except ValueError:
+                pass
+        position = start + 1
+
+
+class Field:
+    """
+    One key of a Schema. With `choices` the value is lowercased and must be one of them,
+    a missing or invalid optional value becomes `default`.
+    """
+    __slots__ = ("name", "type", "required", "choices", "default", "description")
+
+    def __init__(self, name: str, type: type = str, required: bool = True, choices: Optional[Sequence[str]] = None,
+                 default: Any = None, description: str = "") -> None:
+        self.name = name
+        self.type = type
+        self.required = required
+        self.choices = tuple(choices) if choices else None
+        self.default = default
+        self.description = description
+
+    def coerce(self, value: Any) -> Any:
+        if self.choices is not None:
+            if isinstance(value, bool):
+                value = self.choices[0] if value else self.choices[-1]
+            value = str(value).strip(" .!'\"").lower()
+            if value not in self.choices:
+                raise ParseError(f"{self.name} must be one of {', '.join(self.choices)}, got {value!r}")
+            return value
+        if self.type is int:
+            if isinstance(value, bool):
+                raise ParseError(f"{self.name} must be an integer")
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                raise ParseError(f"{self.name} must be an integer, got {value!r}") from None
+        if self.type is str and not isinstance(value, str):
+            return json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else str(value)
+        return value
+
+
+class Schema:
+    """
+    Expected shape of a JSON object in an LLM response.
+    """
+    def __init__(self, name: str, fields: Sequence[Field]) -> None:
+        self.name = name
+        self.fields = list(fields)
+
+    def validate(self, value: Any) -> Dict:
+        if not isinstance(value, dict):
+            raise ParseError(f"{self.name} must be a JSON object, got {type(value).__name__}")
+        result: Dict[str, Any] = {}
+        for field in self.fields:
+            if value.get(field.name) is None:
+                if field.required:
+                    raise ParseError(f"{self.name} is missing {field.name}")
+                result[field.name] = field.default
+                continue
+            try:
+                result[field.name] = field.coerce(value[field.name])
+            except ParseError:
+                if field.required:
+                    raise
+                result[field.name] = field.default
+        return result
+
+    def json_schema(self) -> Dict:
+        """
+        JSON Schema for provider-native structured output (Claude tool input, Gemini response schema).
+        """
+        properties: Dict[str, Dict] = {}
+        for field in self.fields:
+            prop: Dict[str, Any] = {"type": "integer" if field.type is int else "string"}
+            if field.choices:
+                prop["enum"] = list(field.choices)
+            if field.description:
+                prop["description"] = field.description
+            properties[field.name] = prop
+        return {
+            "type": "object",
+            "properties": properties,
+            "required": [field.name for field in self.fields if field.required],
+        }
+
+    def json_list_schema(self, key: str = "items") -> Dict:
+        """
+        JSON Schema for a list of these objects, wrapped in an object because tool input must be one.
+        """
+        return {"type": "object", "properties": {key: {"type": "array", "items": self.json_schema()}}, "required": [key]}
+
+
+ANSWER_SCHEMA = Schema("answer", [
+    Field("answer", description="Answer taken only from the content"),
+    Field("is_relevant", required=False, choices=("yes", "no"), default="no",
+          description="yes only if the answer specifically answers the question"),
+    Field("decision", required=False, choices=("search_links", "more_info"), default="search_links",
+          description="search_links if the question is loosely related to the content, more_info if unrelated"),
+])
+
+# What the triage model decides about a page, without writing the answer. When in doubt the page goes to the answer model
+TRIAGE_SCHEMA = Schema("triage", [
+    Field("is_relevant", required=False, choices=("yes", "no"), default="yes",
+          description="yes only if the content contains the answer to the question"),
+    Field("decision", required=False, choices=("search_links", "more_info"), default="search_links",
+          description="search_links if the question is loosely related to the content, more_info if unrelated"),
+])
+
+QUESTION_ANSWER_SCHEMA = Schema("question answer", [Field("id", type=int, description="Question number")] + ANSWER_SCHEMA.fields)
+
+
+class ResponseParser:
+    """
+    Turns raw LLM text into schema-validated dicts and counts how often that fails.
+    Every failure sends the pipeline to another fetch and LLM call, so failure_rate() is worth watching.
+    """
+    def __init__(self) -> None:
+        self.stats: Dict[str, int] = {"responses": 0, "parsed": 0, "repaired": 0, "failed": 0, "no_json": 0, "invalid": 0}
+
+    def parse(self, text: str, schema: Schema) -> Dict:
+        """
+        Returns the first JSON object in `text` that satisfies `schema`, raises ParseError when there is none.
+        """
+        self.stats["responses"] += 1
+        error: Optional[ParseError] = None
+        for value, repaired in iter_json_values(text or ""):
+            error = error or ParseError(f"no {schema.name} object in the response")
+            candidates = value if isinstance(value, list) else [value]
+            if isinstance(value, dict):
+                # Also accept the object wrapped in another one, e.g. {"response": {...}}
+                candidates += [nested for nested in value.values() if isinstance(nested, dict)]
+            for candidate in candidates:
+                try:
+                    result = schema.validate(candidate)
+                except ParseError as e:
+                    error = e
+                    continue
+                self._record_success(repaired)
+                return result
+        return self._fail(error)
+
+    def parse_list(self, text: str, schema: Schema) -> List[Dict]:
+        """
+        Returns the items of the first JSON array in `text` that satisfy `schema`, invalid items are dropped.
+        Raises ParseError when no array has a valid item.
+        """
+        self.stats["responses"] += 1
+        error: Optional[ParseError] = None
+        for value, repaired in iter_json_values(text or ""):
+            error = error or ParseError(f"no {schema.name} items in the response")
+            items = value if isinstance(value, list) else [value]
+            if isinstance(value, dict):
+                # Unwrap {"items": [...]} as produced with json_list_schema
+                items = next((nested for nested in value.values() if isinstance(nested, list)), items)
+            results = []
+            for item in items:
+                try:
+                    results.append(schema.validate(item))
+                except ParseError as e:
+                    error = e
+            if results:
+                self._record_success(repaired)
+                return results
+        return self._fail(error)
+
+    def failure_rate(self) -> float:
+        return self.stats["failed"] / self.stats["responses"] if self.stats["responses"] else 0.0
+
+    def _record_success(self, repaired: bool) -> None:
+        self.stats["parsed"] += 1
+        if repaired:
+            self.stats["repaired"] += 1
+
+    def _fail(self, error: Optional[ParseError]):
+        self.stats["failed"] += 1
+        # No error means iter_json_values found nothing at all, otherwise JSON was there but did not fit the schema
+        self.stats["invalid" if error is not None else "no_json"] += 1
+        raise error or ParseError("no JSON in the response")
@@ -0,0 +1,144 @@
+import asyncio
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set
+
+
+class SchedulerBusy(Exception):
+    """
+    Raised by submit() when the queues are full and the request is rejected.
+    """
+
+
+class Job:
+    __slots__ = ("connection_id", "factory", "future", "deadline", "limit")
+
+    def __init__(self, connection_id: str, factory: Callable[[], Awaitable[Any]], future: asyncio.Future, deadline: Optional[float],
+                 limit: Optional[int] = None) -> None:
+        self.connection_id = connection_id
+        self.factory = factory
+        self.future = future
+        self.deadline = deadline
+        self.limit = limit
+
+
+class RequestScheduler:
+    """
+    Admission control for answer pipelines. At most `max_inflight` pipelines run at once and each connection
+    runs at most `max_inflight_per_connection` of them. Waiting jobs sit in per-connection queues that are
+    served round-robin, so one busy client cannot starve the others. submit() raises SchedulerBusy when the
+    connection's queue or the global queue is full, and a job that passes its deadline, whether queued or running,
+    fails with asyncio.TimeoutError. cancel_connection() drops everything a disconnected client left behind.
+    A submit() `limit` replaces both per-connection limits for that job, e.g. for a batch allowed several slots.
+    """
+    def __init__(self, max_inflight: int = 16, max_inflight_per_connection: int = 1, max_queued_per_connection: int = 4,
+                 max_queued: int = 256, timeout: Optional[float] = 120.0) -> None:
+        self.max_inflight = max_inflight
+        self.max_inflight_per_connection = max_inflight_per_connection
+        self.max_queued_per_connection = max_queued_per_connection
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self._queues: "OrderedDict[str, Deque[Job]]" = OrderedDict()
+        self._running: Dict[str, Set[asyncio.Task]] = {}
+        self._inflight = 0
+        self._queued = 0
+        self.stats: Dict[str, int] = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0, "cancelled": 0, "timed_out": 0}
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    def queue_position(self, connection_id: str) -> int:
+        """
+        Number of jobs waiting for this connection, 0 when its last submitted job already started.
+        """
+        return len(self._queues.get(connection_id, ()))
+
+    def submit(self, connection_id: str, factory: Callable[[], Awaitable[Any]], timeout: Optional[float] = None,
+               limit: Optional[int] = None) -> asyncio.Future:
+        queue = self._queues.get(connection_id)
+        if self._queued >= self.max_queued or (queue is not None and len(queue) >= (limit or self.max_queued_per_connection)):
+            self.stats["rejected"] += 1
+            raise SchedulerBusy(f"{self._inflight} pipelines running and {self._queued} waiting")
+
+        loop = asyncio.get_running_loop()
+        timeout = self.timeout if timeout is None else timeout
+        job = Job(connection_id, factory, loop.create_future(), loop.time() + timeout if timeout else None, limit)
+        if queue is None:
+            queue = self._queues[connection_id] = deque()
+        queue.append(job)
+        self._queued += 1
+        self.stats["submitted"] += 1
+        self._dispatch()
+        return job.future
+
+    def cancel_connection(self, connection_id: str) -> None:
+        for job in self._queues.pop(connection_id, ()):
+            self._queued -= 1
+            self.stats["cancelled"] += 1
+            job.future.cancel()
+        for task in list(self._running.get(connection_id, ())):
+            task.cancel()
+
+    def _next_job(self) -> Optional[Job]:
+        # Round-robin: take the first connection that may start a job, then move it to the back of the line
+        for connection_id in list(self._queues):
+            queue = self._queues[connection_id]
+            if len(self._running.get(connection_id, ())) >= (queue[0].limit or self.max_inflight_per_connection):
+                continue
+            job = queue.popleft()
+            self._queued -= 1
+            if queue:
+                self._queues.move_to_end(connection_id)
+            else:
+                del self._queues[connection_id]
+            return job
+        return None
+
+    def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._inflight < self.max_inflight:
+            job = self._next_job()
+            if job is None:
+                return
+            if job.future.done():
+                continue
+            if job.deadline is not None and loop.time() >= job.deadline:
+                self.stats["timed_out"] += 1
+                job.future.set_exception(asyncio.TimeoutError("request expired while queued"))
+                continue
+            self._inflight += 1
+            task = loop.create_task(self._run(job))
+            self._running.setdefault(job.connection_id, set()).add(task)
+
+    async def _run(self, job: Job) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            remaining = job.deadline - loop.time() if job.deadline is not None else None
+            result = await asyncio.wait_for(job.factory(), remaining)
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            job.future.cancel()
+        except asyncio.TimeoutError as e:
+            self.stats["timed_out"] += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        except Exception as e:
+            self.stats["failed"] += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self.stats["completed"] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._inflight -= 1
+            running = self._running.get(job.connection_id)
+            if running is not None:
+                running.discard(asyncio.current_task())
+                if not running:
+                    del self._running[job.connection_id]
+            self._dispatch()
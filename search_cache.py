@@ -0,0 +1,128 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from llm_cache import normalize_question
+from shared_state import connect_sqlite
+
+
+class CachedSearch:
+    __slots__ = ("links", "num_results", "searched_at")
+
+    def __init__(self, links: List[str], num_results: int, searched_at: float) -> None:
+        self.links = links
+        self.num_results = num_results
+        self.searched_at = searched_at
+
+
+class SearchCache:
+    """
+    Cache of web search results (query -> ranked URLs) keyed by the normalized question, so repeated
+    and re-punctuated questions skip the search. Entries expire after `ttl` seconds and a cached search
+    also serves requests for fewer results. Like ContentCache it keeps an in-memory LRU and,
+    when `db_path` is set, a SQLite copy that survives restarts.
+    """
+    def __init__(self, max_entries: int = 512, ttl: float = 86400.0, db_path: Optional[str] = None) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, CachedSearch]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.stats: Dict[str, int] = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "expired": 0, "stores": 0}
+        if db_path:
+            self._db = connect_sqlite(db_path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS searches ("
+                "query TEXT PRIMARY KEY, links TEXT NOT NULL, num_results INTEGER NOT NULL, searched_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def get(self, query: str, num_results: int) -> Optional[List[str]]:
+        key = normalize_question(query)
+        with self._lock:
+            entry = self._memory.get(key)
+            tier = "memory_hits"
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT links, num_results, searched_at FROM searches WHERE query = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = CachedSearch(json.loads(row[0]), row[1], row[2])
+                    self._remember(key, entry)
+                    tier = "disk_hits"
+            if entry is None or entry.num_results < num_results:
+                self.stats["misses"] += 1
+                return None
+            if time.time() - entry.searched_at >= self.ttl:
+                self.stats["expired"] += 1
+                return None
+            self._memory.move_to_end(key)
+            self.stats[tier] += 1
+            return entry.links[:num_results]
+
+    def put(self, query: str, num_results: int, links: List[str]) -> None:
+        key = normalize_question(query)
+        entry = CachedSearch(list(links), num_results, time.time())
+        with self._lock:
+            self._remember(key, entry)
+            self.stats["stores"] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO searches (query, links, num_results, searched_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(entry.links), num_results, entry.searched_at),
+                )
+                self._db.execute("DELETE FROM searches WHERE searched_at < ?", (entry.searched_at - self.ttl,))
+                self._db.commit()
+
+    def hit_rate(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"] + self.stats["expired"]
+        return hits / total if total else 0.0
+
+    def _remember(self, key: str, entry: CachedSearch) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def close(self) -> None:
+        # Under the lock, a call still running in a worker thread finishes before the connection goes away
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+class SingleFlight:
+    """
+    Runs at most one task per key, callers asking for a key that is already in flight await the same task.
+    A caller being cancelled does not cancel the shared task unless it was the last one waiting for it.
+    """
+    def __init__(self) -> None:
+        self._tasks: Dict[str, Tuple[asyncio.Task, List[int]]] = {}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._tasks
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._tasks.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(factory())
+            entry = self._tasks[key] = (task, [0])
+            task.add_done_callback(lambda _, key=key, entry=entry: self._forget(key, entry))
+        task, waiters = entry
+        waiters[0] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            waiters[0] -= 1
+            if not waiters[0] and not task.done():
+                task.cancel()
+
+    def _forget(self, key: str, entry: Tuple[asyncio.Task, List[int]]) -> None:
+        if self._tasks.get(key) is entry:
+            del self._tasks[key]
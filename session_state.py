@@ -0,0 +1,66 @@
+import asyncio
+from typing import Callable, Optional
+
+IDLE = "idle"
+AWAITING_INFO = "awaiting_info"
+
+
+class MoreInfoNeeded(Exception):
+    """
+    Raised by the answer pipeline when the LLM finds the question unrelated to the page, so the client
+    should be asked for a new URL and question.
+    """
+
+
+class SessionState:
+    """
+    Where one WebSocket session stands in the "more_info" round-trip. The pipeline that asks for more
+    information ends right away, releasing its scheduler slot and the page it read; while the client
+    makes up its mind only these few fields are kept. The next URL and question resume the chain as a
+    new pipeline, `follow_ups` counts the round-trips so far. A timer expires the wait after `timeout`.
+    """
+    __slots__ = ("phase", "question", "url", "trace_id", "follow_ups", "timer")
+
+    def __init__(self) -> None:
+        self.phase = IDLE
+        self.question: Optional[str] = None
+        self.url: Optional[str] = None
+        self.trace_id: Optional[str] = None
+        self.follow_ups = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def waiting(self) -> bool:
+        return self.phase == AWAITING_INFO
+
+    def await_info(self, question: Optional[str], url: Optional[str], trace_id: Optional[str], follow_ups: int,
+                   timeout: float, on_timeout: Callable[[], None]) -> None:
+        self._cancel_timer()
+        self.phase = AWAITING_INFO
+        self.question = question
+        self.url = url
+        self.trace_id = trace_id
+        self.follow_ups = follow_ups
+        if timeout > 0:
+            self.timer = asyncio.get_running_loop().call_later(timeout, on_timeout)
+
+    def resume(self) -> int:
+        """
+        Leaves the waiting phase once the client's new URL and question arrived, returns the follow-ups so far.
+        """
+        follow_ups = self.follow_ups
+        self.clear()
+        return follow_ups
+
+    def clear(self) -> None:
+        self._cancel_timer()
+        self.phase = IDLE
+        self.question = None
+        self.url = None
+        self.trace_id = None
+        self.follow_ups = 0
+
+    def _cancel_timer(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
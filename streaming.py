@@ -0,0 +1,63 @@
+import json
+import re
+from typing import Optional
+
+ANSWER_START_RE = re.compile(r'"answer"\s*:\s*"')
+HEX_DIGITS = set("0123456789abcdefABCDEF")
+
+
+class AnswerStreamer:
+    """
+    Pulls the "answer" string out of a JSON response while the LLM is still generating it.
+    feed() takes each text delta and returns the newly completed part of the answer, so the
+    client sees answer tokens long before the closing brace arrives.
+    """
+    def __init__(self) -> None:
+        self._buffer = ""
+        self._position: Optional[int] = None  # index of the next undecoded answer character
+        self.done = False
+
+    def feed(self, delta: str) -> str:
+        self._buffer += delta
+        if self.done:
+            return ""
+        if self._position is None:
+            match = ANSWER_START_RE.search(self._buffer)
+            if match is None:
+                return ""
+            self._position = match.end()
+
+        start = self._position
+        index = start
+        while index < len(self._buffer):
+            char = self._buffer[index]
+            if char == '"':
+                self.done = True
+                break
+            if char == "\\":
+                # Only decode an escape once all of it has arrived
+                if index + 1 >= len(self._buffer):
+                    break
+                if self._buffer[index + 1] == "u":
+                    digits = self._buffer[index + 2:index + 6]
+                    if len(digits) < 4:
+                        break
+                    if not set(digits) <= HEX_DIGITS:
+                        index += 2
+                        continue
+                    index += 6
+                else:
+                    index += 2
+                continue
+            index += 1
+
+        self._position = index + 1 if self.done else index
+        return _decode(self._buffer[start:index])
+
+
+def _decode(raw: str) -> str:
+    try:
+        return json.loads(f'"{raw}"', strict=False)
+    except json.JSONDecodeError:
+        # Malformed escape sequence, pass the text through undecoded
+        return raw